@@ -1,11 +1,12 @@
 import re
 import time
 from pathlib import Path
-from subprocess import PIPE, Popen
 
 import click
+from diskcache import Cache
 
 from juniorguru.cli.web import build as build_web
+from juniorguru.lib import link_checker
 
 
 USER_AGENT = (
@@ -41,16 +42,20 @@ EXCLUDE_URLS = [
 EXCLUDE_REASONS = [
     re.compile(r)
     for r in [
-        r"^BLC_UNKNOWN$",  # crawling protection?
+        r"^UNKNOWN$",  # crawling protection?
         r"^ERRNO_EPROTO$",  # Czech TV website ¯\_(ツ)_/¯
         r"^ERRNO_ENOTFOUND$",  # crawling protection? can't even find the domain name
         r"^HTTP_999$",  # LinkedIn crawling protection
-        r"^HTTP_429$",  # Twitter crawling protection, also https://github.com/stevenvachon/broken-link-checker/issues/198
+        r"^HTTP_429$",  # Twitter crawling protection
         r"^HTTP_5\d\d$",  # server-side problem, can't do anything about that
-        r"HTTP_undefined",  # :notsureif:
+        r"^TIMEOUT$",  # :notsureif:
     ]
 ]
 
+CACHE_EXPIRE_SEC = 60 * 60 * 24 * 7
+
+RETRY_DELAY_SEC = 5
+
 
 @click.command()
 @click.argument(
@@ -58,81 +63,81 @@ EXCLUDE_REASONS = [
 )
 @click.option("--build/--no-build", default=True)
 @click.option("--retry/--no-retry", default=False)
+@click.option(
+    "--cache-dir",
+    default=".web_cache/check_links",
+    type=click.Path(path_type=Path),
+)
+@click.option("--clear-cache/--keep-cache", default=False)
+@click.option("--workers", default=link_checker.WORKERS, type=click.IntRange(min=1))
 @click.pass_context
-def main(context, output_path, build, retry):
+def main(context, output_path, build, retry, cache_dir, clear_cache, workers):
     if build:
         context.invoke(build_web, output_path=output_path)
 
-    command = ["npx", "blcl"]
-    options = [
-        "--verbose",
-        "--follow",
-        "--recursive",
-        "--get",  # because some sites return strange codes in response to HEAD :(
-        f"--user-agent={USER_AGENT}",
-    ]
-
-    for url in EXCLUDE_URLS:
-        options.append(f"--exclude={url}")
+    print(f"Extracting links from {output_path}")
+    links = link_checker.extract_links(output_path, workers=workers)
+    excluded = {link for link in links if link_checker.is_excluded(link, EXCLUDE_URLS)}
+    print(f"Found {len(links)} links, {len(excluded)} excluded")
+
+    broken = {}
+    for link in links.keys() - excluded:
+        if link_checker.is_local(link):
+            if reason := link_checker.check_local_link(output_path, link):
+                broken[link] = reason
+
+    with Cache(cache_dir) as cache:
+        if clear_cache:
+            cache.clear()
+        urls = {
+            link
+            for link in links.keys() - excluded
+            if not link_checker.is_local(link) and link not in cache
+        }
+        print(
+            f"Checking {len(urls)} URLs, "
+            f"{len(links) - len(excluded) - len(urls)} checked locally or recently"
+        )
+
+        # Internet is flaky... retrying 3 times makes us sure the problem is consistent
+        attempts = 3 if retry else 1
+        for attempt in range(attempts):
+            if attempt:
+                time.sleep(RETRY_DELAY_SEC)
+                print(f"Attempt #{attempt + 1} of {attempts}, {len(urls)} URLs")
+            reasons = link_checker.check_urls(urls, USER_AGENT)
+            urls = set()
+            for url, reason in reasons.items():
+                if reason:
+                    broken[url] = reason
+                    urls.add(url)
+                else:
+                    broken.pop(url, None)
+                    cache.set(url, True, expire=CACHE_EXPIRE_SEC)
+            if not urls:
+                break
+
+    warnings = []
+    errors = []
+    for link, reason in sorted(broken.items()):
+        if link_checker.is_ignored_reason(reason, EXCLUDE_REASONS):
+            warnings.append((link, reason))
+        else:
+            errors.append((link, reason))
 
-    # Internet is flaky... retrying 3 times makes us sure the problem is consistent
-    attempts = 1
-    if retry:
-        attempts = 3
+    if warnings:
+        print()
+        print("Links not checked")
+        print("=" * 79)
+        for link, reason in warnings:
+            print(f"{reason}\t{link}")
 
-    broken = None
-    failed = 1
-    for attempt in range(attempts):
+    if errors:
         print()
-        print(f"Attempt #{attempt + 1} of {attempts}")
+        print("Broken links")
         print("=" * 79)
-        broken = set()
-
-        with Popen(
-            command + options + [output_path],
-            stdout=PIPE,
-            bufsize=1,
-            universal_newlines=True,
-        ) as proc:
-            for line in proc.stdout:
-                print(line, end="")
-                if "BROKEN" in line:
-                    match = re.search(r"(http[^ \x1b]+)[^\(]+\(([^\)]+)\)", line)
-                    broken.add((match.group(1), match.group(2)))
-
-        failed = proc.returncode
-        if failed:
-            time.sleep(5)
-        else:
-            break
-
-    # https://github.com/stevenvachon/broken-link-checker/issues/169
-    if broken:
-        warnings = []
-        errors = []
-        for url, reason in broken:
-            relevant_list = None
-            for reason_re in EXCLUDE_REASONS:
-                if reason_re.search(reason):
-                    relevant_list = warnings
-                    break
-            if relevant_list is None:
-                relevant_list = errors
-            relevant_list.append((url, reason))
-
-        if warnings:
-            print()
-            print("Links not checked")
-            print("=" * 79)
-            for url, reason in warnings:
-                print(f"{reason}\t{url}")
-
-        if errors:
-            print()
-            print("Broken links")
-            print("=" * 79)
-            for url, reason in errors:
-                print(f"{reason}\t{url}")
-
-        if errors:
-            raise click.Abort()
+        for link, reason in errors:
+            print(f"{reason}\t{link}")
+            for page_url in sorted(links[link]):
+                print(f"\t\t{page_url}")
+        raise click.Abort()
@@ -1,5 +1,6 @@
 import filecmp
-import itertools
+import hashlib
+import os
 import re
 import shutil
 from fnmatch import fnmatch
@@ -7,8 +8,8 @@ from pathlib import Path
 from pprint import pformat
 
 import click
+from diskcache import Cache
 from sqlite_utils import Database
-from sqlite_utils.db import NotFoundError
 
 from juniorguru.lib import loggers
 
@@ -34,6 +35,13 @@ PERSIST_EXCLUDE = ["*.pyc", "*.db-shm", "*.db-wal", ".DS_Store"]
 
 LOAD_EXCLUDE = PERSIST_EXCLUDE
 
+PERSISTENT_CACHE_DIR = ".persistent_cache"
+
+# Each persistent cache belongs to a single sync command, so the loaded
+# cache database is always newer and merging it row by row would only
+# report conflicts for the changed values
+LOAD_OVERWRITE = [f"{PERSISTENT_CACHE_DIR}/*"]
+
 SCHEMA_TRANSFORMATIONS = {
     re.compile(r"^CREATE TABLE"): "CREATE TABLE IF NOT EXISTS",
     re.compile(r"^(CREATE( UNIQUE)? INDEX)"): r"\1 IF NOT EXISTS",
@@ -41,6 +49,8 @@ SCHEMA_TRANSFORMATIONS = {
 
 DIR_NOT_EMPTY_ERRNO = 39
 
+MERGE_SCHEMA = "merge_from"
+
 
 logger = loggers.from_path(__file__)
 
@@ -60,11 +70,13 @@ def main():
 @main.command()
 @click.option("--file", default=SNAPSHOT_FILE, type=click.File(mode="w"))
 @click.option("--exclude", default=",".join(SNAPSHOT_EXCLUDE), type=CommaSeparated())
-def snapshot(file, exclude):
-    for path, mtime in take_snapshot(".", exclude=exclude):
+@click.option("--hash/--no-hash", default=False)
+def snapshot(file, exclude, hash):
+    for path, mtime, size in take_snapshot(".", exclude=exclude):
         logger.debug(path)
-        assert " = " not in str(path)
-        file.write(f"{path} = {mtime}\n")
+        file.write(
+            format_snapshot_line(path, mtime, size, get_hash(path) if hash else None)
+        )
 
 
 @main.command()
@@ -84,17 +96,14 @@ def persist(
     shutil.rmtree(persist_dir, ignore_errors=True)
     namespace_dir = persist_dir / namespace
     namespace_dir.mkdir(parents=True)
-    snapshot = {
-        Path(path): float(mtime)
-        for path, mtime in (line.split(" = ") for line in snapshot_file)
-    }
-    for path, mtime in take_snapshot(".", exclude=snapshot_exclude):
+    snapshot = dict(map(parse_snapshot_line, snapshot_file))
+    for path, mtime, size in list(take_snapshot(".", exclude=snapshot_exclude)):
         if any(fnmatch(path.name, pattern) for pattern in persist_exclude):
             logger.debug(f"Excluding {path}")
         elif path not in snapshot:
             logger["new"].info(path)
             persist_file(".", path, namespace_dir, move=move)
-        elif mtime > snapshot[path]:
+        elif is_modified(path, mtime, size, *snapshot[path]):
             logger["mod"].info(path)
             persist_file(".", path, namespace_dir, move=move)
     for path in (path for path in persist_dir.glob("**/*") if path.is_file()):
@@ -105,30 +114,70 @@ def persist(
 @click.option("--persist-dir", default=PERSIST_DIR, type=click.Path(path_type=Path))
 @click.option("--move/--no-move", default=False)
 @click.option("--exclude", default=",".join(LOAD_EXCLUDE), type=CommaSeparated())
-def load(persist_dir, move, exclude):
+@click.option("--overwrite", default=",".join(LOAD_OVERWRITE), type=CommaSeparated())
+@click.option(
+    "--persistent-cache-dir",
+    default=PERSISTENT_CACHE_DIR,
+    type=click.Path(path_type=Path),
+)
+def load(persist_dir, move, exclude, overwrite, persistent_cache_dir):
     for namespace_dir in persist_dir.iterdir():
         for path in (path for path in namespace_dir.glob("**/*") if path.is_file()):
             if any(fnmatch(path.name, pattern) for pattern in exclude):
                 logger.debug(f"Excluding {path}")
             else:
                 logger.info(f"Loading {path}")
-                load_file(namespace_dir, path, ".", move=move)
+                load_file(namespace_dir, path, ".", move=move, overwrite=overwrite)
     if move:
         shutil.rmtree(persist_dir)
+    prune_caches(persistent_cache_dir)
 
 
 def take_snapshot(dir, exclude=None):
-    exclude = [
-        (f"{pattern.rstrip('/')}/**/*" if Path(pattern).is_dir() else pattern)
-        for pattern in (exclude or [])
-    ]
-    excluded = itertools.chain.from_iterable(
-        Path(dir).glob(pattern) for pattern in exclude
-    )
-    included = Path(dir).glob("**/*")
-    for path in set(included) - set(excluded):
-        if path.is_file():
-            yield path.relative_to(dir), path.stat().st_mtime
+    """
+    Walks given directory and yields relative paths of all files together
+    with their mtime and size. Exclude patterns are matched against the
+    relative paths and excluded directories don't get walked at all.
+    """
+    dir = Path(dir)
+    exclude = [pattern.rstrip("/") for pattern in (exclude or [])]
+    dirs = [dir]
+    while dirs:
+        with os.scandir(dirs.pop()) as entries:
+            for entry in entries:
+                path = Path(entry.path).relative_to(dir)
+                if any(fnmatch(str(path), pattern) for pattern in exclude):
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    dirs.append(entry.path)
+                elif entry.is_file():
+                    stat = entry.stat()
+                    yield path, stat.st_mtime, stat.st_size
+
+
+def format_snapshot_line(path, mtime, size, hash=None):
+    assert "\t" not in str(path)
+    return f"{path}\t{mtime}\t{size}\t{hash or ''}\n"
+
+
+def parse_snapshot_line(line):
+    path, mtime, size, hash = line.rstrip("\n").split("\t")
+    return Path(path), (float(mtime), int(size), hash or None)
+
+
+def is_modified(path, mtime, size, snapshot_mtime, snapshot_size, snapshot_hash):
+    if mtime == snapshot_mtime and size == snapshot_size:
+        return False
+    if snapshot_hash and size == snapshot_size:
+        return get_hash(path) != snapshot_hash
+    return True
+
+
+def get_hash(path):
+    with open(path, "rb") as f:
+        return hashlib.file_digest(
+            f, lambda: hashlib.blake2b(digest_size=16)
+        ).hexdigest()
 
 
 def persist_file(source_dir, source_path, persist_dir, move=False):
@@ -139,9 +188,13 @@ def persist_file(source_dir, source_path, persist_dir, move=False):
     (shutil.move if move else shutil.copy2)(source_path, persist_path)
 
 
-def load_file(persist_dir, persist_path, source_dir, move=False):
+def load_file(persist_dir, persist_path, source_dir, move=False, overwrite=None):
     persist_size = persist_path.stat().st_size
-    source_path = source_dir / persist_path.relative_to(persist_dir)
+    relative_path = persist_path.relative_to(persist_dir)
+    source_path = source_dir / relative_path
+    is_overwritten = any(
+        fnmatch(str(relative_path), pattern) for pattern in (overwrite or [])
+    )
     source_path.parent.mkdir(parents=True, exist_ok=True)
     if source_path.exists():
         source_size = source_path.stat().st_size
@@ -150,7 +203,7 @@ def load_file(persist_dir, persist_path, source_dir, move=False):
                 f"Keeping {source_path} ({source_size}b), it's equal to {persist_path} ({persist_size}b)"
             )
         else:
-            if source_path.suffix == ".db":
+            if source_path.suffix == ".db" and not is_overwritten:
                 logger.info(
                     f"Merging {source_path} ({source_size}b)"
                     f" with {persist_path} ({persist_size}b)"
@@ -169,6 +222,22 @@ def load_file(persist_dir, persist_path, source_dir, move=False):
         (shutil.move if move else shutil.copy2)(persist_path, source_path)
 
 
+def prune_caches(dir: Path):
+    """
+    Removes files of caches in given directory, which no cache entry refers to
+
+    Loading overwrites the cache databases with newer ones, but never deletes
+    files of entries the sync commands have since deleted or replaced.
+    """
+    for cache_db_path in dir.glob("*/cache.db"):
+        with Cache(cache_db_path.parent) as cache:
+            warnings = cache.check(fix=True)
+        if warnings:
+            logger.info(
+                f"Pruned {cache_db_path.parent}, {len(warnings)} problems fixed"
+            )
+
+
 def prepare_database_for_moving(path: Path):
     db = Database(path)
     db.disable_wal()
@@ -176,6 +245,13 @@ def prepare_database_for_moving(path: Path):
 
 
 def merge_databases(path_from: Path, path_to: Path):
+    """
+    Merges rows of one database into another. Missing rows get inserted,
+    missing values get filled in, but no value gets overwritten, see
+    get_row_updates() for the semantics. Merges each table in bulk
+    by SQL statements operating on the whole table, all within
+    a single transaction.
+    """
     logger_db = logger["db"]
     logger_db.info(f"Merging {path_from} to {path_to}")
     db_from, db_to = Database(path_from), Database(path_to)
@@ -183,37 +259,97 @@ def merge_databases(path_from: Path, path_to: Path):
     logger_db.info("Applying schema")
     db_to.executescript(make_schema_idempotent(db_from.schema))
 
-    for table_from in db_from.tables:
-        name = table_from.name
-        logger_t = logger_db[name]
-        table_to = db_to[name]
+    db_to.attach(MERGE_SCHEMA, path_from)
+    try:
+        with db_to.conn:
+            for table_from in db_from.tables:
+                name = table_from.name
+                logger_t = logger_db[name]
+                table_to = db_to[name]
+
+                if not table_to.exists():
+                    raise RuntimeError(f"Table {name} should already exist!")
+                logger_t.info(
+                    f"Table has {table_to.count} rows, merging {table_from.count} rows"
+                )
+                merge_tables(db_to, name, table_from.pks, logger_t)
+                logger_t.info(f"Table has {table_to.count} rows after merge")
+    finally:
+        db_to.execute(f"DETACH DATABASE {MERGE_SCHEMA}")
+
+
+def merge_tables(db_to: Database, name: str, pks: list[str], logger_t):
+    columns_from = get_columns(db_to, MERGE_SCHEMA, name)
+    columns_to = get_columns(db_to, "main", name)
+    if frozenset(columns_from) != frozenset(columns_to):
+        raise ValueError(f"Rows don't match! {columns_from!r} ≠ {columns_to!r}")
+
+    table_from = f"{MERGE_SCHEMA}.{quote(name)} AS row_from"
+    table_to = f"main.{quote(name)} AS row_to"
+    pks_match = " AND ".join(f"row_from.{quote(pk)} = row_to.{quote(pk)}" for pk in pks)
+    columns = [column for column in columns_to if column not in pks]
+
+    conflicts = [
+        f"(row_from.{quote(column)} IS NOT NULL"
+        f" AND row_to.{quote(column)} IS NOT NULL"
+        f" AND row_from.{quote(column)} IS NOT row_to.{quote(column)})"
+        for column in columns
+    ]
+    if conflicts:
+        conflicts_columns = ", ".join(conflicts)
+        rows = db_to.execute(
+            f"SELECT {', '.join(f'row_to.{quote(pk)}' for pk in pks)}, {conflicts_columns}"
+            f" FROM {table_from} JOIN {table_to} ON {pks_match}"
+            f" WHERE {' OR '.join(conflicts)}"
+        ).fetchall()
+        if rows:
+            conflicts = {
+                tuple(row[: len(pks)]): [
+                    column
+                    for column, is_conflict in zip(columns, row[len(pks) :])
+                    if is_conflict
+                ]
+                for row in rows
+            }
+            logger_t.error(
+                "Conflicts found! This typically happens if two parallel scripts write values to the same column. Instead add a new column or a new 1:1 table"
+            )
+            raise RuntimeError(
+                f"Conflicts in {len(conflicts)} rows! Values would be overwritten:"
+                f"\n{pformat(conflicts)}"
+            )
 
-        if not table_to.exists():
-            raise RuntimeError(f"Table {name} should already exist!")
-        logger_t.info(
-            f"Table has {table_to.count} rows, merging {table_from.count} rows"
+    updates = [
+        f"(row_to.{quote(column)} IS NULL AND row_from.{quote(column)} IS NOT NULL)"
+        for column in columns
+    ]
+    if updates:
+        assignments = ", ".join(
+            f"{quote(column)} = COALESCE(row_to.{quote(column)}, row_from.{quote(column)})"
+            for column in columns
+        )
+        cursor = db_to.execute(
+            f"UPDATE {table_to} SET {assignments} FROM {table_from}"
+            f" WHERE {pks_match} AND ({' OR '.join(updates)})"
         )
+        logger_t.debug(f"Updated {cursor.rowcount} rows")
 
-        for row_from in table_from.rows:
-            pks = [row_from[pk] for pk in table_from.pks]
-            try:
-                row_to = table_to.get(pks)
-            except NotFoundError:
-                logger_t.debug(f"Inserting {pks!r}")
-                table_to.insert(row_from, pk=table_from.pks)
-            else:
-                try:
-                    updates = get_row_updates(row_from, row_to)
-                except RuntimeError:
-                    logger_t.error(
-                        "Conflicts found! This typically happens if two parallel scripts write values to the same column. Instead add a new column or a new 1:1 table"
-                    )
-                    raise
-                if updates:
-                    logger_t.debug(f"Updating {pks!r} with {pformat(updates)}")
-                    table_to.update(pks, updates)
-        logger_t.info(f"Table has {table_to.count} rows after merge")
-    db_to.vacuum()
+    columns_insert = ", ".join(quote(column) for column in columns_to)
+    cursor = db_to.execute(
+        f"INSERT INTO main.{quote(name)} ({columns_insert})"
+        f" SELECT {columns_insert} FROM {table_from}"
+        f" WHERE NOT EXISTS (SELECT 1 FROM {table_to} WHERE {pks_match})"
+    )
+    logger_t.debug(f"Inserted {cursor.rowcount} rows")
+
+
+def get_columns(db: Database, schema: str, name: str) -> list[str]:
+    rows = db.execute(f"PRAGMA {schema}.table_info({quote(name)})").fetchall()
+    return [row[1] for row in rows]
+
+
+def quote(identifier: str) -> str:
+    return '"' + identifier.replace('"', '""') + '"'
 
 
 def get_row_updates(row_from, row_to):
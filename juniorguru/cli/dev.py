@@ -1,6 +1,9 @@
+import itertools
 import shutil
 import subprocess
 import sys
+import time
+from collections import Counter
 from pathlib import Path
 
 import click
@@ -8,6 +11,8 @@ import pytest
 from ghp_import import ghp_import
 
 from juniorguru.lib import loggers
+from juniorguru.models.job import ScrapedJob
+from juniorguru.sync.jobs_scraped.processing import DropItem, load_pipelines, parse
 
 
 logger = loggers.from_path(__file__)
@@ -147,3 +152,48 @@ def db(context: click.Context, path: Path):
     subprocess.run(
         ["datasette", str(path.absolute()), "--reload", "--open"], check=True
     )
+
+
+@main.command()
+@click.argument(
+    "paths", nargs=-1, required=True, type=click.Path(exists=True, path_type=Path)
+)
+@click.option("--limit", type=int)
+def benchmark_pipelines(paths: list[Path], limit: int):
+    # importing at the top of the module would be circular, because
+    # juniorguru.sync.jobs_scraped itself imports the CLI
+    from juniorguru.sync.jobs_scraped import POSTPROCESS_PIPELINES, PREPROCESS_PIPELINES
+
+    preprocess_pipelines = list(
+        zip(PREPROCESS_PIPELINES, load_pipelines(PREPROCESS_PIPELINES))
+    )
+    postprocess_pipelines = list(
+        zip(POSTPROCESS_PIPELINES, load_pipelines(POSTPROCESS_PIPELINES))
+    )
+    times = Counter()
+    items_count = 0
+    for item in itertools.islice(
+        itertools.chain.from_iterable(map(parse, paths)), limit
+    ):
+        items_count += 1
+        try:
+            item = benchmark_pipelines_execute(item, preprocess_pipelines, times)
+            # postprocessing gets items as they're stored in the database
+            item = ScrapedJob.from_item(item).to_item()
+            benchmark_pipelines_execute(item, postprocess_pipelines, times)
+        except DropItem:
+            pass
+    logger["benchmark"].info(f"Processed {items_count} items")
+    for import_path, time_s in times.most_common():
+        time_per_item_ms = 1000 * time_s / items_count
+        click.echo(f"{time_s:8.2f}s {time_per_item_ms:8.3f}ms/item {import_path}")
+
+
+def benchmark_pipelines_execute(item, pipelines, times):
+    for import_path, pipeline in pipelines:
+        t = time.perf_counter()
+        try:
+            item = pipeline(item)
+        finally:
+            times[import_path] += time.perf_counter() - t
+    return item
@@ -1,11 +1,14 @@
 import os
 import sys
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 from functools import cached_property, wraps
 from pathlib import Path
 from time import perf_counter_ns
 
 import click
+import strictyaml
 from diskcache import Cache as BaseCache
+from strictyaml import Float, MapPattern, Str
 
 from juniorguru import sync as sync_package
 from juniorguru.lib import images, loggers, mutations
@@ -22,6 +25,14 @@ except (Exception, ImportError):
 
 NOTIFY_AFTER_MIN = 1
 
+TIMES_PATH = Path("juniorguru/data/sync_times.yml")
+
+TIMES_SCHEMA = MapPattern(Str(), Float())
+
+DEFAULT_TIME_MIN = 1
+
+PARALLEL_DB_TIMEOUT_SEC = 30
+
 
 logger = loggers.from_path(__file__)
 
@@ -100,6 +111,20 @@ class Group(click.Group):
 
         return wrapper
 
+    def pass_persistent_cache(self, fn):
+        @click.pass_context
+        @wraps(fn)
+        def wrapper(context, *fn_args, **fn_kwargs):
+            cache_dir = context.obj["persistent_cache_dir"] / command_name(
+                fn.__module__
+            )
+            with BaseCache(cache_dir) as persistent_cache:
+                result = fn(persistent_cache=persistent_cache, *fn_args, **fn_kwargs)
+                persistent_cache.expire()
+                return result
+
+        return wrapper
+
     @db.connection_context()
     def _is_sync_command_seen(self, name, sync):
         return sync.is_command_seen(name)
@@ -131,6 +156,15 @@ class Command(click.Command):
 
 
 class Cache(BaseCache):
+    """
+    Cache for data which is fine to fetch again the next day
+
+    For data which is expensive to fetch again, such as results of paid
+    or rate limited APIs, or checkpoints of long downloads, sync commands
+    should use the persistent cache instead. It doesn't expire, each command
+    gets its own, and CI keeps it across days.
+    """
+
     def set(self, *args, **kwargs) -> bool:
         kwargs.setdefault("expire", 60 * 60 * 24)
         return super().set(*args, **kwargs)
@@ -149,9 +183,15 @@ class Cache(BaseCache):
 @click.option("--allow-mutations/--disallow-mutations", default=False)
 @click.option("--debug/--no-debug", default=None)
 @click.option("--cache-dir", default=".sync_cache", type=click.Path(path_type=Path))
+@click.option(
+    "--persistent-cache-dir",
+    default=".persistent_cache",
+    type=click.Path(path_type=Path),
+)
 @click.option(
     "--clear-image-templates-cache/--keep-image-templates-cache", default=True
 )
+@click.option("-j", "--jobs", default=1, type=click.IntRange(min=1))
 @click.pass_context
 def main(
     context,
@@ -161,10 +201,13 @@ def main(
     allow_mutations,
     debug,
     cache_dir,
+    persistent_cache_dir,
     clear_image_templates_cache,
+    jobs,
 ):
     logger.info(f"Sync cache directory set to {cache_dir.absolute()}")
     cache = Cache(cache_dir)
+    logger.info(f"Persistent cache directory set to {persistent_cache_dir.absolute()}")
 
     if debug:
         loggers.reconfigure_level("DEBUG")
@@ -182,7 +225,13 @@ def main(
 
     with db.connection_context():
         sync = Sync.start(id)
-    context.obj = dict(sync=sync, cache=cache, skip_dependencies=not deps)
+    context.obj = dict(
+        sync=sync,
+        cache=cache,
+        persistent_cache_dir=persistent_cache_dir,
+        skip_dependencies=not deps,
+        jobs=jobs,
+    )
     logger.debug(
         f"Sync #{id} starts with {sync.count_commands()} commands already recorded"
     )
@@ -193,37 +242,30 @@ def main(
 @click.argument("job", type=click.Choice(["sync-1", "sync-2"]), envvar="CIRCLE_JOB")
 @click.argument("node_index", type=int, envvar="CIRCLE_NODE_INDEX")
 @click.option("--nodes", type=int, envvar="CIRCLE_NODE_TOTAL")
+@click.option(
+    "--times-path",
+    default=TIMES_PATH,
+    type=click.Path(path_type=Path),
+)
 @click.option("-p", "--print-only", is_flag=True, default=False, show_default=True)
 @click.pass_context
-def ci(context, job, node_index, nodes, print_only):
-    if job == "sync-1":
-        commands_with_deps = {
-            name for name, deps in main.dependencies_map.items() if deps
-        }
-        chains = get_parallel_chains(main.dependencies_map, exclude=commands_with_deps)
-    elif job == "sync-2":
-        commands_without_deps = {
-            name for name, deps in main.dependencies_map.items() if not deps
-        }
-        chains = get_parallel_chains(
-            main.dependencies_map, exclude=commands_without_deps
-        )
-    else:
-        raise ValueError(job)
-
-    if nodes and nodes != len(chains):
+def ci(context, job, node_index, nodes, times_path, print_only):
+    chains = get_job_chains(main.dependencies_map, job)
+    if nodes and nodes > len(chains):
         logger.error(
-            f"The job {job} has parallelism {nodes}, but there are {len(chains)} command chains!"
+            f"The job {job} has parallelism {nodes}, but there are only {len(chains)} command chains!"
         )
         raise click.Abort()
+    times = load_times(times_path)
+    plan = get_balanced_chains(chains, times, nodes or len(chains))
 
     if print_only:
-        for index, chain in enumerate(chains):
+        for index, chain in enumerate(plan):
             for name in chain:
                 bold, color = (True, "green") if index == node_index else (None, None)
                 click.secho(f"{index} {name}", bold=bold, fg=color)
     else:
-        for name in chains[node_index]:
+        for name in plan[node_index]:
             command = main.get_command(context, name)
             context.invoke(command)
 
@@ -234,23 +276,29 @@ def ci(context, job, node_index, nodes, print_only):
     default=".circleci/config.yml",
     type=click.Path(path_type=Path, exists=True),
 )
+@click.option(
+    "--times-path",
+    default=TIMES_PATH,
+    type=click.Path(path_type=Path),
+)
+@click.option("--sync-1-nodes", type=click.IntRange(min=1))
+@click.option("--sync-2-nodes", type=click.IntRange(min=1))
 @click.option("-p", "--print-only", is_flag=True, default=False, show_default=True)
-def parallelism(config_path, print_only):
-    commands_with_deps = {name for name, deps in main.dependencies_map.items() if deps}
-    sync1_chains = get_parallel_chains(
-        main.dependencies_map, exclude=commands_with_deps
-    )
-    sync1_parallelism = len(sync1_chains)
-    click.echo(f"sync-1 {sync1_parallelism}")
-
-    commands_without_deps = {
-        name for name, deps in main.dependencies_map.items() if not deps
-    }
-    sync2_chains = get_parallel_chains(
-        main.dependencies_map, exclude=commands_without_deps
-    )
-    sync2_parallelism = len(sync2_chains)
-    click.echo(f"sync-2 {sync2_parallelism}")
+def parallelism(config_path, times_path, sync_1_nodes, sync_2_nodes, print_only):
+    times = load_times(times_path)
+    jobs_parallelism = {}
+    for job, nodes in [("sync-1", sync_1_nodes), ("sync-2", sync_2_nodes)]:
+        chains = get_job_chains(main.dependencies_map, job)
+        nodes = min(nodes or len(chains), len(chains))
+        plan = get_balanced_chains(chains, times, nodes)
+        for index, chain in enumerate(plan):
+            click.echo(
+                f"{job} node {index}: {get_chain_time(chain, times):.1f}min"
+                f" ({', '.join(chain)})"
+            )
+        makespan = max(get_chain_time(chain, times) for chain in plan)
+        click.echo(f"{job} {nodes} (predicted {makespan:.1f}min)")
+        jobs_parallelism[job] = nodes
 
     if print_only:
         return
@@ -259,10 +307,8 @@ def parallelism(config_path, print_only):
     parallelism = None
     with config_path.open() as config_file:
         for line in config_file:
-            if line.strip() == "sync-1:":
-                parallelism = sync1_parallelism
-            elif line.strip() == "sync-2:":
-                parallelism = sync2_parallelism
+            if line.strip() in [f"{job}:" for job in jobs_parallelism]:
+                parallelism = jobs_parallelism[line.strip().removesuffix(":")]
             elif line.lstrip().startswith("parallelism:"):
                 line, _ = line.split(":", 1)
                 line += f": {parallelism}\n"
@@ -270,10 +316,36 @@ def parallelism(config_path, print_only):
     config_path.write_text("".join(lines))
 
 
+@main.command()
+@click.option(
+    "--times-path",
+    default=TIMES_PATH,
+    type=click.Path(path_type=Path),
+)
+@click.pass_context
+def record_times(context, times_path):
+    sync = context.obj["sync"]
+    with db.connection_context():
+        measured_times = {
+            name: time
+            for name, time in sync.times_min().items()
+            if name in main.dependencies_map
+        }
+    logger.info(f"Recording times of {len(measured_times)} commands to {times_path}")
+    times = load_times(times_path)
+    times.update(measured_times)
+    times = {name: round(times[name], 2) for name in sorted(times)}
+    times_path.write_text(strictyaml.as_document(times, TIMES_SCHEMA).as_yaml())
+
+
 @main.command()
 @click.option("-p", "--print-only", is_flag=True, default=False, show_default=True)
 @click.pass_context
 def all(context, print_only):
+    jobs = context.obj["jobs"]
+    if jobs > 1 and not print_only:
+        run_parallel(context, main.dependencies_map, jobs)
+        return
     for name in main.dependencies_map:
         command = main.get_command(context, name)
         if print_only:
@@ -282,6 +354,70 @@ def all(context, print_only):
             context.invoke(command)
 
 
+def run_parallel(context, dependencies_map, jobs):
+    sync = context.obj["sync"]
+    cache_dir = context.obj["cache"].directory
+    persistent_cache_dir = context.obj["persistent_cache_dir"]
+    with db.connection_context():
+        done = set(filter(sync.is_command_seen, dependencies_map))
+    if done:
+        logger.info(f"Skipping {len(done)} commands (already executed)")
+    pending = set(dependencies_map) - done
+    logger.info(f"Running {len(pending)} commands in {jobs} parallel jobs")
+
+    # Commands are scheduled as soon as all their dependencies finish, so the
+    # whole sync takes as long as the critical path of the dependency graph.
+    # Each command records itself to the sync in the worker process, and
+    # SQLite in WAL mode lets the workers write one after another.
+    with ProcessPoolExecutor(jobs) as executor:
+        running = {}
+        while pending or running:
+            for name in get_ready_commands(dependencies_map, done, pending):
+                logger.debug(f"Scheduling {name}")
+                future = executor.submit(
+                    run_sync_command, name, sync.id, cache_dir, persistent_cache_dir
+                )
+                running[future] = name
+                pending.remove(name)
+            if not running:
+                raise NotImplementedError(
+                    f"Unable to schedule commands: {', '.join(sorted(pending))}"
+                )
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                try:
+                    future.result()
+                except BaseException:
+                    executor.shutdown(cancel_futures=True)
+                    raise
+                done.add(name)
+                logger.debug(f"Finished {name}, {len(pending)} commands pending")
+
+
+def run_sync_command(name, sync_id, cache_dir, persistent_cache_dir):
+    # Commands keep their write transactions short, so a worker waiting
+    # longer than this for the database lock means something is wrong
+    db.timeout = PARALLEL_DB_TIMEOUT_SEC
+    with db.connection_context():
+        sync = Sync.get_by_id(sync_id)
+    cache = Cache(cache_dir)
+    obj = dict(
+        sync=sync,
+        cache=cache,
+        persistent_cache_dir=persistent_cache_dir,
+        skip_dependencies=False,
+        jobs=1,
+    )
+    try:
+        with click.Context(main, info_name="sync", obj=obj) as parent:
+            command = main.get_command(parent, name)
+            with command.make_context(name, [], parent=parent) as context:
+                command.invoke(context)
+    finally:
+        cache.close()
+
+
 @click.pass_context
 def close(context):
     logger.debug("Cleaning and closing cache")
@@ -341,6 +477,45 @@ def get_parallel_chains(dependencies_map, exclude=None):
         chains = {}
 
 
+def get_job_chains(dependencies_map, job):
+    if job == "sync-1":
+        exclude = {name for name, deps in dependencies_map.items() if deps}
+    elif job == "sync-2":
+        exclude = {name for name, deps in dependencies_map.items() if not deps}
+    else:
+        raise ValueError(job)
+    return get_parallel_chains(dependencies_map, exclude=exclude)
+
+
+def get_balanced_chains(chains, times, nodes):
+    # Commands in a chain depend on each other, so they must run on the same
+    # node, one after another. Chains are then distributed to the nodes using
+    # longest-processing-time-first list scheduling to minimise the makespan.
+    plan = [[] for _ in range(nodes)]
+    loads = [0] * nodes
+    for chain in sorted(chains, key=lambda chain: -get_chain_time(chain, times)):
+        index = loads.index(min(loads))
+        plan[index].extend(chain)
+        loads[index] += get_chain_time(chain, times)
+    return sorted(map(sorted, plan))
+
+
+def get_chain_time(chain, times):
+    return sum(times.get(name, DEFAULT_TIME_MIN) for name in chain)
+
+
+def load_times(times_path):
+    try:
+        return dict(strictyaml.load(times_path.read_text(), TIMES_SCHEMA).data)
+    except FileNotFoundError:
+        logger.warning(f"No command times recorded in {times_path}, using defaults")
+        return {}
+
+
+def get_ready_commands(dependencies_map, done, pending):
+    return sorted(name for name in pending if set(dependencies_map[name]) <= set(done))
+
+
 def confirm(question, default=True):
     print("\a", end="", flush=True)
     return click.confirm(question, default=default, show_default=True, prompt_suffix="")
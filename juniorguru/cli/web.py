@@ -2,7 +2,8 @@ import hashlib
 import shutil
 import subprocess
 import warnings
-from functools import cache, wraps
+from functools import cache, partial, wraps
+from multiprocessing import Pool
 from pathlib import Path
 from tempfile import TemporaryDirectory
 from time import perf_counter
@@ -11,8 +12,11 @@ import click
 from livereload import Server
 from lxml import html
 from mkdocs.__main__ import build_command as _build_mkdocs
+from mkdocs.commands.build import build as mkdocs_build
+from mkdocs.config import load_config as load_mkdocs_config
 
-from juniorguru.lib import loggers
+from juniorguru.lib import loggers, mkdocs_incremental
+from juniorguru.lib.hyphenation import Hyphenator
 from juniorguru.web_legacy.__main__ import main as flask_freeze
 
 
@@ -76,22 +80,49 @@ def build_flask(output_path: Path):
     type=click.Path(exists=True, path_type=Path),
 )
 @click.option("-w", "--warnings/--no-warnings", "warn", default=False)
+@click.option("--incremental/--full", default=False)
+@click.option("--workers", type=int, default=1)
 @building("MkDocs files")
-def build_mkdocs(context, config: Path, output_path: Path, warn: bool):
+def build_mkdocs(
+    context,
+    config: Path,
+    output_path: Path,
+    warn: bool,
+    incremental: bool,
+    workers: int,
+):
     _simplefilter = warnings.simplefilter
     if not warn:
         # Unfortunately MkDocs sets their own warnings filter, so we have to
         # nuke the whole thing to disable warnings. This is a hack, but it works.
         warnings.simplefilter = lambda *args, **kwargs: None
 
+    def run_mkdocs(site_dir: Path, dirty: bool):
+        if workers > 1:
+            build_mkdocs_parallel(config.absolute(), site_dir, workers)
+        else:
+            context.invoke(
+                _build_mkdocs,
+                config_file=str(config.absolute()),
+                site_dir=str(site_dir),
+                clean=not dirty,
+            )
+
+    if incremental:
+        # Dirty build doesn't clean the output directory and skips pages which
+        # the hooks don't consider modified since the last build
+        try:
+            run_mkdocs(output_path.absolute(), dirty=True)
+        finally:
+            warnings.simplefilter = _simplefilter
+        return
+
     # Unfortunately MkDocs doesn't support mixing with existing files inside
     # the output directory, so we have to build into a temporary directory and
     # then move the files over manually.
     with TemporaryDirectory() as temp_dir:
         try:
-            context.invoke(
-                _build_mkdocs, config_file=str(config.absolute()), site_dir=temp_dir
-            )
+            run_mkdocs(Path(temp_dir), dirty=False)
             shutil.copytree(
                 temp_dir,
                 output_path.absolute(),
@@ -102,16 +133,65 @@ def build_mkdocs(context, config: Path, output_path: Path, warn: bool):
             warnings.simplefilter = _simplefilter
 
 
+def build_mkdocs_parallel(config_path: Path, site_dir: Path, workers: int):
+    # Each worker runs the whole MkDocs build as a dirty one, but the hooks
+    # consider modified only the pages of its shard, so it renders only those.
+    # Everything else, such as the navigation, is the same as in a serial build.
+    logger.info(f"Building MkDocs files using {workers} workers")
+    with Pool(workers) as pool:
+        results = pool.map(
+            partial(build_mkdocs_shard, config_path, site_dir, workers),
+            range(workers),
+        )
+    manifest = mkdocs_incremental.BuildManifest()
+    manifest.build = results[0]["build"]
+    manifest.nav = results[0]["nav"]
+    manifest.pages = {}
+    for result in results:
+        manifest.pages.update(result["pages"])
+    for result in results:
+        manifest.pages.update(
+            {src_uri: result["pages"][src_uri] for src_uri in result["modified"]}
+        )
+    manifest.save()
+
+
+def build_mkdocs_shard(
+    config_path: Path, site_dir: Path, shards_count: int, shard_index: int
+) -> dict:
+    config = load_mkdocs_config(config_file=str(config_path), site_dir=str(site_dir))
+    config["shard"] = (shard_index, shards_count)
+    config.plugins.on_startup(command="build", dirty=True)
+    try:
+        mkdocs_build(config, dirty=True)
+    finally:
+        config.plugins.on_shutdown()
+    return dict(
+        build=config["manifest"].build,
+        nav=config["manifest"].nav,
+        pages=config["manifest"].pages,
+        modified=config["modified_pages"],
+    )
+
+
 @main.command()
 @click.argument("output_path", default="public", type=click.Path(path_type=Path))
+@click.option("--incremental/--full", default=False)
+@click.option("--workers", type=int, default=1)
 @click.pass_context
 @building("everything")
-def build(context, output_path: Path):
-    shutil.rmtree(output_path, ignore_errors=True)
+def build(context, output_path: Path, incremental: bool, workers: int):
+    if not incremental:
+        shutil.rmtree(output_path, ignore_errors=True)
     output_path.mkdir(parents=True, exist_ok=True)
     context.invoke(build_static, output_path=output_path)
     context.invoke(build_flask, output_path=output_path)
-    context.invoke(build_mkdocs, output_path=output_path)
+    context.invoke(
+        build_mkdocs,
+        output_path=output_path,
+        incremental=incremental,
+        workers=workers,
+    )
 
 
 @main.command()
@@ -119,7 +199,7 @@ def build(context, output_path: Path):
 @click.option("--open/--no-open", default=False)
 @click.pass_context
 def serve(context, output_path: Path, open: bool):
-    context.invoke(build, output_path=output_path)
+    context.invoke(build, output_path=output_path, incremental=True)
 
     def ignore_data(path) -> bool:
         return Path(path).suffix in [".db-shm", ".db-wal", ".log"]
@@ -130,10 +210,16 @@ def serve(context, output_path: Path, open: bool):
     @building("Flask and MkDocs files")
     def rebuild_flask_and_mkdocs():
         subprocess.run(["jg", "web", "build-flask", str(output_path)], check=True)
-        subprocess.run(["jg", "web", "build-mkdocs", str(output_path)], check=True)
+        subprocess.run(
+            ["jg", "web", "build-mkdocs", str(output_path), "--incremental"],
+            check=True,
+        )
 
     def rebuild_mkdocs():
-        subprocess.run(["jg", "web", "build-mkdocs", str(output_path)], check=True)
+        subprocess.run(
+            ["jg", "web", "build-mkdocs", str(output_path), "--incremental"],
+            check=True,
+        )
 
     server = Server()
     server.setHeader("Access-Control-Allow-Origin", "*")
@@ -156,51 +242,60 @@ def serve(context, output_path: Path, open: bool):
 @click.argument(
     "output_path", default="public", type=click.Path(exists=True, path_type=Path)
 )
-def post_process(output_path: Path):
-    for html_path in output_path.glob("**/*.html"):
-        logger["postprocess"].info(f"Post-processing {html_path}")
-        html_tree = html.fromstring(html_path.read_text())
-
-        # Cache busting CSS
-        # https://developer.mozilla.org/en-US/docs/Web/HTTP/Caching#cache_busting
-        for link in html_tree.cssselect('link[href$=".css"]'):
-            href = link.get("href")
-            try:
-                css_path = resolve_path(output_path, html_path, href)
-            except ValueError as e:
-                logger["postprocess"].debug(str(e))
-            else:
-                logger["postprocess"].debug(f"Cache busting {href} ({css_path})")
-                href = f"{href}?hash={hash_file(css_path)}"
-                link.set("href", href)
-
-        # Cache busting JS
-        # https://developer.mozilla.org/en-US/docs/Web/HTTP/Caching#cache_busting
-        for script in html_tree.cssselect('script[src$=".js"]'):
-            src = script.get("src")
-            try:
-                js_path = resolve_path(output_path, html_path, src)
-            except ValueError as e:
-                logger["postprocess"].debug(str(e))
-            else:
-                logger["postprocess"].debug(f"Cache busting {src} ({js_path})")
-                src = f"{src}?hash={hash_file(js_path)}"
-                script.set("src", src)
-
-        # Hyphenation
-        # https://github.com/ytiurin/hyphen
-        for document in html_tree.cssselect(".document"):
-            document_bytes = html.tostring(document, encoding="unicode").encode("utf-8")
-            result = subprocess.run(
-                ["node", "juniorguru/js/hyphenate.cjs"],
-                input=document_bytes,
-                stdout=subprocess.PIPE,
-                check=True,
-            )
-            hyphenated_document = html.fromstring(result.stdout.decode("utf-8"))
-            document.getparent().replace(document, hyphenated_document)
+@click.option("--workers", type=int, default=None)
+def post_process(output_path: Path, workers: int | None):
+    html_paths = list(output_path.glob("**/*.html"))
+    logger["postprocess"].info(f"Post-processing {len(html_paths)} HTML files")
+    with Pool(workers) as pool:
+        pool.map(partial(post_process_file, output_path), html_paths)
+
+
+def post_process_file(output_path: Path, html_path: Path):
+    logger["postprocess"].info(f"Post-processing {html_path}")
+    html_tree = html.fromstring(html_path.read_text())
+
+    # Cache busting CSS
+    # https://developer.mozilla.org/en-US/docs/Web/HTTP/Caching#cache_busting
+    for link in html_tree.cssselect('link[href$=".css"]'):
+        href = link.get("href")
+        try:
+            css_path = resolve_path(output_path, html_path, href)
+        except ValueError as e:
+            logger["postprocess"].debug(str(e))
+        else:
+            logger["postprocess"].debug(f"Cache busting {href} ({css_path})")
+            href = f"{href}?hash={hash_file(css_path)}"
+            link.set("href", href)
+
+    # Cache busting JS
+    # https://developer.mozilla.org/en-US/docs/Web/HTTP/Caching#cache_busting
+    for script in html_tree.cssselect('script[src$=".js"]'):
+        src = script.get("src")
+        try:
+            js_path = resolve_path(output_path, html_path, src)
+        except ValueError as e:
+            logger["postprocess"].debug(str(e))
+        else:
+            logger["postprocess"].debug(f"Cache busting {src} ({js_path})")
+            src = f"{src}?hash={hash_file(js_path)}"
+            script.set("src", src)
+
+    # Hyphenation
+    # https://github.com/ytiurin/hyphen
+    documents = html_tree.cssselect(".document")
+    hyphenated_documents = get_hyphenator().hyphenate(
+        [html.tostring(document, encoding="unicode") for document in documents]
+    )
+    for document, hyphenated_document in zip(documents, hyphenated_documents):
+        document.getparent().replace(document, html.fromstring(hyphenated_document))
+
+    html_path.write_text(html.tostring(html_tree, encoding="unicode"))
 
-        html_path.write_text(html.tostring(html_tree, encoding="unicode"))
+
+@cache
+def get_hyphenator() -> Hyphenator:
+    # One hyphenation process per worker process, it exits together with it
+    return Hyphenator()
 
 
 def resolve_path(output_path: Path, html_path: Path, url: str):
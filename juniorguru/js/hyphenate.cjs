@@ -1,18 +1,29 @@
 /*
   This file is used by 'jg web post-process' to hyphenate
   the '.document' part of HTML files.
+
+  It runs as a long-lived worker. Each line on stdin is a JSON
+  array of HTML strings, and for each such line it prints a line
+  with a JSON array of the same strings, hyphenated.
 */
 const readline = require('node:readline');
 const { stdin, stdout } = require('node:process');
 const { hyphenateHTMLSync } = require("hyphen/cs");
 
 
-const rl = readline.createInterface({ input: stdin, output: stdout });
-lines = []
+function hyphenate(html) {
+  // Normalizes line endings the same way reading the HTML line by line
+  // and printing the result with console.log() would
+  const lines = html.split(/\r\n|\r|\n/);
+  if (lines[lines.length - 1] === '') {
+    lines.pop();
+  }
+  return hyphenateHTMLSync(lines.join('\n')) + '\n';
+}
+
+
+const rl = readline.createInterface({ input: stdin, terminal: false });
 rl.on('line', (line) => {
-  lines.push(line);
-});
-rl.on('close', () => {
-  const html = lines.join('\n');
-  console.log(hyphenateHTMLSync(html));
+  const htmls = JSON.parse(line);
+  stdout.write(JSON.stringify(htmls.map(hyphenate)) + '\n');
 });
@@ -1,5 +1,6 @@
 import calendar
 import itertools
+from bisect import bisect_left, bisect_right
 from datetime import date, timedelta
 from functools import cache
 from numbers import Number
@@ -60,7 +61,10 @@ def per_month(fn_returning_numbers: Callable, months: Iterable[date]) -> list[Nu
 def per_month_breakdown(
     fn_returning_breakdowns: Callable, months: Iterable[date]
 ) -> dict[str, list[Number]]:
-    breakdowns = [fn_returning_breakdowns(month) for month in months]
+    return merge_breakdowns([fn_returning_breakdowns(month) for month in months])
+
+
+def merge_breakdowns(breakdowns: list[dict[str, Number]]) -> dict[str, list[Number]]:
     categories = set(
         itertools.chain.from_iterable(breakdown.keys() for breakdown in breakdowns)
     )
@@ -70,6 +74,46 @@ def per_month_breakdown(
     }
 
 
+def sum_per_range(
+    values: Iterable[tuple[date, Number]], ranges: Iterable[tuple[date, date]]
+) -> list[Number]:
+    """
+    Sums values which fall within each of given date ranges. Both ends
+    of the ranges are inclusive. Instead of going through all the values
+    for each range, sorts them once and uses cumulative sums.
+    """
+    values = sorted(values, key=lambda value: value[0])
+    dates = [value[0] for value in values]
+    sums = list(itertools.accumulate((value[1] for value in values), initial=0))
+    return [
+        sums[bisect_right(dates, to_date)] - sums[bisect_left(dates, from_date)]
+        for from_date, to_date in ranges
+    ]
+
+
+def sum_per_range_breakdown(
+    values: Iterable[tuple[date, str, Number]], ranges: Iterable[tuple[date, date]]
+) -> list[dict[str, Number]]:
+    """
+    Like sum_per_range(), but sums the values for each category separately.
+    A category is present in the breakdown of a range only if it has any
+    values within the range.
+    """
+    ranges = list(ranges)
+    values_by_category = {}
+    for date_, category, value in values:
+        values_by_category.setdefault(category, []).append((date_, value))
+
+    breakdowns = [{} for _ in ranges]
+    for category, category_values in values_by_category.items():
+        counts = sum_per_range(((date_, 1) for date_, _ in category_values), ranges)
+        sums = sum_per_range(category_values, ranges)
+        for breakdown, count, total in zip(breakdowns, counts, sums):
+            if count:
+                breakdown[category] = total
+    return breakdowns
+
+
 @cache
 def ttm_range(date: date) -> tuple[date, date]:
     try:
@@ -0,0 +1,54 @@
+import json
+import subprocess
+
+
+HYPHENATE_COMMAND = ["node", "juniorguru/js/hyphenate.cjs"]
+
+
+class Hyphenator:
+    """
+    Talks to a single long-lived hyphenation process, so that
+    the Node.js startup time is paid only once, not for each document.
+    """
+
+    def __init__(self, command: list[str] = None):
+        self.command = command or HYPHENATE_COMMAND
+        self._process = None
+
+    def __enter__(self) -> "Hyphenator":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def hyphenate(self, htmls: list[str]) -> list[str]:
+        if not htmls:
+            return []
+        if self._process is None:
+            self._process = subprocess.Popen(
+                self.command,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                encoding="utf-8",
+            )
+        try:
+            self._process.stdin.write(json.dumps(htmls) + "\n")
+            self._process.stdin.flush()
+            line = self._process.stdout.readline()
+        except BrokenPipeError:
+            line = ""
+        if not line:
+            returncode = self.close()
+            raise subprocess.CalledProcessError(returncode, self.command)
+        return json.loads(line)
+
+    def close(self) -> int | None:
+        if self._process is None:
+            return None
+        process, self._process = self._process, None
+        try:
+            process.stdin.close()
+        except BrokenPipeError:
+            pass
+        process.stdout.close()
+        return process.wait()
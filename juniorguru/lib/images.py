@@ -1,10 +1,13 @@
 import mimetypes
 import os
 import pickle
+import re
 import shutil
 import time
+from functools import cache
 from hashlib import sha256
 from io import BytesIO
+from multiprocessing import Pool
 from pathlib import Path
 from subprocess import run
 from typing import Any, Callable
@@ -23,6 +26,10 @@ IMAGES_DIR = Path("juniorguru/images")
 
 TEMPLATES_DIR = Path("juniorguru/image_templates")
 
+STYLESHEET_RE = re.compile(r'<link[^>]+href="\./([^"]+\.css)"')
+
+ASSET_RE = re.compile(r"assets/[^)\"'\s]+")
+
 
 logger = loggers.from_path(__file__)
 
@@ -65,19 +72,40 @@ def render_image_file(
     prefix=None,
     suffix=None,
 ):
-    output_dir = Path(output_dir)
-    output_dir.mkdir(exist_ok=True, parents=True)
+    with ImageRenderer() as renderer:
+        return renderer.render_image_file(
+            width,
+            height,
+            template_name,
+            context,
+            output_dir,
+            filters=filters,
+            prefix=prefix,
+            suffix=suffix,
+        )
+
 
-    cache_key = (width, height, template_name, context)
-    hash = sha256(pickle.dumps(cache_key)).hexdigest()
+def render_image_files(args_list, workers=None):
+    """
+    Renders images for given list of tuples with render_image_file() arguments.
+    Splits the work to batches so that each worker process needs to launch
+    the browser only once. Returns the image paths in the same order.
+    """
+    workers = min(workers or os.cpu_count(), len(args_list))
+    if workers <= 1:
+        return render_image_files_batch(args_list)
 
-    image_name = "-".join(filter(None, [prefix, hash, suffix])) + ".png"
-    image_path = output_dir / image_name
+    batches = [args_list[i::workers] for i in range(workers)]
+    paths = [None] * len(args_list)
+    with Pool(workers) as pool:
+        for i, batch_paths in enumerate(pool.map(render_image_files_batch, batches)):
+            paths[i::workers] = batch_paths
+    return paths
 
-    if not image_path.exists():
-        image_bytes = render_template(width, height, template_name, context, filters)
-        image_path.write_bytes(image_bytes)
-    return image_path
+
+def render_image_files_batch(args_list):
+    with ImageRenderer() as renderer:
+        return [renderer.render_image_file(*args) for args in args_list]
 
 
 def render_template(
@@ -87,54 +115,163 @@ def render_template(
     context: dict[str, Any],
     filters: dict[str, Callable] = None,
 ) -> bytes:
-    logger.info(f"Rendering {width}x{height} {template_name}")
-    if not len(list(CACHE_DIR.glob("*.css"))):
-        raise FileNotFoundError(
-            f"Cache {CACHE_DIR.absolute()} does not exist, run init_templates_cache() before rendering"
+    with ImageRenderer() as renderer:
+        return renderer.render_template(
+            width, height, template_name, context, filters=filters
         )
-    t = time.perf_counter()
 
-    cache = BytecodeCache(CACHE_DIR / "jinja")
-    environment = Environment(
-        loader=FileSystemLoader(str(TEMPLATES_DIR)),
-        auto_reload=False,
-        bytecode_cache=cache,
-    )
-    environment.filters.update(filters or {})
-    template = environment.get_template(template_name)
 
-    logger.info("Jinja rendering")
-    html = template.render(images_dir=IMAGES_DIR.absolute(), **context)
-    html_path = (
-        CACHE_DIR.absolute() / f"{os.getpid()}-{time.perf_counter_ns()}-{template_name}"
-    )
-    html_path.write_text(html)
+class ImageRenderer:
+    """
+    Renders templates to images. Launches the browser with the first image
+    to render and keeps it running until the renderer gets closed, so that
+    many images can be rendered without launching the browser for each of them.
+    """
+
+    def __init__(self):
+        self._playwright_manager = None
+        self._browser = None
+        self._page = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def render_image_file(
+        self,
+        width,
+        height,
+        template_name,
+        context,
+        output_dir,
+        filters=None,
+        prefix=None,
+        suffix=None,
+    ):
+        output_dir = Path(output_dir)
+        output_dir.mkdir(exist_ok=True, parents=True)
+
+        cache_key = (width, height, template_name, context)
+        hash = sha256(pickle.dumps(cache_key))
+        hash.update(get_template_hash(template_name).encode())
+        hash = hash.hexdigest()
+
+        image_name = "-".join(filter(None, [prefix, hash, suffix])) + ".png"
+        image_path = output_dir / image_name
+
+        if not image_path.exists():
+            image_bytes = self.render_template(
+                width, height, template_name, context, filters
+            )
+            image_path.write_bytes(image_bytes)
+        return image_path
+
+    def render_template(
+        self,
+        width: int,
+        height: int,
+        template_name: str,
+        context: dict[str, Any],
+        filters: dict[str, Callable] = None,
+    ) -> bytes:
+        logger.info(f"Rendering {width}x{height} {template_name}")
+        t = time.perf_counter()
+
+        page = self._get_page()
+        environment = get_environment(frozenset((filters or {}).items()))
+        template = environment.get_template(template_name)
+
+        logger.info("Jinja rendering")
+        html = template.render(images_dir=IMAGES_DIR.absolute(), **context)
+        html_path = (
+            CACHE_DIR.absolute()
+            / f"{os.getpid()}-{time.perf_counter_ns()}-{template_name}"
+        )
+        html_path.write_text(html)
 
-    logger.info(f"Taking screenshot {width}x{height} {html_path}")
-    with sync_playwright() as playwright:
-        browser = playwright.firefox.launch()
-        try:
-            page = browser.new_page()
-            page.set_viewport_size({"width": width, "height": height})
-            page.goto(f"file://{html_path}", wait_until="networkidle")
-            image_bytes = page.screenshot()
-            page.close()
-        finally:
-            browser.close()
-    # html_path.unlink()
+        logger.info(f"Taking screenshot {width}x{height} {html_path}")
+        page.set_viewport_size({"width": width, "height": height})
+        page.goto(f"file://{html_path}", wait_until="networkidle")
+        image_bytes = page.screenshot()
+        # html_path.unlink()
+
+        logger.info("Editing screenshot")
+        with Image.open(BytesIO(image_bytes)) as image:
+            height_ar = (image.height * width) // image.width
+            image = image.resize((width, height_ar), Image.Resampling.BICUBIC)
+            image = image.crop((0, 0, width, height))
 
-    logger.info("Editing screenshot")
-    with Image.open(BytesIO(image_bytes)) as image:
-        height_ar = (image.height * width) // image.width
-        image = image.resize((width, height_ar), Image.Resampling.BICUBIC)
-        image = image.crop((0, 0, width, height))
+            stream = BytesIO()
+            image.save(stream, "PNG", optimize=True)
+        image_bytes = stream.getvalue()
 
-        stream = BytesIO()
-        image.save(stream, "PNG", optimize=True)
-    image_bytes = stream.getvalue()
+        logger.info(f"Rendered {template_name} in {time.perf_counter() - t:.2f}s")
+        return image_bytes
 
-    logger.info(f"Rendered {template_name} in {time.perf_counter() - t:.2f}s")
-    return image_bytes
+    def close(self):
+        try:
+            if self._browser:
+                logger.debug("Closing browser")
+                self._browser.close()
+        finally:
+            if self._playwright_manager:
+                self._playwright_manager.__exit__(None, None, None)
+            self._playwright_manager = None
+            self._browser = None
+            self._page = None
+
+    def _get_page(self):
+        if not self._page:
+            if not len(list(CACHE_DIR.glob("*.css"))):
+                raise FileNotFoundError(
+                    f"Cache {CACHE_DIR.absolute()} does not exist, run init_templates_cache() before rendering"
+                )
+            logger.debug("Launching browser")
+            self._playwright_manager = sync_playwright()
+            playwright = self._playwright_manager.__enter__()
+            self._browser = playwright.firefox.launch()
+            self._page = self._browser.new_page()
+        return self._page
+
+
+@cache
+def get_template_hash(template_name: str) -> str:
+    """
+    Returns a hash of everything the template renders from, i.e. of the
+    template itself, the compiled stylesheets it links, and the assets
+    the stylesheets refer to.
+    """
+    template_path = TEMPLATES_DIR / template_name
+    template_source = template_path.read_text()
+    hash = sha256(template_source.encode())
+    for css_name in STYLESHEET_RE.findall(template_source):
+        css_path = CACHE_DIR / css_name
+        try:
+            css_source = css_path.read_text()
+        except FileNotFoundError as e:
+            raise FileNotFoundError(
+                f"Cache {CACHE_DIR.absolute()} doesn't contain {css_name}, run init_templates_cache() before rendering"
+            ) from e
+        hash.update(css_source.encode())
+        for asset_name in sorted(set(ASSET_RE.findall(css_source))):
+            try:
+                hash.update((CACHE_DIR / asset_name).read_bytes())
+            except FileNotFoundError:
+                logger.warning(f"{css_name} refers to missing {asset_name}")
+    return hash.hexdigest()
+
+
+@cache
+def get_environment(filters: frozenset = frozenset()) -> Environment:
+    environment = Environment(
+        loader=FileSystemLoader(str(TEMPLATES_DIR)),
+        auto_reload=False,
+        bytecode_cache=BytecodeCache(CACHE_DIR / "jinja"),
+    )
+    environment.filters.update(dict(filters))
+    return environment
 
 
 def init_templates_cache(cache_dir=None):
@@ -150,6 +287,7 @@ def init_templates_cache(cache_dir=None):
     logger.debug("Building static assets")
     run(["node", "esbuild-image-templates.js", str(cache_dir)], check=True)
 
+    get_template_hash.cache_clear()
     logger.info(f"Initialized {cache_dir} in {time.perf_counter() - t:.2f}s")
 
 
@@ -160,11 +298,12 @@ class PostersCache:
         self.generated_paths = set()
 
     def init(self, clear: bool = False):
+        self.existing_paths.update(self.posters_dir.glob("*.png"))
         if clear:
             logger.warning("Removing all existing posters")
             for path in self.existing_paths:
                 path.unlink()
-        self.existing_paths.update(self.posters_dir.glob("*.png"))
+            self.existing_paths.clear()
 
     def record(self, path: Path):
         self.generated_paths.add(path)
@@ -0,0 +1,170 @@
+import asyncio
+import errno
+import re
+import socket
+from collections import defaultdict
+from fnmatch import fnmatch
+from functools import partial
+from multiprocessing import Pool
+from pathlib import Path
+from typing import Iterable
+from urllib.parse import unquote, urldefrag, urljoin, urlparse
+
+import aiohttp
+from lxml import html
+
+
+WORKERS = 4
+
+CONCURRENCY = 50
+
+CONCURRENCY_PER_HOST = 2
+
+TIMEOUT_SEC = 30
+
+MAX_DRAIN_SIZE = 1024 * 1024
+
+LINK_ATTRIBUTES = [("a", "href"), ("img", "src"), ("iframe", "src")]
+
+
+def extract_links(output_path: Path, workers: int = WORKERS) -> dict[str, set[str]]:
+    """
+    Goes through all HTML files in the output directory and returns
+    a mapping of each link found to the URLs of pages where it's been found.
+
+    Links to external websites are absolute URLs without fragments,
+    links within the website are absolute paths.
+    """
+    html_paths = sorted(output_path.rglob("*.html"))
+    with Pool(workers) as pool:
+        results = pool.map(partial(extract_page_links, output_path), html_paths)
+    links = defaultdict(set)
+    for page_url, page_links in results:
+        for link in page_links:
+            links[link].add(page_url)
+    return dict(links)
+
+
+def extract_page_links(output_path: Path, html_path: Path) -> tuple[str, set[str]]:
+    page_url = get_page_url(output_path, html_path)
+    links = set()
+    content = html_path.read_bytes()
+    if not content.strip():
+        return page_url, links
+    html_tree = html.fromstring(content)
+    for tag, attribute in LINK_ATTRIBUTES:
+        for element in html_tree.iter(tag):
+            if link := normalize_link(page_url, element.get(attribute)):
+                links.add(link)
+    return page_url, links
+
+
+def get_page_url(output_path: Path, html_path: Path) -> str:
+    page_url = "/" + html_path.relative_to(output_path).as_posix()
+    return re.sub(r"(^|/)index\.html$", r"\1", page_url)
+
+
+def normalize_link(page_url: str, href: str | None) -> str | None:
+    href = (href or "").strip()
+    if not href or href.startswith("#"):
+        return None
+    try:
+        link, _ = urldefrag(urljoin(page_url, href))
+        scheme = urlparse(link).scheme
+    except ValueError:
+        return href  # malformed, let the check report it
+    if scheme in ("http", "https"):
+        return link
+    if not scheme:
+        return urlparse(link).path
+    return None  # mailto:, tel:, javascript:, data:, ...
+
+
+def is_local(link: str) -> bool:
+    return link.startswith("/")
+
+
+def is_excluded(link: str, patterns: Iterable[str]) -> bool:
+    return any(fnmatch(link, f"*{pattern}*") for pattern in patterns)
+
+
+def is_ignored_reason(reason: str, patterns: Iterable[re.Pattern]) -> bool:
+    return any(pattern.search(reason) for pattern in patterns)
+
+
+def check_local_link(output_path: Path, link: str) -> str | None:
+    path = output_path / unquote(link).lstrip("/")
+    if link.endswith("/"):
+        path = path / "index.html"
+    if path.is_file() or (path / "index.html").is_file():
+        return None
+    return "HTTP_404"
+
+
+def check_urls(urls: Iterable[str], user_agent: str) -> dict[str, str | None]:
+    """
+    Checks given URLs concurrently and returns a mapping of each URL
+    to a reason why it's broken, or to None if it's fine.
+    """
+    return asyncio.run(check_urls_async(urls, user_agent))
+
+
+async def check_urls_async(
+    urls: Iterable[str], user_agent: str
+) -> dict[str, str | None]:
+    urls = list(urls)
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+    host_semaphores = defaultdict(lambda: asyncio.Semaphore(CONCURRENCY_PER_HOST))
+    connector = aiohttp.TCPConnector(limit=CONCURRENCY, ttl_dns_cache=300)
+    timeout = aiohttp.ClientTimeout(total=TIMEOUT_SEC)
+    async with aiohttp.ClientSession(
+        connector=connector, timeout=timeout, headers={"User-Agent": user_agent}
+    ) as session:
+
+        async def check(url: str) -> str | None:
+            async with host_semaphores[get_hostname(url)], semaphore:
+                return await check_url(session, url)
+
+        reasons = await asyncio.gather(*map(check, urls))
+    return dict(zip(urls, reasons))
+
+
+def get_hostname(url: str) -> str | None:
+    try:
+        return urlparse(url).hostname
+    except ValueError:
+        return None
+
+
+async def check_url(session: aiohttp.ClientSession, url: str) -> str | None:
+    # GET, because some sites return strange codes in response to HEAD :(
+    try:
+        async with session.get(url) as response:
+            if response.status >= 400:
+                return f"HTTP_{response.status}"
+            # Reading the body lets the connection be reused for the next URL
+            content_length = response.content_length
+            if content_length is not None and content_length <= MAX_DRAIN_SIZE:
+                await response.read()
+            return None
+    except asyncio.TimeoutError:
+        return "TIMEOUT"
+    except aiohttp.ClientSSLError:
+        return "ERRNO_EPROTO"
+    except aiohttp.ClientConnectorError as e:
+        return get_os_error_reason(e.os_error)
+    except aiohttp.TooManyRedirects:
+        return "TOO_MANY_REDIRECTS"
+    except (aiohttp.InvalidURL, ValueError):
+        return "INVALID_URL"
+    except aiohttp.ClientError:
+        return "UNKNOWN"
+
+
+def get_os_error_reason(error: OSError) -> str:
+    if isinstance(error, socket.gaierror):
+        return "ERRNO_ENOTFOUND"
+    try:
+        return f"ERRNO_{errno.errorcode[error.errno]}"
+    except KeyError:
+        return "UNKNOWN"
@@ -82,6 +82,12 @@ ADDRESS_TYPES_MAPPING = {
 
 RETRY_ON_503_MAX_SECONDS = 3
 
+GEOCODE_CACHE_TAG = "geocode"
+
+GEOCODE_CACHE_EXPIRE = 60 * 60 * 24 * 30
+
+GEOCODE_CACHE_EXPIRE_EMPTY = 60 * 60 * 24 * 3
+
 
 class GeocodeError(Exception):
     pass
@@ -111,16 +117,56 @@ def fetch_location(location_raw, geocode=None, debug_info=None):
 
 
 def optimize_geocoding(geocode):
+    cached_geocode = lru_cache(geocode)
+
     @wraps(geocode)
     def wrapper(location_raw):
         for location_re, value in OPTIMIZATIONS:
             if location_re.search(location_raw):
                 return value
-        return lru_cache(geocode)(location_raw)
+        return cached_geocode(location_raw)
 
     return wrapper
 
 
+def cache_geocoding(
+    geocode,
+    cache,
+    expire=GEOCODE_CACHE_EXPIRE,
+    expire_empty=GEOCODE_CACHE_EXPIRE_EMPTY,
+):
+    """
+    Wraps given geocode function so that its results persist in given cache.
+    Empty results are cached too, but expire sooner. Errors aren't cached.
+    """
+
+    @wraps(geocode)
+    def wrapper(location_raw):
+        cache_key = f"{GEOCODE_CACHE_TAG}:{normalize_location_raw(location_raw)}"
+        try:
+            address = cache[cache_key]
+            logger.debug(f"Loading from cache: {cache_key}")
+            return address
+        except KeyError:
+            pass
+
+        address = geocode(location_raw)
+        logger.debug(f"Saving to cache: {cache_key}")
+        cache.set(
+            cache_key,
+            address,
+            expire=expire if address else expire_empty,
+            tag=GEOCODE_CACHE_TAG,
+        )
+        return address
+
+    return wrapper
+
+
+def normalize_location_raw(location_raw):
+    return " ".join(location_raw.split()).lower()
+
+
 @optimize_geocoding
 def geocode_mapycz(location_raw):
     try:
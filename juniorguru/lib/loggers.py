@@ -85,6 +85,8 @@ def _get_process_suffix(process_name: str) -> str:
         process_name.replace("MainProcess", "")
         .replace("SpawnPoolWorker-", "/worker")
         .replace("ForkPoolWorker-", "/worker")
+        .replace("SpawnProcess-", "/worker")
+        .replace("ForkProcess-", "/worker")
         .replace("Process-", "/process")
     )
 
@@ -3,8 +3,11 @@ import hashlib
 import json
 import os
 import re
+import threading
 import time
-from typing import Any, Callable, Generator
+from concurrent.futures import ThreadPoolExecutor
+from queue import Empty, Queue
+from typing import Any, Generator, Iterable
 from urllib.parse import urlencode
 
 import requests
@@ -28,6 +31,12 @@ MEMBERFUL_PASSWORD = os.environ.get("MEMBERFUL_PASSWORD")
 
 DOWNLOAD_POLLING_WAIT_SEC = 5
 
+CACHE_EXPIRE_SEC = 60 * 60 * 24
+
+CHECKPOINT_EXPIRE_SEC = 60 * 60 * 24 * 7
+
+CONCURRENT_POLLING_WAIT_SEC = 0.1
+
 
 logger = loggers.from_path(__file__)
 
@@ -41,27 +50,36 @@ class MemberfulAPI:
         api_key: str = None,
         cache: Cache = None,
         clear_cache: bool = False,
+        requests_per_sec: float = None,
     ):
         self.cache = cache
         self.clear_cache = clear_cache
         self.api_key = api_key or MEMBERFUL_API_KEY
-        self._client = None
+        self.requests_per_sec = requests_per_sec
+        self._next_request_at = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
 
     @property
     def client(self) -> Client:
-        if not self._client:
-            logger.debug("Connecting")
-            transport = RequestsHTTPTransport(
-                url="https://juniorguru.memberful.com/api/graphql/",
-                headers={
-                    "Authorization": f"Bearer {self.api_key}",
-                    "User-Agent": USER_AGENT,
-                },
-                verify=True,
-                retries=3,
-            )
-            self._client = Client(transport=transport)
-        return self._client
+        # The client connects and disconnects its transport on each execution
+        # and doesn't allow doing that concurrently, hence one per thread
+        if not getattr(self._local, "client", None):
+            self._local.client = self._create_client()
+        return self._local.client
+
+    def _create_client(self) -> Client:
+        logger.debug("Connecting")
+        transport = RequestsHTTPTransport(
+            url="https://juniorguru.memberful.com/api/graphql/",
+            headers={
+                "Authorization": f"Bearer {self.api_key}",
+                "User-Agent": USER_AGENT,
+            },
+            verify=True,
+            retries=3,
+        )
+        return Client(transport=transport)
 
     def mutate(self, mutation: str, variable_values: dict) -> dict[str, Any]:
         logger.debug("Sending a mutation")
@@ -79,18 +97,17 @@ class MemberfulAPI:
         duplicates_count = 0
         seen_node_ids = set()
         for result in self._query(
-            query,
-            lambda result: result[collection_name]["pageInfo"],
-            variable_values=variable_values,
+            query, collection_name, variable_values=variable_values
         ):
-            # save total count so we can later check if we got all the nodes
+            # save total count so we can later check if we got all the nodes,
+            # pages resumed from a checkpoint can declare less than the fresh ones
             count = result[collection_name]["totalCount"]
             if declared_count is None:
                 logger.debug(f"Expecting {count} nodes")
                 declared_count = count
-            assert (
-                declared_count == count
-            ), f"Memberful API suddenly declares different total count: {count} (≠ {declared_count})"
+            elif count > declared_count:
+                logger.debug(f"Expecting {count} nodes (was {declared_count})")
+                declared_count = count
 
             # iterate over nodes and drop duplicates, because, unfortunately, the API returns duplicates
             for edge in result[collection_name]["edges"]:
@@ -110,49 +127,199 @@ class MemberfulAPI:
             declared_count == nodes_count
         ), f"Memberful API returned {nodes_count} nodes instead of {declared_count}"
 
-    def _query(self, query: str, get_page_info: Callable, variable_values: dict = None):
+    def get_nodes_concurrently(
+        self, queries: Iterable[tuple[str, dict | None]], workers: int = 4
+    ) -> Generator[dict, None, None]:
+        nodes = Queue()
+
+        def crawl(query: str, variable_values: dict | None) -> None:
+            for node in self.get_nodes(query, variable_values):
+                nodes.put(node)
+
+        # Nodes are passed on as soon as any of the threads gets them
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(crawl, query, variable_values)
+                for query, variable_values in queries
+            }
+            while futures or not nodes.empty():
+                try:
+                    yield nodes.get(timeout=CONCURRENT_POLLING_WAIT_SEC)
+                except Empty:
+                    for future in [future for future in futures if future.done()]:
+                        future.result()  # raises if the thread failed
+                        futures.remove(future)
+
+    def _query(
+        self, query: str, collection_name: str, variable_values: dict = None
+    ) -> Generator[dict, None, None]:
+        # If a crawl gets interrupted (e.g. the API bans the IP address), the pages
+        # stay in cache longer than usual and a checkpoint remembers their cursors.
+        # The next run replays them from the cache and continues where the previous
+        # one ended. Once the crawl finishes, the checkpoint is dropped and the pages
+        # get the usual expiration.
         variable_values = variable_values or {}
-        cursor = ""
+        checkpoint_key = hash_data(
+            dict(query=query, variable_values=variable_values, checkpoint=True)
+        )
+        checkpoint = self._load_checkpoint(checkpoint_key)
+        if checkpoint["cursors"]:
+            checkpoint = self._check_checkpoint(
+                query, collection_name, variable_values, checkpoint_key, checkpoint
+            )
+        if checkpoint["cursors"]:
+            logger.info(
+                f"Resuming {collection_name} from a checkpoint, "
+                f"{len(checkpoint['cursors'])} pages already fetched"
+            )
+        cursors = list(checkpoint["cursors"]) or [""]
         n = 0
-        while cursor is not None:
+        while n < len(cursors):
+            cursor = cursors[n]
             logger.debug(f"Sending a query with cursor {cursor!r}")
-            result = self._execute_query(query, dict(cursor=cursor, **variable_values))
+            result = self._execute_query(
+                query,
+                dict(cursor=cursor, **variable_values),
+                expire=CHECKPOINT_EXPIRE_SEC,
+            )
+
+            total_count = result[collection_name]["totalCount"]
+            checkpoint["total_count"] = max(checkpoint["total_count"] or 0, total_count)
+
+            page_info = result[collection_name]["pageInfo"]
+            if page_info["hasNextPage"] and n + 1 == len(cursors):
+                cursors.append(page_info["endCursor"])
+            if n + 1 > len(checkpoint["cursors"]):
+                checkpoint["cursors"] = cursors[: n + 1]
+                self._save_checkpoint(checkpoint_key, checkpoint)
             yield result
             n += 1
-            page_info = get_page_info(result)
-            if page_info["hasNextPage"]:
-                cursor = page_info["endCursor"]
-            else:
-                cursor = None
 
-    def _execute_query(self, query: str, variable_values: dict) -> dict:
-        cache_tag = self.__class__.__name__.lower()
+        self._delete_checkpoint(checkpoint_key)
+        if self.cache is not None:
+            for cursor in cursors:
+                cache_key = self._get_cache_key(
+                    query, dict(cursor=cursor, **variable_values)
+                )
+                self.cache.touch(cache_key, expire=CACHE_EXPIRE_SEC)
 
-        if self.cache:
+    def _check_checkpoint(
+        self,
+        query: str,
+        collection_name: str,
+        variable_values: dict,
+        checkpoint_key: str,
+        checkpoint: dict,
+    ) -> dict:
+        # New nodes only make the collection longer, so following the cursors
+        # from the checkpoint gets them all, as long as the last page gets fetched
+        # again. If some nodes got deleted, though, the pages in cache don't fit
+        # anymore and the crawl must start over.
+        result = self._execute_query(
+            query,
+            dict(cursor="", **variable_values),
+            expire=CHECKPOINT_EXPIRE_SEC,
+            refresh=True,
+        )
+        total_count = result[collection_name]["totalCount"]
+        if total_count == checkpoint["total_count"]:
+            return checkpoint
+        if total_count > checkpoint["total_count"]:
+            logger.info(
+                f"Memberful API declares {total_count} {collection_name}, the checkpoint "
+                f"was made with {checkpoint['total_count']}, fetching the rest"
+            )
+            stale_cursors = checkpoint["cursors"][-1:]
+        else:
+            logger.warning(
+                f"Memberful API declares {total_count} {collection_name}, but the checkpoint "
+                f"was made with {checkpoint['total_count']}, starting over"
+            )
+            self._delete_checkpoint(checkpoint_key)
+            stale_cursors = checkpoint["cursors"]
+            checkpoint = dict(cursors=[], total_count=None)
+        for cursor in stale_cursors:
+            if cursor:  # the first page has just been fetched
+                self.cache.delete(
+                    self._get_cache_key(query, dict(cursor=cursor, **variable_values))
+                )
+        return checkpoint
+
+    def _load_checkpoint(self, checkpoint_key: str) -> dict:
+        if self.cache is not None:
+            self._clear_cache_if_requested()
+            if checkpoint := self.cache.get(checkpoint_key):
+                return checkpoint
+        return dict(cursors=[], total_count=None)
+
+    def _save_checkpoint(self, checkpoint_key: str, checkpoint: dict) -> None:
+        if self.cache is not None:
+            self.cache.set(
+                checkpoint_key,
+                checkpoint,
+                expire=CHECKPOINT_EXPIRE_SEC,
+                tag=self._cache_tag,
+            )
+
+    def _delete_checkpoint(self, checkpoint_key: str) -> None:
+        if self.cache is not None:
+            self.cache.delete(checkpoint_key)
+
+    @property
+    def _cache_tag(self) -> str:
+        return self.__class__.__name__.lower()
+
+    def _get_cache_key(self, query: str, variable_values: dict) -> str:
+        return hash_data(dict(query=query, variable_values=variable_values))
+
+    def _clear_cache_if_requested(self) -> None:
+        with self._lock:
             if self.clear_cache:
                 logger.debug("Clearing cache")
-                self.cache.evict(cache_tag)
+                self.cache.evict(self._cache_tag)
                 self.clear_cache = False
 
-            cache_key = hash_data(dict(query=query, variable_values=variable_values))
-            try:
-                result = self.cache[cache_key]
-                logger.debug(f"Loading from cache: {cache_key}")
-                return result
-            except KeyError:
-                pass
-
+    def _execute_query(
+        self,
+        query: str,
+        variable_values: dict,
+        expire: int = CACHE_EXPIRE_SEC,
+        refresh: bool = False,
+    ) -> dict:
+        if self.cache is not None:
+            self._clear_cache_if_requested()
+            cache_key = self._get_cache_key(query, variable_values)
+            if not refresh:
+                try:
+                    result = self.cache[cache_key]
+                    logger.debug(f"Loading from cache: {cache_key}")
+                    return result
+                except KeyError:
+                    pass
+
+        self._wait_for_rate_limit()
         logger.debug(
             f"Querying Memberful API, variable values: {json.dumps(variable_values)}"
         )
         result = self.client.execute(gql(query), variable_values=variable_values)
 
-        if self.cache:
+        if self.cache is not None:
             logger.debug(f"Saving to cache: {cache_key}")
-            self.cache.set(cache_key, result, tag=cache_tag)
+            self.cache.set(cache_key, result, expire=expire, tag=self._cache_tag)
 
         return result
 
+    def _wait_for_rate_limit(self) -> None:
+        if not self.requests_per_sec:
+            return
+        with self._lock:
+            now = time.monotonic()
+            if (wait_sec := self._next_request_at - now) > 0:
+                logger.debug(f"Waiting {wait_sec:.2f}s to respect the rate limit")
+                time.sleep(wait_sec)
+                now += wait_sec
+            self._next_request_at = now + (1 / self.requests_per_sec)
+
 
 def hash_data(data: dict) -> str:
     return hashlib.sha256(json.dumps(data).encode()).hexdigest()
@@ -213,7 +380,7 @@ class MemberfulCSV:
         url = f"https://juniorguru.memberful.com/admin/csv_exports?{urlencode(params)}"
         logger.debug(f"Looking CSV export: {url}")
 
-        if self.cache:
+        if self.cache is not None:
             if self.clear_cache:
                 logger.debug("Clearing cache")
                 self.cache.evict(cache_tag)
@@ -253,7 +420,7 @@ class MemberfulCSV:
             raise DownloadError("Failed to download the CSV export")
         data = response.content.decode("utf-8")
 
-        if self.cache:
+        if self.cache is not None:
             logger.debug(f"Saving to cache: {cache_key}")
             self.cache.set(cache_key, data, tag=cache_tag)
 
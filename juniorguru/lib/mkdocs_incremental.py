@@ -0,0 +1,209 @@
+import hashlib
+import json
+import re
+from collections import defaultdict
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Iterable, Mapping
+
+from mkdocs.structure.files import File, Files
+from mkdocs.structure.pages import Page
+from peewee import Database, Model
+
+from juniorguru.lib.mkdocs_jinja import LazyValue, current_page
+
+
+MANIFEST_PATH = Path(".web_cache/incremental.json")
+
+TABLE_RE = re.compile(r'\b(?:FROM|JOIN)\s+"(\w+)"', re.IGNORECASE)
+
+
+class BuildManifest:
+    """
+    Remembers what each page depended on the last time it was rendered,
+    so that a dirty MkDocs build can skip pages which would come out the same.
+
+    A page is considered modified if the code and templates of the whole
+    site changed, if titles or meta of any page changed, if its source file
+    changed, if any of the lazy context values it used during its last rendering
+    has now a different fingerprint, or if any of the database tables it read
+    has now a different content.
+    """
+
+    def __init__(self, path: Path = MANIFEST_PATH):
+        self.path = path
+        try:
+            data = json.loads(path.read_text())
+        except (FileNotFoundError, ValueError):
+            data = {}
+        self.build = data.get("build")
+        self.nav = data.get("nav")
+        self.pages = data.get("pages", {})
+
+    def is_modified(
+        self,
+        file: File,
+        build: str,
+        lazy_values: dict[str, LazyValue],
+        tables: "DatabaseTables",
+    ) -> bool:
+        if build != self.build:
+            return True
+        if not Path(file.abs_dest_path).exists():
+            return True
+        try:
+            page = self.pages[file.src_uri]
+        except KeyError:
+            return True
+        if page["source"] != hash_file(file.abs_src_path):
+            return True
+        for key, value_fingerprint in page["context"].items():
+            try:
+                lazy_value = lazy_values[key]
+            except KeyError:
+                return True
+            if value_fingerprint != fingerprint(lazy_value.get()):
+                return True
+        for table, table_fingerprint in page["tables"].items():
+            if table_fingerprint != tables.fingerprint(table):
+                return True
+        return False
+
+    def is_nav_modified(self, nav: str) -> bool:
+        return nav != self.nav
+
+    def update(
+        self,
+        files: Iterable[File],
+        build: str,
+        nav: str,
+        lazy_values: dict[str, LazyValue],
+        tables: "DatabaseTables",
+        modified: set[str],
+    ) -> None:
+        pages = {}
+        for file in files:
+            if file.src_uri in modified:
+                pages[file.src_uri] = dict(
+                    source=hash_file(file.abs_src_path),
+                    context={
+                        key: fingerprint(lazy_value.get())
+                        for key, lazy_value in lazy_values.items()
+                        if file.src_uri in lazy_value.pages
+                    },
+                    tables={
+                        table: tables.fingerprint(table)
+                        for table in sorted(tables.pages[file.src_uri])
+                    },
+                )
+            elif file.src_uri in self.pages:
+                pages[file.src_uri] = self.pages[file.src_uri]
+        self.build = build
+        self.nav = nav
+        self.pages = pages
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.write_text(
+            json.dumps(dict(build=self.build, nav=self.nav, pages=self.pages))
+        )
+
+
+class DatabaseTables:
+    """
+    Records which database tables each page reads while it's being rendered.
+
+    Templates often query the database directly, e.g. through backrefs
+    of model instances, which doesn't go through any lazy context value.
+    """
+
+    def __init__(self, db: Database):
+        self.db = db
+        self.pages = defaultdict(set)
+        self._fingerprints = {}
+
+    def install(self) -> None:
+        execute_sql = self.db.execute_sql
+
+        def recording_execute_sql(sql, *args, **kwargs):
+            if page := current_page.get(None):
+                self.pages[page.file.src_uri].update(TABLE_RE.findall(sql))
+            return execute_sql(sql, *args, **kwargs)
+
+        self.db.execute_sql = recording_execute_sql
+
+    def uninstall(self) -> None:
+        self.db.__dict__.pop("execute_sql", None)
+
+    def fingerprint(self, table: str) -> str | None:
+        try:
+            return self._fingerprints[table]
+        except KeyError:
+            if self.db.table_exists(table):
+                cursor = self.db.execute_sql(f'SELECT * FROM "{table}"')
+                # Sorted, so that the order of rows doesn't matter
+                value = fingerprint(sorted(fingerprint(row) for row in cursor))
+            else:
+                value = None
+            self._fingerprints[table] = value
+            return value
+
+
+def collect_lazy_values(
+    context: Mapping[str, Any], prefix: str = ""
+) -> dict[str, LazyValue]:
+    lazy_values = {}
+    for key, value in context.items():
+        if isinstance(value, LazyValue):
+            lazy_values[f"{prefix}{key}"] = value
+        elif isinstance(value, Mapping):
+            lazy_values.update(collect_lazy_values(value, prefix=f"{prefix}{key}."))
+    return lazy_values
+
+
+def get_build_fingerprint(paths: Iterable[Path], files: Files) -> str:
+    hash = hashlib.sha1()
+    for path in sorted(paths):
+        hash.update(str(path).encode())
+        hash.update(hash_file(path).encode())
+    # Adding, removing or renaming a page changes URLs and navigation
+    # on other pages, so it invalidates everything
+    for file in sorted(files.documentation_pages(), key=lambda file: file.src_uri):
+        hash.update(file.src_uri.encode())
+    return hash.hexdigest()
+
+
+def get_nav_fingerprint(pages: Iterable[Page]) -> str:
+    # Titles and meta of all pages get rendered on other pages, e.g. as
+    # the navigation, menu, or parent page, so a change invalidates everything
+    hash = hashlib.sha1()
+    for page in sorted(pages, key=lambda page: page.file.src_uri):
+        hash.update(page.file.src_uri.encode())
+        hash.update(serialize(page.title).encode())
+        hash.update(serialize(page.meta).encode())
+    return hash.hexdigest()
+
+
+def hash_file(path: Path | str) -> str:
+    return hashlib.sha1(Path(path).read_bytes()).hexdigest()
+
+
+def fingerprint(value: Any) -> str:
+    return hashlib.sha1(serialize(value).encode()).hexdigest()
+
+
+def serialize(value: Any) -> str:
+    if isinstance(value, Model):
+        return f"{value.__class__.__name__}({serialize(value.__data__)})"
+    if isinstance(value, dict):
+        items = sorted(
+            (serialize(key), serialize(value)) for key, value in value.items()
+        )
+        return "{" + ", ".join(f"{key}: {value}" for key, value in items) + "}"
+    if isinstance(value, (set, frozenset)):
+        return "{" + ", ".join(sorted(serialize(item) for item in value)) + "}"
+    if isinstance(value, (list, tuple)):
+        return "[" + ", ".join(serialize(item) for item in value) + "]"
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return repr(value)
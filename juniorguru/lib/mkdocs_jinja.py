@@ -1,10 +1,17 @@
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
 from pathlib import Path
-from typing import Callable
+from time import perf_counter
+from typing import Any, Callable, Generator, Mapping
 
 from jinja2 import Environment, FileSystemLoader
+from jinja2.runtime import Context
+from markdown import Markdown
 from mkdocs.config import Config
 from mkdocs.structure.files import File, Files
-from mkdocs.structure.pages import Page
+from mkdocs.structure.pages import Page, _RelativePathTreeprocessor
 from mkdocs.structure.toc import get_toc
 from mkdocs.utils.filters import url_filter
 
@@ -41,6 +48,9 @@ TEMPLATE_FILTERS = [
 logger = loggers.from_path(__file__)
 
 
+current_page: ContextVar[Page] = ContextVar("current_page")
+
+
 def monkey_patch() -> None:
     # Monkey patch the File class so that it recognizes both
     # .jinja and .md.jinja files as documentation pages
@@ -78,43 +88,157 @@ def get_filters() -> dict[str, Callable]:
     return {name: getattr(template_filters, name) for name in TEMPLATE_FILTERS}
 
 
-def get_env(page: Page, config: Config, files: Files) -> Environment:
+def get_env(
+    config: Config, files: Files, timings: "BuildTimings" = None
+) -> Environment:
+    # Meant to be created once per build. Whatever differs from page to page
+    # goes to the context when rendering, or to current_page (see rendering_page)
     loader = FileSystemLoader(get_macros_dir(config))
     cache = BytecodeCache(CACHE_DIR)
     env = Environment(loader=loader, auto_reload=False, bytecode_cache=cache)
+    env.context_class = LazyContext
     env.filters.update(get_filters())
     env.filters["url"] = url_filter
-    env.filters["md"] = create_md_filter(page, config, files)
+    env.filters["md"] = create_md_filter(config, files, timings=timings)
     return env
 
 
-def create_md_filter(page: Page, config: Config, files: Files) -> Callable:
+@contextmanager
+def rendering_page(page: Page) -> Generator[None, None, None]:
+    token = current_page.set(page)
+    try:
+        yield
+    finally:
+        current_page.reset(token)
+
+
+def create_md_filter(
+    config: Config, files: Files, timings: "BuildTimings" = None
+) -> Callable:
+    # Sorcery ahead! So this is a Jinja filter, which takes a Markdown string, e.g. from
+    # database, and turns it into HTML markup. One could just 'from markdown import markdown',
+    # then call 'markdown(...)' and be done with it, but that wouldn't parse the input in the
+    # context of MkDocs Markdown settings. Extensions wouldn't be set the same way. Relative
+    # links wouldn't work. For that reason, we want to use the MkDocs' own Markdown rendering.
+    #
+    # Unfortunately, the Page.render() method isn't really meant to be used anywhere else:
+    # https://github.com/mkdocs/mkdocs/blob/79f17b4b71c73460c304e3281f6ff209788a76bf/mkdocs/structure/pages.py#L253
+    #
+    # Building the Markdown object with all the extensions is expensive and templates call
+    # this filter hundreds of times per page, so the following mimics what Page.render()
+    # does, but keeps one Markdown object per thread and only resets it between calls.
+    # The only part specific to a page is the processor taking care of relative links,
+    # which gets replaced whenever the current page changes.
+    #
+    # This works, but is very prone to get broken if MkDocs changes something in their code.
+    # In such case one needs to read the new MkDocs code and fix the solution accordingly.
+    local = threading.local()
+
+    def get_markdown(page: Page) -> Markdown:
+        if getattr(local, "markdown", None) is None:
+            local.markdown = Markdown(
+                extensions=config["markdown_extensions"],
+                extension_configs=config["mdx_configs"] or {},
+            )
+            local.file = None
+        if local.file is not page.file:
+            relative_path_ext = _RelativePathTreeprocessor(page.file, files, config)
+            relative_path_ext._register(local.markdown)
+            local.file = page.file
+        return local.markdown.reset()
+
     def md(markdown: str) -> str:
-        # Sorcery ahead! So this is a Jinja filter, which takes a Markdown string, e.g. from
-        # database, and turns it into HTML markup. One could just 'from markdown import markdown',
-        # then call 'markdown(...)' and be done with it, but that wouldn't parse the input in the
-        # context of MkDocs Markdown settings. Extensions wouldn't be set the same way. Relative
-        # links wouldn't work. For that reason, we want to use the MkDocs' own Markdown rendering.
-        #
-        # Unfortunately, the Page.render() method isn't really meant to be used anywhere else:
-        # https://github.com/mkdocs/mkdocs/blob/79f17b4b71c73460c304e3281f6ff209788a76bf/mkdocs/structure/pages.py#L253
-        #
-        # The following sorcery works around that bit. It creates an artificial _Page object similar
-        # to the real MkDocs' own Page object, but only with the properties used by the Page.render()
-        # method. It sets all the configuration, passes the input as the 'markdown' property, and
-        # steals the Page.render() method to behave like if it always belonged to the _Page object.
-        # Then it calls this new _Page.render() method and returns the 'content' property, to which
-        # the method sets the result of the rendering.
-        #
-        # This works, but is very prone to get broken if MkDocs changes something in their code.
-        # In such case one needs to read the new MkDocs code and fix the solution accordingly.
-        class _Page:
-            def __init__(self):
-                self.file = page.file
-                self.markdown = markdown
-
-        _page = _Page()
-        Page._original_render(_page, config, files)
-        return _page.content
+        started_at = perf_counter()
+        try:
+            return get_markdown(current_page.get()).convert(markdown)
+        finally:
+            if timings is not None:
+                timings.add("md", perf_counter() - started_at)
 
     return md
+
+
+class BuildTimings:
+    def __init__(self):
+        self.totals = Counter()
+        self.counts = Counter()
+        self.pages = Counter()
+        self._lock = threading.Lock()
+
+    def add(self, name: str, duration: float, page: Page = None) -> None:
+        with self._lock:
+            self.totals[name] += duration
+            self.counts[name] += 1
+            if page is not None:
+                self.pages[page.file.src_uri] += duration
+
+    @contextmanager
+    def measure(self, name: str, page: Page = None) -> Generator[None, None, None]:
+        started_at = perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, perf_counter() - started_at, page=page)
+
+    def report(self, pages_count: int = 10) -> list[str]:
+        lines = [
+            f"{name}: {total:.2f}s in {self.counts[name]} calls"
+            for name, total in self.totals.most_common()
+        ]
+        lines.extend(
+            f"{src_uri}: {total:.2f}s"
+            for src_uri, total in self.pages.most_common(pages_count)
+        )
+        return lines
+
+
+class LazyValue:
+    """
+    Context value, which gets computed on first access and then
+    remembered. Keeps track of how long it took and where it's used.
+    """
+
+    def __init__(self, fn: Callable[[], Any]):
+        self.fn = fn
+        self.duration = None
+        self.hits = 0
+        self.pages = set()
+        self._value = None
+        self._lock = threading.Lock()
+
+    def get(self) -> Any:
+        with self._lock:
+            if self.duration is None:
+                started_at = perf_counter()
+                self._value = self.fn()
+                self.duration = perf_counter() - started_at
+            self.hits += 1
+            if page := current_page.get(None):
+                self.pages.add(page.file.src_uri)
+            return self._value
+
+
+class LazyContext(Context):
+    def resolve_or_missing(self, key: str) -> Any:
+        value = super().resolve_or_missing(key)
+        if isinstance(value, LazyValue):
+            return value.get()
+        return value
+
+
+def report_lazy_values(context: Mapping[str, Any]) -> list[str]:
+    lazy_values = {
+        key: value for key, value in context.items() if isinstance(value, LazyValue)
+    }
+    lines = []
+    for key, value in sorted(
+        lazy_values.items(), key=lambda item: item[1].duration or 0, reverse=True
+    ):
+        if value.duration is None:
+            lines.append(f"{key}: never used")
+        else:
+            lines.append(
+                f"{key}: {value.duration:.2f}s, "
+                f"{value.hits} hits on {len(value.pages)} pages"
+            )
+    return lines
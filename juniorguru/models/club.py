@@ -6,6 +6,7 @@ from typing import Iterable, Self
 
 from peewee import (
     BooleanField,
+    Case,
     CharField,
     DateTimeField,
     ForeignKeyField,
@@ -168,6 +169,69 @@ class ClubUser(BaseModel):
             self.coupon and parse_coupon(self.coupon)["slug"] in ("founders", "founder")
         )
 
+    @classmethod
+    def members_stats(cls, today=None, days=RECENT_PERIOD_DAYS) -> dict[int, dict]:
+        today = today or date.today()
+        recent_period_start_at = today - timedelta(days=days)
+
+        is_public = ClubMessage.is_private == False
+        is_recent = ClubMessage.created_at >= recent_period_start_at
+        is_upvotable = ClubMessage.parent_channel_id.not_in(UPVOTES_EXCLUDE_CHANNELS)
+        is_intro = (ClubMessage.channel_id == ClubChannelID.INTRO) & (
+            ClubMessage.type == "default"
+        )
+
+        def sum_if(condition, field):
+            return fn.coalesce(fn.sum(Case(None, [(condition, field)], 0)), 0)
+
+        messages_stats = {
+            row["author_id"]: row
+            for row in ClubMessage.select(
+                ClubMessage.author.alias("author_id"),
+                sum_if(is_public, ClubMessage.content_size).alias("content_size"),
+                sum_if(is_public & is_recent, ClubMessage.content_size).alias(
+                    "recent_content_size"
+                ),
+                sum_if(is_public & is_upvotable, ClubMessage.upvotes_count).alias(
+                    "upvotes_count"
+                ),
+                sum_if(
+                    is_public & is_recent & is_upvotable, ClubMessage.upvotes_count
+                ).alias("recent_upvotes_count"),
+                sum_if(is_public & is_intro, 1).alias("intros_count"),
+                fn.min(ClubMessage.created_at).alias("first_message_at"),
+            )
+            .group_by(ClubMessage.author)
+            .dicts()
+        }
+        first_pins_at = dict(
+            ClubPin.select(ClubPin.member, fn.min(ClubMessage.created_at))
+            .join(ClubMessage, on=(ClubPin.pinned_message == ClubMessage.id))
+            .group_by(ClubPin.member)
+            .tuples()
+        )
+
+        stats = {}
+        for member in cls.members_listing():
+            member_stats = messages_stats.get(member.id, {})
+            first_seen_at = member_stats.get("first_message_at") or first_pins_at.get(
+                member.id
+            )
+            first_seen_on = first_seen_at.date() if first_seen_at else member.joined_on
+            stats[member.id] = dict(
+                content_size=member_stats.get("content_size", 0),
+                recent_content_size=member_stats.get("recent_content_size", 0),
+                upvotes_count=member_stats.get("upvotes_count", 0),
+                recent_upvotes_count=member_stats.get("recent_upvotes_count", 0),
+                has_intro=member_stats.get("intros_count", 0) > 0,
+                first_seen_on=first_seen_on,
+                is_new=(
+                    first_seen_on is not None
+                    and (first_seen_on + timedelta(days=IS_NEW_PERIOD_DAYS)) >= today
+                ),
+            )
+        return stats
+
     @classmethod
     def get_member_by_id(cls, id):
         return cls.members_listing().where(cls.id == id).get()
@@ -231,6 +295,7 @@ class ClubMessage(BaseModel):
     downvotes_count = IntegerField(default=0)
     created_at = DateTimeField(index=True)
     created_month = CharField(index=True)
+    edited_at = DateTimeField(null=True)
     author = ForeignKeyField(ClubUser, backref="list_messages")
     author_is_bot = BooleanField()
     channel_id = IntegerField(index=True)
@@ -288,6 +353,18 @@ class ClubMessage(BaseModel):
         )
         return sum(message.content_size for message in messages)
 
+    @classmethod
+    def content_size_per_month(cls, months):
+        sizes = dict(
+            cls.select(cls.created_month, fn.sum(cls.content_size))
+            .where(cls.author_is_bot == False)
+            .where(cls.is_private == False)
+            .where(cls.channel_id.not_in(STATS_EXCLUDE_CHANNELS))
+            .group_by(cls.created_month)
+            .tuples()
+        )
+        return [sizes.get(f"{month:%Y-%m}", 0) for month in months]
+
     @classmethod
     def listing(cls):
         return cls.select().where(cls.is_private == False).order_by(cls.created_at)
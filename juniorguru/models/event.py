@@ -11,7 +11,7 @@ from peewee import (
     fn,
 )
 
-from juniorguru.lib.charts import month_range, ttm_range
+from juniorguru.lib.charts import month_range, sum_per_range, ttm_range
 from juniorguru.lib.md import strip_links
 from juniorguru.models.base import BaseModel, JSONField
 from juniorguru.models.club import ClubUser
@@ -111,29 +111,23 @@ class Event(BaseModel):
         )
 
     @classmethod
-    def count_by_month(cls, date):
-        from_date, to_date = month_range(date)
-        return (
-            cls.select()
-            .where(
-                fn.date_trunc("day", cls.start_at) >= from_date,
-                fn.date_trunc("day", cls.start_at) <= to_date,
-            )
-            .count()
-        )
+    def count_by_day(cls):
+        day = fn.date_trunc("day", cls.start_at)
+        return [
+            (datetime.fromisoformat(day).date(), count)
+            for day, count in cls.select(day, fn.count(cls.id)).group_by(day).tuples()
+        ]
 
     @classmethod
-    def count_by_month_ttm(cls, date):
-        from_date, to_date = ttm_range(date)
-        return math.ceil(
-            cls.select()
-            .where(
-                fn.date_trunc("day", cls.start_at) >= from_date,
-                fn.date_trunc("day", cls.start_at) <= to_date,
-            )
-            .count()
-            / 12.0
-        )
+    def count_per_month(cls, months):
+        return sum_per_range(cls.count_by_day(), map(month_range, months))
+
+    @classmethod
+    def count_ttm_per_month(cls, months):
+        return [
+            math.ceil(count / 12.0)
+            for count in sum_per_range(cls.count_by_day(), map(ttm_range, months))
+        ]
 
 
 class EventSpeaking(BaseModel):
@@ -146,8 +140,8 @@ class EventSpeaking(BaseModel):
             cls.select()
             .join(Event)
             .where(
-                fn.date_trunc("day", Event.start_at) >= from_date,
-                fn.date_trunc("day", Event.start_at) <= to_date,
+                fn.date(Event.start_at) >= from_date,
+                fn.date(Event.start_at) <= to_date,
             )
         )
 
@@ -174,3 +168,27 @@ class EventSpeaking(BaseModel):
         if count:
             return math.ceil((cls.women_count_ttm(date) / count) * 100)
         return 0
+
+    @classmethod
+    def women_ptc_ttm_per_month(cls, months):
+        day = fn.date_trunc("day", Event.start_at)
+        women = fn.sum(ClubUser.has_feminine_name == True)
+        counts_by_day = (
+            cls.select(day, fn.count(cls.id), women)
+            .join(Event)
+            .switch(cls)
+            .join(ClubUser)
+            .group_by(day)
+            .tuples()
+        )
+        counts, women_counts = [], []
+        for day, count, women_count in counts_by_day:
+            counts.append((datetime.fromisoformat(day).date(), count))
+            women_counts.append((datetime.fromisoformat(day).date(), women_count or 0))
+        ranges = [ttm_range(month) for month in months]
+        return [
+            math.ceil((women_count / count) * 100) if count else 0
+            for count, women_count in zip(
+                sum_per_range(counts, ranges), sum_per_range(women_counts, ranges)
+            )
+        ]
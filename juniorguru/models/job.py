@@ -9,6 +9,7 @@ from peewee import (
     ForeignKeyField,
     IntegerField,
     TextField,
+    chunked,
     fn,
 )
 from playhouse.shortcuts import model_to_dict
@@ -140,6 +141,9 @@ class ScrapedJob(BaseModel):
     source = CharField()
     source_urls = JSONField(default=list)
 
+    content_hash = CharField(null=True)
+    pipelines_hash = CharField(null=True, index=True)
+
     @classmethod
     def date_listing(cls, date_, min_juniority_re_score=0):
         return cls.select().where(
@@ -168,7 +172,18 @@ class ScrapedJob(BaseModel):
     def to_item(self):
         return model_to_dict(self)
 
+    @classmethod
+    def postprocessing_listing(cls, pipelines_hash):
+        return cls.select(cls.id).where(
+            cls.pipelines_hash.is_null() | (cls.pipelines_hash != pipelines_hash)
+        )
+
     def merge_item(self, item):
+        # if the newer data has the same content as the job already has,
+        # overwriting would only throw away results of postprocessing
+        overwrite = item["last_seen_on"] >= self.last_seen_on and (
+            not item.get("content_hash") or item["content_hash"] != self.content_hash
+        )
         for field_name in self.__class__._meta.fields.keys():
             try:
                 # use merging method if present
@@ -176,10 +191,12 @@ class ScrapedJob(BaseModel):
                 setattr(self, field_name, merge_method(item))
             except AttributeError:
                 # overwrite with newer data
-                if item["last_seen_on"] >= self.last_seen_on:
+                if overwrite:
                     old_value = getattr(self, field_name)
                     new_value = item.get(field_name, old_value)
                     setattr(self, field_name, new_value)
+        if overwrite:
+            self.pipelines_hash = None
 
     def _merge_boards_ids(self, item):
         return list(set(self.boards_ids + item.get("boards_ids", [])))
@@ -230,7 +247,8 @@ class ListedJob(BaseModel):
 
     locations_raw = JSONField(null=True)
     locations = JSONField(null=True)
-    remote = BooleanField(default=False)
+    location = CharField(default="?")
+    remote = BooleanField(default=False, index=True)
     employment_types = JSONField(null=True)
 
     @property
@@ -254,6 +272,12 @@ class ListedJob(BaseModel):
         if (today - self.first_seen_on).days < JOB_NEW_DAYS:
             tags.append("NEW")
 
+        tags.extend(self.permanent_tags())
+        return tags
+
+    def permanent_tags(self):
+        tags = []
+
         if self.remote:
             tags.append("REMOTE")
 
@@ -263,35 +287,38 @@ class ListedJob(BaseModel):
 
         return tags
 
-    @property
-    def location(self):
-        # TODO refactor, this is terrible
-        locations = self.locations or []
-        if len(locations) == 1:
-            location = locations[0]
-            name, region = location["name"], location["region"]
-            parts = [name] if name == region else [name, region]
-            if self.remote:
-                parts.append("na dálku")
-            parts = list(filter(None, parts))
-            if parts:
-                return ", ".join(parts)
-            return "?"
-        else:
-            parts = list(sorted(filter(None, [loc["name"] for loc in locations])))
-            if len(parts) > 2:
-                parts = parts[:2]
-                if self.remote:
-                    parts[-1] += " a další"
-                    parts.append("na dálku")
-                    return ", ".join(parts)
-                else:
-                    return ", ".join(parts) + "…"
-            elif parts:
-                return ", ".join(parts + (["na dálku"] if self.remote else []))
-            if self.remote:
-                return "na dálku"
-            return "?"
+    def regions(self):
+        return sorted(
+            {
+                location["region"]
+                for location in self.locations or []
+                if location["region"]
+            }
+        )
+
+    @classmethod
+    def index(cls, batch_size=500):
+        # Listings filter on tags and regions, and templates print the location
+        # of each job many times during a build, so all of it gets computed
+        # once, right after the jobs are listed or their locations change
+        jobs = list(cls.select())
+        for job in jobs:
+            job.location = format_location(job.locations, job.remote)
+        cls.bulk_update(jobs, fields=[cls.location], batch_size=batch_size)
+
+        ListedJobTag.delete().execute()
+        rows = (
+            dict(job=job.id, tag=tag) for job in jobs for tag in job.permanent_tags()
+        )
+        for batch in chunked(rows, batch_size):
+            ListedJobTag.insert_many(batch).execute()
+
+        ListedJobRegion.delete().execute()
+        rows = (
+            dict(job=job.id, region=region) for job in jobs for region in job.regions()
+        )
+        for batch in chunked(rows, batch_size):
+            ListedJobRegion.insert_many(batch).execute()
 
     @classmethod
     def count(cls):
@@ -321,21 +348,28 @@ class ListedJob(BaseModel):
 
     @classmethod
     def region_listing(cls, region):
-        locations = cls.locations.tree().alias("locations")
-        return (
-            cls.listing()
-            .from_(cls, locations)
-            .where((locations.c.key == "region") & (locations.c.value == region))
+        regions = ListedJobRegion.select(ListedJobRegion.job).where(
+            ListedJobRegion.region == region
         )
+        return cls.listing().where(cls.id.in_(regions))
 
     @classmethod
     def remote_listing(cls):
         return cls.listing().where(cls.remote == True)
 
     @classmethod
-    def tags_listing(cls, tags):
+    def tags_listing(cls, tags, today=None):
         tags = set(tags)
-        return [job for job in cls.listing() if tags & set(job.tags())]
+        jobs = ListedJobTag.select(ListedJobTag.job).where(
+            ListedJobTag.tag.in_(list(tags))
+        )
+        condition = cls.id.in_(jobs)
+        # NEW depends on the day, so it isn't indexed, see tags()
+        if "NEW" in tags:
+            today = today or date.today()
+            new_since = today - timedelta(days=JOB_NEW_DAYS)
+            condition = condition | (cls.first_seen_on > new_since)
+        return cls.listing().where(condition)
 
     @classmethod
     def internship_listing(cls):
@@ -391,6 +425,52 @@ class ListedJob(BaseModel):
         )
 
 
+class ListedJobTag(BaseModel):
+    class Meta:
+        indexes = ((("tag", "job"), True),)
+
+    job = ForeignKeyField(ListedJob, backref="list_tags", on_delete="CASCADE")
+    tag = CharField()
+
+
+class ListedJobRegion(BaseModel):
+    class Meta:
+        indexes = ((("region", "job"), True),)
+
+    job = ForeignKeyField(ListedJob, backref="list_regions", on_delete="CASCADE")
+    region = CharField()
+
+
+def format_location(locations, remote):
+    # TODO refactor, this is terrible
+    locations = locations or []
+    if len(locations) == 1:
+        location = locations[0]
+        name, region = location["name"], location["region"]
+        parts = [name] if name == region else [name, region]
+        if remote:
+            parts.append("na dálku")
+        parts = list(filter(None, parts))
+        if parts:
+            return ", ".join(parts)
+        return "?"
+    else:
+        parts = list(sorted(filter(None, [loc["name"] for loc in locations])))
+        if len(parts) > 2:
+            parts = parts[:2]
+            if remote:
+                parts[-1] += " a další"
+                parts.append("na dálku")
+                return ", ".join(parts)
+            else:
+                return ", ".join(parts) + "…"
+        elif parts:
+            return ", ".join(parts + (["na dálku"] if remote else []))
+        if remote:
+            return "na dálku"
+        return "?"
+
+
 @lru_cache()
 def get_employment_types_tags(types):
     types = set(types)
@@ -2,9 +2,9 @@ import math
 from datetime import date, datetime, time
 from zoneinfo import ZoneInfo
 
-from peewee import BooleanField, CharField, DateField, ForeignKeyField, IntegerField
+from peewee import BooleanField, CharField, DateField, ForeignKeyField, IntegerField, fn
 
-from juniorguru.lib.charts import ttm_range
+from juniorguru.lib.charts import sum_per_range, ttm_range
 from juniorguru.models.base import BaseModel
 from juniorguru.models.partner import Partner
 
@@ -127,3 +127,27 @@ class PodcastEpisode(BaseModel):
         if count:
             return math.ceil((cls.women_count_ttm(date) / count) * 100)
         return 0
+
+    @classmethod
+    def women_ptc_ttm_per_month(cls, months):
+        counts_by_day = (
+            cls.select(
+                cls.publish_on,
+                fn.count(cls.number),
+                fn.sum(cls.guest_has_feminine_name == True),
+            )
+            .where(cls.guest_name.is_null(False))
+            .group_by(cls.publish_on)
+            .tuples()
+        )
+        counts, women_counts = [], []
+        for publish_on, count, women_count in counts_by_day:
+            counts.append((publish_on, count))
+            women_counts.append((publish_on, women_count or 0))
+        ranges = [ttm_range(month) for month in months]
+        return [
+            math.ceil((women_count / count) * 100) if count else 0
+            for count, women_count in zip(
+                sum_per_range(counts, ranges), sum_per_range(women_counts, ranges)
+            )
+        ]
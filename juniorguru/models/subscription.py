@@ -1,3 +1,4 @@
+import itertools
 import json
 import math
 from collections import Counter
@@ -8,17 +9,19 @@ from numbers import Number
 from typing import Callable, Generator, Iterable, Self
 
 from peewee import (
+    EXCLUDED,
     BooleanField,
     Case,
     CharField,
     DateField,
     DateTimeField,
     IntegerField,
+    chunked,
     fn,
 )
 from playhouse.shortcuts import model_to_dict
 
-from juniorguru.lib.charts import month_range
+from juniorguru.lib.charts import generate_months, month_range, sum_per_range
 from juniorguru.models.base import BaseModel, check_enum
 from juniorguru.models.club import ClubUser
 
@@ -108,6 +111,23 @@ def is_missing_subscriptions_data(month: date) -> bool:
     return False
 
 
+def mask_missing_subscriptions_data(
+    values: list[Number], months: list[date]
+) -> list[Number | None]:
+    return [
+        None if is_missing_subscriptions_data(month) else value
+        for value, month in zip(values, months)
+    ]
+
+
+def count_per_month(dates: Iterable[date], months: list[date]) -> list[int]:
+    return sum_per_range(((day, 1) for day in dates), map(month_range, months))
+
+
+def previous_month_key(month: date) -> str:
+    return f"{month_range(month)[0] - timedelta(days=1):%Y-%m}"
+
+
 class SubscriptionActivity(BaseModel):
     class Meta:
         indexes = ((("type", "account_id", "happened_on"), True),)
@@ -128,11 +148,19 @@ class SubscriptionActivity(BaseModel):
 
     @classmethod
     def deserialize(cls, line: str) -> Self:
+        return cls.add(**cls._parse_line(line))
+
+    @classmethod
+    def deserialize_many(cls, lines: Iterable[str]) -> None:
+        cls.add_many(cls._parse_line(line) for line in lines)
+
+    @classmethod
+    def _parse_line(cls, line: str) -> dict:
         data = json.loads(line)
         data["account_has_feminine_name"] = data.pop("f")
         data["happened_at"] = datetime.fromisoformat(data["happened_at"])
         data["happened_on"] = data["happened_at"].date()
-        return cls.add(**data)
+        return data
 
     def serialize(self) -> str:
         # most of the following is done to save bytes
@@ -171,6 +199,45 @@ class SubscriptionActivity(BaseModel):
         )
         insert.execute()
 
+    @classmethod
+    def add_many(cls, rows: Iterable[dict], batch_size: int = 500) -> None:
+        # Same as add(), but for many rows at once. Rows within a single
+        # batch are inserted in order, so they can upsert each other.
+        unique_key_fields = cls._meta.indexes[0][0]
+        conflict_target = [getattr(cls, field) for field in unique_key_fields]
+        fields = [
+            field
+            for field in cls._meta.sorted_fields
+            if field is not cls._meta.primary_key
+        ]
+
+        update = {
+            field: fn.coalesce(getattr(EXCLUDED, field.column_name), field)
+            for field in fields
+            if field.name not in unique_key_fields
+        }
+        update[cls.happened_at] = Case(
+            None,
+            [(cls.happened_at < EXCLUDED.happened_at, EXCLUDED.happened_at)],
+            cls.happened_at,
+        )
+
+        rows = ({field.name: row.get(field.name) for field in fields} for row in rows)
+        for batch in chunked(rows, batch_size):
+            cls.insert_many(batch).on_conflict(
+                action="update", update=update, conflict_target=conflict_target
+            ).execute()
+
+    @classmethod
+    def classify_subscription_types(cls, mapping: dict[str, SubscriptionType]) -> None:
+        cls.update(
+            subscription_type=Case(
+                cls.order_coupon_slug,
+                list(mapping.items()),
+                SubscriptionType.INDIVIDUAL,
+            )
+        ).execute()
+
     @classmethod
     def history_end_on(cls, buffer_days=30) -> date:
         # The 'trial_end' activities are sometimes in the future,
@@ -269,6 +336,14 @@ class SubscriptionActivity(BaseModel):
     def total_count(cls) -> int:
         return cls.select().count()
 
+    @classmethod
+    def accounts_activities(cls) -> Generator[list[Self], None, None]:
+        activities = cls.select().order_by(cls.account_id, cls.happened_at, cls.id)
+        for _, account_activities in itertools.groupby(
+            activities, key=lambda activity: activity.account_id
+        ):
+            yield list(account_activities)
+
     @classmethod
     def listing(cls, date: date) -> Iterable[Self]:
         latest_at = fn.max(cls.happened_at).alias("latest_at")
@@ -286,20 +361,16 @@ class SubscriptionActivity(BaseModel):
         )
 
     @classmethod
-    def active_listing(cls, date: date) -> Iterable[Self]:
-        return cls.listing(date).where(
-            cls.type != SubscriptionActivityType.DEACTIVATION
-        )
+    def active_listing(cls, date: date) -> Iterable["SubscriptionSnapshot"]:
+        return SubscriptionSnapshot.listing(date)
 
     @classmethod
     def active_count(cls, date: date) -> int:
         return cls.active_listing(date).count()
 
     @classmethod
-    def active_individuals_listing(cls, date: date) -> Iterable[Self]:
-        return cls.active_listing(date).where(
-            cls.subscription_type == SubscriptionType.INDIVIDUAL
-        )
+    def active_individuals_listing(cls, date: date) -> Iterable["SubscriptionSnapshot"]:
+        return SubscriptionSnapshot.individuals_listing(date)
 
     @classmethod
     @uses_data_from_subscriptions()
@@ -310,10 +381,9 @@ class SubscriptionActivity(BaseModel):
     @uses_data_from_subscriptions()
     def active_individuals_yearly_count(cls, date: date) -> int | None:
         return (
-            cls.active_listing(date)
+            cls.active_individuals_listing(date)
             .where(
-                cls.subscription_type == SubscriptionType.INDIVIDUAL,
-                cls.subscription_interval == SubscriptionInterval.YEAR,
+                SubscriptionSnapshot.subscription_interval == SubscriptionInterval.YEAR
             )
             .count()
         )
@@ -322,7 +392,7 @@ class SubscriptionActivity(BaseModel):
     @uses_data_from_subscriptions(default=dict)
     def active_subscription_type_breakdown(cls, date: date) -> dict[str, int]:
         counter = Counter(
-            [activity.subscription_type for activity in cls.active_listing(date)]
+            [snapshot.subscription_type for snapshot in cls.active_listing(date)]
         )
         if None in counter:
             raise ValueError(
@@ -365,11 +435,53 @@ class SubscriptionActivity(BaseModel):
         converting_count = converting_trials.count()
         return (converting_count / total_count) * 100 if total_count else 0
 
+    @classmethod
+    def trial_conversion_ptc_per_month(cls, months: list[date]) -> list[int | dict]:
+        # Same as trial_conversion_ptc(), but reads the activities only once.
+        # A trial counts in the month it started, and it converts if there's
+        # an individual subscription from the start of that month on.
+        trials = []
+        for activities in cls.accounts_activities():
+            trial_on = next(
+                (
+                    activity.happened_on
+                    for activity in activities
+                    if activity.subscription_type == SubscriptionType.TRIAL
+                ),
+                None,
+            )
+            individual_on = max(
+                (
+                    activity.happened_on
+                    for activity in activities
+                    if activity.subscription_type == SubscriptionType.INDIVIDUAL
+                ),
+                default=None,
+            )
+            if trial_on:
+                trials.append((trial_on, individual_on))
+        results = []
+        for month in months:
+            if is_missing_subscriptions_data(month):
+                results.append({})
+                continue
+            from_date, to_date = month_range(month)
+            conversions = [
+                bool(individual_on and individual_on >= from_date)
+                for trial_on, individual_on in trials
+                if from_date <= trial_on <= to_date
+            ]
+            if conversions:
+                results.append((sum(conversions) / len(conversions)) * 100)
+            else:
+                results.append(0)
+        return results
+
     @classmethod
     def active_women_count(cls, date: date) -> int:
         return (
             cls.active_listing(date)
-            .where(cls.account_has_feminine_name == True)
+            .where(SubscriptionSnapshot.account_has_feminine_name == True)
             .count()
         )
 
@@ -402,6 +514,25 @@ class SubscriptionActivity(BaseModel):
             .count()
         )
 
+    @classmethod
+    def signups_per_month(cls, months: list[date]) -> list[int]:
+        signups_on = [
+            activities[0].happened_on for activities in cls.accounts_activities()
+        ]
+        return count_per_month(signups_on, months)
+
+    @classmethod
+    def individuals_signups_per_month(cls, months: list[date]) -> list[int | None]:
+        signups_on = []
+        for activities in cls.accounts_activities():
+            for activity in activities:
+                if activity.subscription_type == SubscriptionType.INDIVIDUAL:
+                    signups_on.append(activity.happened_on)
+                    break
+        return mask_missing_subscriptions_data(
+            count_per_month(signups_on, months), months
+        )
+
     @classmethod
     def quits(cls, date: date) -> Iterable[Self]:
         from_date, to_date = month_range(date)
@@ -467,54 +598,128 @@ class SubscriptionActivity(BaseModel):
             .count()
         )
 
+    @classmethod
+    def quits_per_month(cls, months: list[date]) -> list[int]:
+        quits_on = [
+            deactivation.happened_on
+            for activities in cls.accounts_activities()
+            for deactivation in cls._generate_quits(activities)
+        ]
+        return count_per_month(quits_on, months)
+
+    @classmethod
+    def individuals_quits_per_month(cls, months: list[date]) -> list[int | None]:
+        quits_on = [
+            deactivation.happened_on
+            for activities in cls.accounts_activities()
+            for deactivation in cls._generate_quits(activities)
+            if deactivation.subscription_type == SubscriptionType.INDIVIDUAL
+        ]
+        return mask_missing_subscriptions_data(
+            count_per_month(quits_on, months), months
+        )
+
+    @classmethod
+    def _generate_quits(cls, activities: list[Self]) -> Generator[Self, None, None]:
+        # Same as quits(), but for activities of a single account, sorted
+        # by time. A deactivation is a quit in the month it happened in if
+        # it's the first one after the latest order known by the end of that
+        # month, which gets rid of duplicit deactivations.
+        deactivations = [
+            activity
+            for activity in activities
+            if activity.type == SubscriptionActivityType.DEACTIVATION
+        ]
+        for deactivation in deactivations:
+            to_date = month_range(deactivation.happened_on)[1]
+            latest_order_at = max(
+                (
+                    activity.happened_at
+                    for activity in activities
+                    if activity.type != SubscriptionActivityType.DEACTIVATION
+                    and activity.happened_on <= to_date
+                ),
+                default=None,
+            )
+            if latest_order_at is None:
+                continue
+            first_deactivation = next(
+                activity
+                for activity in deactivations
+                if activity.happened_at >= latest_order_at
+                and activity.happened_on <= to_date
+            )
+            if first_deactivation is deactivation:
+                yield deactivation
+
     @classmethod
     def churn_ptc(cls, date):
-        from_date = month_range(date)[0]
+        # Members active at the end of the previous month
+        start_on = month_range(date)[0] - timedelta(days=1)
         churn = cls.quits_count(date) / (
-            cls.active_count(from_date) + cls.signups_count(date)
+            cls.active_count(start_on) + cls.signups_count(date)
         )
         return churn * 100
 
     @classmethod
     @uses_data_from_subscriptions()
     def individuals_churn_ptc(cls, date):
-        from_date = month_range(date)[0]
+        # Members active at the end of the previous month
+        start_on = month_range(date)[0] - timedelta(days=1)
         churn = cls.individuals_quits_count(date) / (
-            cls.active_individuals_count(from_date)
+            cls.active_individuals_listing(start_on).count()
             + cls.individuals_signups_count(date)
         )
         return churn * 100
 
+    @classmethod
+    def churn_ptc_per_month(cls, months: list[date]) -> list[float]:
+        active_counts = SubscriptionSnapshot.count_by_month()
+        return [
+            (quits_count / (active_counts[previous_month_key(month)] + signups_count))
+            * 100
+            for quits_count, signups_count, month in zip(
+                cls.quits_per_month(months), cls.signups_per_month(months), months
+            )
+        ]
+
+    @classmethod
+    def individuals_churn_ptc_per_month(cls, months: list[date]) -> list[float | None]:
+        active_counts = SubscriptionSnapshot.count_by_month(SubscriptionType.INDIVIDUAL)
+        return [
+            None
+            if is_missing_subscriptions_data(month)
+            else (
+                quits_count / (active_counts[previous_month_key(month)] + signups_count)
+            )
+            * 100
+            for quits_count, signups_count, month in zip(
+                cls.individuals_quits_per_month(months),
+                cls.individuals_signups_per_month(months),
+                months,
+            )
+        ]
+
     @classmethod
     def active_duration_avg(cls, date: date) -> int:
-        account_ids = [activity.account_id for activity in cls.active_listing(date)]
-        if durations := list(cls._calc_durations(account_ids, date)):
+        if durations := list(cls._calc_durations(cls.active_listing(date), date)):
             return sum(durations) / len(durations)
         return 0
 
     @classmethod
     @uses_data_from_subscriptions()
     def active_individuals_duration_avg(cls, date: date) -> int:
-        account_ids = [
-            activity.account_id for activity in cls.active_individuals_listing(date)
-        ]
-        if durations := list(cls._calc_durations(account_ids, date)):
+        snapshots = cls.active_individuals_listing(date)
+        if durations := list(cls._calc_durations(snapshots, date)):
             return sum(durations) / len(durations)
         return 0
 
     @classmethod
     def _calc_durations(
-        cls, account_ids: list[str], date: date
+        cls, snapshots: Iterable["SubscriptionSnapshot"], date: date
     ) -> Generator[int, None, None]:
-        earliest_on = fn.min(cls.happened_on).alias("earliest_on")
-        items = (
-            cls.select(earliest_on)
-            .where(cls.account_id.in_(account_ids))
-            .group_by(cls.account_id)
-            .dicts()
-        )
-        for item in items:
-            duration_sec = (date - item["earliest_on"]).total_seconds()
+        for snapshot in snapshots:
+            duration_sec = (date - snapshot.account_subscribed_on).total_seconds()
             duration_mo = duration_sec / 60 / 60 / 24 / 30
             yield duration_mo
 
@@ -549,6 +754,74 @@ class SubscriptionActivity(BaseModel):
         return days
 
 
+class SubscriptionSnapshot(BaseModel):
+    class Meta:
+        indexes = ((("month", "account_id"), True),)
+
+    month = CharField(index=True)
+    account_id = IntegerField()
+    account_has_feminine_name = BooleanField()
+    account_subscribed_on = DateField()
+    subscription_interval = CharField(
+        null=True,
+        constraints=[check_enum("subscription_interval", SubscriptionInterval)],
+    )
+    subscription_type = CharField(
+        null=True, constraints=[check_enum("subscription_type", SubscriptionType)]
+    )
+
+    @classmethod
+    def create_snapshots(cls, today: date, batch_size: int = 500) -> int:
+        # Each snapshot holds the latest activity of an active account as of
+        # the end of the month, or as of today if it's the current month
+        rows = itertools.chain.from_iterable(
+            cls._generate_rows(account_activities, today)
+            for account_activities in SubscriptionActivity.accounts_activities()
+        )
+        count = 0
+        for batch in chunked(rows, batch_size):
+            cls.insert_many(batch).execute()
+            count += len(batch)
+        return count
+
+    @classmethod
+    def _generate_rows(
+        cls, activities: list[SubscriptionActivity], today: date
+    ) -> Generator[dict, None, None]:
+        subscribed_on = activities[0].happened_on
+        i = 0
+        for month in generate_months(subscribed_on, today):
+            while i < len(activities) and activities[i].happened_on <= month:
+                i += 1
+            latest = activities[i - 1]
+            if latest.type != SubscriptionActivityType.DEACTIVATION:
+                yield dict(
+                    month=f"{month:%Y-%m}",
+                    account_id=latest.account_id,
+                    account_has_feminine_name=latest.account_has_feminine_name,
+                    account_subscribed_on=subscribed_on,
+                    subscription_interval=latest.subscription_interval,
+                    subscription_type=latest.subscription_type,
+                )
+
+    @classmethod
+    def listing(cls, date: date) -> Iterable[Self]:
+        return cls.select().where(cls.month == f"{date:%Y-%m}")
+
+    @classmethod
+    def individuals_listing(cls, date: date) -> Iterable[Self]:
+        return cls.listing(date).where(
+            cls.subscription_type == SubscriptionType.INDIVIDUAL
+        )
+
+    @classmethod
+    def count_by_month(cls, subscription_type: SubscriptionType = None) -> Counter:
+        query = cls.select(cls.month, fn.count(cls.id)).group_by(cls.month)
+        if subscription_type:
+            query = query.where(cls.subscription_type == subscription_type)
+        return Counter(dict(query.tuples()))
+
+
 class SubscriptionCancellation(BaseModel):
     account_id = IntegerField(unique=True)
     account_name = CharField()
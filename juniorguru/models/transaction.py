@@ -5,10 +5,15 @@ from datetime import date
 from enum import StrEnum, unique
 from typing import Iterable, Self
 
-from peewee import CharField, DateField, IntegerField
+from peewee import CharField, DateField, IntegerField, fn
 from playhouse.shortcuts import model_to_dict
 
-from juniorguru.lib.charts import month_range, ttm_range
+from juniorguru.lib.charts import (
+    month_range,
+    sum_per_range,
+    sum_per_range_breakdown,
+    ttm_range,
+)
 from juniorguru.models.base import BaseModel, check_enum
 
 
@@ -148,6 +153,80 @@ class Transaction(BaseModel):
     def profit_ttm(cls, date):
         return cls.revenue_ttm(date) - cls.cost_ttm(date)
 
+    @classmethod
+    def incomes_by_day(cls):
+        return cls._sum_by_day((cls.amount >= 0) & (cls.category != "tax"))
+
+    @classmethod
+    def expenses_by_day(cls):
+        return cls._sum_by_day((cls.amount < 0) | (cls.category == "tax"))
+
+    @classmethod
+    def _sum_by_day(cls, condition):
+        return (
+            cls.select(cls.happened_on, cls.category, fn.sum(cls.amount))
+            .where(condition)
+            .group_by(cls.happened_on, cls.category)
+            .tuples()
+        )
+
+    @classmethod
+    def revenue_per_month(cls, months):
+        values = [(day, amount) for day, _, amount in cls.incomes_by_day()]
+        return sum_per_range(values, map(month_range, months))
+
+    @classmethod
+    def revenue_ttm_per_month(cls, months):
+        values = [(day, amount) for day, _, amount in cls.incomes_by_day()]
+        return [
+            math.ceil(value / 12.0)
+            for value in sum_per_range(values, map(ttm_range, months))
+        ]
+
+    @classmethod
+    def revenue_breakdown_per_month(cls, months):
+        return sum_per_range_breakdown(cls.incomes_by_day(), map(month_range, months))
+
+    @classmethod
+    def cost_per_month(cls, months):
+        values = [(day, amount) for day, _, amount in cls.expenses_by_day()]
+        return [-1 * value for value in sum_per_range(values, map(month_range, months))]
+
+    @classmethod
+    def cost_ttm_per_month(cls, months):
+        values = [(day, amount) for day, _, amount in cls.expenses_by_day()]
+        return [
+            math.ceil((-1 * value) / 12.0)
+            for value in sum_per_range(values, map(ttm_range, months))
+        ]
+
+    @classmethod
+    def cost_breakdown_per_month(cls, months):
+        return [
+            {category: -1 * value for category, value in breakdown.items()}
+            for breakdown in sum_per_range_breakdown(
+                cls.expenses_by_day(), map(month_range, months)
+            )
+        ]
+
+    @classmethod
+    def profit_per_month(cls, months):
+        return [
+            revenue - cost
+            for revenue, cost in zip(
+                cls.revenue_per_month(months), cls.cost_per_month(months)
+            )
+        ]
+
+    @classmethod
+    def profit_ttm_per_month(cls, months):
+        return [
+            revenue - cost
+            for revenue, cost in zip(
+                cls.revenue_ttm_per_month(months), cls.cost_ttm_per_month(months)
+            )
+        ]
+
 
 def sum_by_category(transactions):
     def reduce_step(mapping, transaction):
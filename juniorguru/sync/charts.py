@@ -92,84 +92,84 @@ def chart(chart_fn: Callable) -> Callable:
 @chart
 def profit(today: date):
     months = charts.months(BUSINESS_BEGIN_ON, today)
-    data = charts.per_month(Transaction.profit, months)
+    data = Transaction.profit_per_month(months)
     return dict(data=data, months=months)
 
 
 @chart
 def profit_ttm(today: date):
     months = charts.months(BUSINESS_BEGIN_ON, today)
-    data = charts.per_month(Transaction.profit_ttm, months)
+    data = Transaction.profit_ttm_per_month(months)
     return dict(data=data, months=months)
 
 
 @chart
 def revenue(today: date):
     months = charts.months(BUSINESS_BEGIN_ON, today)
-    data = charts.per_month(Transaction.revenue, months)
+    data = Transaction.revenue_per_month(months)
     return dict(data=data, months=months)
 
 
 @chart
 def revenue_ttm(today: date):
     months = charts.months(BUSINESS_BEGIN_ON, today)
-    data = charts.per_month(Transaction.revenue_ttm, months)
+    data = Transaction.revenue_ttm_per_month(months)
     return dict(data=data, months=months)
 
 
 @chart
 def revenue_breakdown(today: date):
     months = charts.months(BUSINESS_BEGIN_ON, today)
-    data = charts.per_month_breakdown(Transaction.revenue_breakdown, months)
+    data = charts.merge_breakdowns(Transaction.revenue_breakdown_per_month(months))
     return dict(data=data, months=months)
 
 
 @chart
 def cost(today: date):
     months = charts.months(BUSINESS_BEGIN_ON, today)
-    data = charts.per_month(Transaction.cost, months)
+    data = Transaction.cost_per_month(months)
     return dict(data=data, months=months)
 
 
 @chart
 def cost_ttm(today: date):
     months = charts.months(BUSINESS_BEGIN_ON, today)
-    data = charts.per_month(Transaction.cost_ttm, months)
+    data = Transaction.cost_ttm_per_month(months)
     return dict(data=data, months=months)
 
 
 @chart
 def cost_breakdown(today: date):
     months = charts.months(BUSINESS_BEGIN_ON, today)
-    data = charts.per_month_breakdown(Transaction.cost_breakdown, months)
+    data = charts.merge_breakdowns(Transaction.cost_breakdown_per_month(months))
     return dict(data=data, months=months)
 
 
 @chart
 def events(today: date):
     months = charts.months(CLUB_BEGIN_ON, today)
-    data = charts.per_month(Event.count_by_month, months)
+    data = Event.count_per_month(months)
     return dict(data=data, months=months)
 
 
 @chart
 def events_ttm(today: date):
     months = charts.months(CLUB_BEGIN_ON, today)
-    data = charts.per_month(Event.count_by_month_ttm, months)
+    data = Event.count_ttm_per_month(months)
     return dict(data=data, months=months)
 
 
 @chart
 def events_women(today: date):
     months = charts.months(CLUB_BEGIN_ON, today)
-    data = charts.per_month(EventSpeaking.women_ptc_ttm, months)
+    data = EventSpeaking.women_ptc_ttm_per_month(months)
     return dict(data=data, months=months)
 
 
 @chart
 def podcast_women(today: date):
     months = charts.months(PODCAST_BEGIN_ON, today)
-    data = charts.per_month(PodcastEpisode.women_ptc_ttm, months)
+    data = PodcastEpisode.women_ptc_ttm_per_month(months)
     return dict(data=data, months=months)
 
 
@@ -299,49 +299,49 @@ def trials_conversion(today: date):
     months = charts.months(
         charts.next_month(LEGACY_PLANS_DELETED_ON), charts.previous_month(today)
     )
-    data = charts.per_month(SubscriptionActivity.trial_conversion_ptc, months)
+    data = SubscriptionActivity.trial_conversion_ptc_per_month(months)
     return dict(data=data, months=months)
 
 
 @chart
 def signups(today: date):
     months = charts.months(CLUB_BEGIN_ON, charts.previous_month(today))
-    data = charts.per_month(SubscriptionActivity.signups_count, months)
+    data = SubscriptionActivity.signups_per_month(months)
     return dict(data=data, months=months)
 
 
 @chart
 def signups_individuals(today: date):
     months = charts.months(CLUB_BEGIN_ON, charts.previous_month(today))
-    data = charts.per_month(SubscriptionActivity.individuals_signups_count, months)
+    data = SubscriptionActivity.individuals_signups_per_month(months)
     return dict(data=data, months=months)
 
 
 @chart
 def quits(today: date):
     months = charts.months(CLUB_BEGIN_ON, charts.previous_month(today))
-    data = charts.per_month(SubscriptionActivity.quits_count, months)
+    data = SubscriptionActivity.quits_per_month(months)
     return dict(data=data, months=months)
 
 
 @chart
 def quits_individuals(today: date):
     months = charts.months(CLUB_BEGIN_ON, charts.previous_month(today))
-    data = charts.per_month(SubscriptionActivity.individuals_quits_count, months)
+    data = SubscriptionActivity.individuals_quits_per_month(months)
     return dict(data=data, months=months)
 
 
 @chart
 def churn(today: date):
     months = charts.months(CLUB_BEGIN_ON, charts.previous_month(today))
-    data = charts.per_month(SubscriptionActivity.churn_ptc, months)
+    data = SubscriptionActivity.churn_ptc_per_month(months)
     return dict(data=data, months=months)
 
 
 @chart
 def churn_individuals(today: date):
     months = charts.months(CLUB_BEGIN_ON, charts.previous_month(today))
-    data = charts.per_month(SubscriptionActivity.individuals_churn_ptc, months)
+    data = SubscriptionActivity.individuals_churn_ptc_per_month(months)
     return dict(data=data, months=months)
 
 
@@ -351,7 +351,7 @@ def club_content(today: date):
         charts.next_month(today - DEFAULT_CHANNELS_HISTORY_SINCE),
         charts.previous_month(today),
     )
-    data = charts.per_month(ClubMessage.content_size_by_month, months)
+    data = ClubMessage.content_size_per_month(months)
     return dict(data=data, months=months)
 
 
@@ -1,7 +1,7 @@
 from pprint import pformat
 
 import click
-from peewee import OperationalError
+from diskcache import Cache
 
 from juniorguru.cli.sync import main as cli
 from juniorguru.lib import discord_sync, loggers
@@ -14,40 +14,22 @@ logger = loggers.from_path(__file__)
 
 
 @cli.sync_command()
-@cli.pass_cache
-@click.option("--clear-stats-cache/--keep-stats-cache", default=False)
-def main(cache, clear_stats_cache):
-    if clear_stats_cache:
-        cache.delete("club_content_stats")
-    try:
-        stats = get_stats()
-        logger.info(f"Found {pformat(get_stats())}")
-    except OperationalError as e:
-        logger.error(e)
-        fetch_club_content()
+@cli.pass_persistent_cache
+@click.option(
+    "--full/--incremental",
+    default=False,
+    help="Crawl all history again, e.g. to notice old edits or deletions.",
+)
+def main(persistent_cache: Cache, full: bool):
+    if full:
+        logger.info("Fetching all content from scratch")
     else:
-        try:
-            cached_stats = cache["club_content_stats"]
-        except KeyError:
-            logger.info("No cached stats, refetching")
-            fetch_club_content()
-        else:
-            if cached_stats != stats:
-                logger.info("Data changed, refetching")
-                fetch_club_content()
-            else:
-                logger.info("Re-using data")
-
-    stats = get_stats()
-    cache["club_content_stats"] = stats
-    logger.info(f"Finished with {pformat(get_stats())}")
-
-
-def fetch_club_content():
+        logger.info("Fetching content incrementally")
     with db.connection_context():
         db.drop_tables([ClubMessage, ClubUser, ClubPin])
         db.create_tables([ClubMessage, ClubUser, ClubPin])
-    discord_sync.run(crawl)
+    discord_sync.run(crawl, persistent_cache, full)
+    logger.info(f"Finished with {pformat(get_stats())}")
 
 
 @db.connection_context()
@@ -4,6 +4,8 @@ from typing import Generator
 
 from discord import DMChannel, Member, Message, Reaction, User
 from discord.abc import GuildChannel
+from discord.utils import snowflake_time
+from diskcache import Cache
 
 from juniorguru.lib import loggers
 from juniorguru.lib.discord_club import (
@@ -19,12 +21,7 @@ from juniorguru.lib.discord_club import (
     is_member,
     is_thread_after,
 )
-from juniorguru.sync.club_content.store import (
-    store_dm_channel,
-    store_member,
-    store_message,
-    store_pin,
-)
+from juniorguru.sync.club_content.store import Writer, restore_snapshot, save_snapshot
 
 
 logger = loggers.from_path(__file__)
@@ -39,6 +36,11 @@ CHANNELS_HISTORY_SINCE = {
     ClubChannelID.BUSINESS: None,  # all history since ever
 }
 
+# Incremental crawl fetches messages after the last crawled one, but also re-fetches
+# this much of the recent history to update edits and reactions, which mostly come
+# within days. Older changes and deletions get caught only by a full crawl.
+INCREMENTAL_REFETCH_SINCE = timedelta(days=3)
+
 CHANNELS_SKIP = [
     # skip channels
     ClubChannelID.MODERATION,
@@ -271,14 +273,25 @@ CHANNELS_SKIP = [
 ]
 
 
-async def crawl(client: ClubClient) -> None:
+async def crawl(client: ClubClient, cache: Cache, full: bool = False) -> None:
+    cursors = {} if full else await restore_snapshot(cache)
+    channel_ids = set()
+    async with Writer() as writer:
+        await crawl_club(client, writer, cursors, channel_ids)
+    await save_snapshot(cache, channel_ids)
+
+
+async def crawl_club(
+    client: ClubClient,
+    writer: Writer,
+    cursors: dict[int, dict],
+    channel_ids: set[int],
+) -> None:
     logger.info("Crawling members")
     members = []
-    tasks = []
     async for member in client.club_guild.fetch_members(limit=None):
         members.append(member)
-        tasks.append(asyncio.create_task(store_member(member)))
-    await asyncio.gather(*tasks)
+        await writer.store_member(member)
 
     logger.info("Crawling club channels")
     queue = asyncio.Queue()
@@ -295,14 +308,16 @@ async def crawl(client: ClubClient) -> None:
                 )
 
     workers = [
-        asyncio.create_task(channel_worker(worker_no, queue))
+        asyncio.create_task(
+            channel_worker(worker_no, queue, writer, cursors, channel_ids)
+        )
         for worker_no in range(WORKERS_COUNT)
     ]
 
     logger.info("Adding DM channels")
     tasks = []
     for member in members:
-        tasks.append(asyncio.create_task(crawl_dm_channel(queue, member)))
+        tasks.append(asyncio.create_task(crawl_dm_channel(queue, writer, member)))
     await asyncio.gather(*tasks)
 
     # trick to prevent hangs if workers raise, see https://stackoverflow.com/a/60710981/325365
@@ -325,17 +340,19 @@ async def crawl(client: ClubClient) -> None:
     await asyncio.gather(*workers, return_exceptions=True)
 
 
-async def crawl_dm_channel(queue: asyncio.Queue, member: Member) -> None:
+async def crawl_dm_channel(
+    queue: asyncio.Queue, writer: Writer, member: Member
+) -> None:
     channel = await get_or_create_dm_channel(member)
     if channel:
         logger["channels"].debug(
             f"Adding DM channel #{channel.id} for member {channel.recipient.display_name!r}"
         )
         queue.put_nowait(channel)
-        await store_dm_channel(channel)
+        await writer.store_dm_channel(channel)
 
 
-async def channel_worker(worker_no, queue) -> None:
+async def channel_worker(worker_no, queue, writer, cursors, channel_ids) -> None:
     logger_cw = logger[worker_no]["channels"]
     while True:
         channel = await queue.get()
@@ -367,21 +384,45 @@ async def channel_worker(worker_no, queue) -> None:
             )
             queue.put_nowait(thread)
 
-        tasks = []
-        async for message in fetch_messages(channel, after=history_after):
-            db_message = await store_message(message)
+        if cursor := cursors.get(channel.id):
+            crawl_after = await prepare_incremental_crawl(
+                channel, writer, history_after, cursor, logger_c
+            )
+        else:
+            logger_c.debug("Crawling fully")
+            crawl_after = history_after
+        channel_ids.add(channel.id)
+
+        async for message in fetch_messages(channel, after=crawl_after):
+            await writer.store_message(message)
             async for reacting_member in fetch_members_reacting_by_pin(
                 message.reactions
             ):
-                tasks.append(
-                    asyncio.create_task(store_pin(db_message, reacting_member))
-                )
-        await asyncio.gather(*tasks)
+                await writer.store_pin(message, reacting_member)
 
         logger_c.debug(f"Done crawling {get_channel_name(channel)!r}")
         queue.task_done()
 
 
+async def prepare_incremental_crawl(
+    channel: GuildChannel | DMChannel,
+    writer: Writer,
+    history_after: datetime | None,
+    cursor: dict,
+    logger_c: loggers.Logger,
+) -> datetime | None:
+    if history_after:
+        logger_c.debug("Deleting messages out of history")
+        await writer.delete_messages(channel.id, before=history_after)
+    last_created_at = snowflake_time(cursor["last_message_id"])
+    crawl_after = get_incremental_history_after(history_after, last_created_at)
+    logger_c.debug(
+        f"Crawling incrementally after {crawl_after:%Y-%m-%d}"
+        f" (last message {last_created_at:%Y-%m-%d}, last edit {cursor['edited_at']})"
+    )
+    return crawl_after
+
+
 def get_channel_logger(
     logger: loggers.Logger, channel: GuildChannel | DMChannel
 ) -> loggers.Logger:
@@ -421,3 +462,14 @@ def get_history_after(history_since, now=None):
     else:
         now = datetime.now(timezone.utc)
     return now - history_since
+
+
+def get_incremental_history_after(
+    history_after, last_created_at, refetch_since=INCREMENTAL_REFETCH_SINCE
+):
+    if last_created_at.tzinfo is None:
+        raise ValueError("last_created_at must be timezone-aware")
+    incremental_history_after = last_created_at - refetch_since
+    if history_after:
+        return max(history_after, incremental_history_after)
+    return incremental_history_after
@@ -1,9 +1,15 @@
 import asyncio
+from contextlib import contextmanager
+from datetime import datetime
 from functools import partial, wraps
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import Generator
 
 import arrow
 import peewee
 from discord import DMChannel, Member, Message, User
+from diskcache import Cache
 
 from juniorguru.lib import loggers
 from juniorguru.lib.discord_club import (
@@ -21,6 +27,33 @@ from juniorguru.models.base import db
 from juniorguru.models.club import ClubMessage, ClubPin, ClubUser
 
 
+WRITER_BATCH_SIZE = 2000
+
+WRITER_FLUSH_INTERVAL_SEC = 1
+
+WRITER_INSERT_CHUNK_SIZE = 500
+
+WRITER_ORDER = ["deletion", "member", "user", "message", "pin", "dm_channel"]
+
+USER_DISCORD_FIELDS = [
+    ClubUser.id,
+    ClubUser.is_bot,
+    ClubUser.has_avatar,
+    ClubUser.display_name,
+    ClubUser.mention,
+    ClubUser.joined_at,
+    ClubUser.initial_roles,
+]
+
+MEMBER_FIELDS = USER_DISCORD_FIELDS + [ClubUser.is_member]
+
+SNAPSHOT_KEY = "snapshot"
+
+SNAPSHOT_CURSORS_KEY = "cursors"
+
+SNAPSHOT_SCHEMA = "snapshot"
+
+
 logger = loggers.from_path(__file__)
 
 
@@ -33,12 +66,108 @@ def make_async(fn):
     return wrapper
 
 
-@make_async
-@db.connection_context()
-def store_member(member: Member) -> ClubUser:
-    """Stores in database given Discord Member object"""
-    logger["users"][member.id].debug(f"Saving {member.display_name!r}")
-    return ClubUser.create(
+class Writer:
+    """
+    Stores crawled Discord objects in database
+
+    The crawling coroutines only put records to a queue. A single writer
+    takes them in batches and stores them within one transaction per batch,
+    so that SQLite doesn't deal with concurrent writes or commit every row.
+    """
+
+    def __init__(self, batch_size: int = WRITER_BATCH_SIZE):
+        self.batch_size = batch_size
+        self.known_user_ids = set()
+        self.counter = 0
+        self._queue = asyncio.Queue()
+        self._task = None
+
+    async def __aenter__(self) -> "Writer":
+        self.known_user_ids = await make_async(_get_user_ids)()
+        self._task = asyncio.create_task(self._run())
+        return self
+
+    async def __aexit__(self, exc_type, exc, traceback) -> None:
+        if self._task.done():
+            self._task.result()  # raises
+        else:
+            self._queue.put_nowait(None)
+            await self._task
+        logger.info(f"Stored {self.counter} records total")
+
+    async def store_member(self, member: Member) -> None:
+        """Stores given Discord Member object"""
+        logger["users"][member.id].debug(f"Saving {member.display_name!r}")
+        self.known_user_ids.add(member.id)
+        await self._put("member", member_to_record(member))
+
+    async def store_message(self, message: Message) -> None:
+        """
+        Stores given Discord Message object
+
+        If the author isn't stored yet, it stores it along the way.
+        """
+        if message.author.id not in self.known_user_ids:
+            logger["users"][message.author.id].debug(
+                f"Saving {message.author.display_name!r}"
+            )
+            self.known_user_ids.add(message.author.id)
+            await self._put("user", user_to_record(message.author))
+        await self._put("message", message_to_record(message))
+
+    async def store_pin(self, message: Message, member: Member) -> None:
+        """Stores the information about given Discord Member pinning given Discord Message"""
+        logger["pins"].debug(
+            f"Message {message.jump_url} is pinned by member '{member.display_name}' #{member.id}"
+        )
+        await self._put("pin", dict(pinned_message=message.id, member=member.id))
+
+    async def delete_messages(self, channel_id: int, before: datetime) -> None:
+        """
+        Deletes messages stored for given channel, which were created
+        before given time, and pins of such messages
+        """
+        await self._put("deletion", dict(channel_id=channel_id, before=before))
+
+    async def store_dm_channel(self, channel: DMChannel) -> None:
+        """Stores the information about given Discord DM channel"""
+        member = channel.recipient
+        logger["dm"].debug(
+            f"Channel {channel.id} belongs to member '{member.display_name}' #{member.id}"
+        )
+        await self._put("dm_channel", dict(id=channel.id, member_id=member.id))
+
+    async def _put(self, kind: str, record: dict) -> None:
+        if self._task.done():
+            self._task.result()  # raises
+        await self._queue.put((kind, record))
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        closing = False
+        while not closing:
+            records = [await self._queue.get()]
+            deadline = loop.time() + WRITER_FLUSH_INTERVAL_SEC
+            while len(records) < self.batch_size and records[-1] is not None:
+                try:
+                    records.append(
+                        await asyncio.wait_for(
+                            self._queue.get(), deadline - loop.time()
+                        )
+                    )
+                except TimeoutError:
+                    break
+            if records[-1] is None:
+                closing = True
+                records.pop()
+            if records:
+                await loop.run_in_executor(None, write_records, records)
+                self.counter += len(records)
+                logger.debug(f"Stored {self.counter} records so far")
+
+
+def member_to_record(member: Member) -> dict:
+    return dict(
         id=member.id,
         is_bot=member.bot,
         is_member=True,
@@ -50,118 +179,269 @@ def store_member(member: Member) -> ClubUser:
     )
 
 
+def user_to_record(user: User) -> dict:
+    # The message.author can be an instance of Member, but it can also be an instance of User,
+    # if the author isn't a member of the Discord guild/server anymore. User instances don't
+    # have certain properties, hence the getattr() calls below.
+    return dict(
+        id=user.id,
+        is_bot=user.bot,
+        is_member=bool(getattr(user, "joined_at", False)),
+        has_avatar=bool(user.avatar),
+        display_name=user.display_name,
+        mention=user.mention,
+        joined_at=(
+            arrow.get(user.joined_at).naive if hasattr(user, "joined_at") else None
+        ),
+        initial_roles=get_user_roles(user),
+    )
+
+
+def message_to_record(message: Message) -> dict:
+    # The channel can be a GuildChannel, but it can also be a DMChannel.
+    # Those have different properties, hence the get_...() and getattr() calls below.
+    channel = message.channel
+    return dict(
+        id=message.id,
+        url=message.jump_url,
+        content=message.content,
+        content_size=len(message.content or ""),
+        content_starting_emoji=get_starting_emoji(message.content),
+        reactions={
+            emoji_name(reaction.emoji): reaction.count for reaction in message.reactions
+        },
+        upvotes_count=count_upvotes(message.reactions),
+        downvotes_count=count_downvotes(message.reactions),
+        created_at=arrow.get(message.created_at).naive,
+        created_month=f"{message.created_at:%Y-%m}",
+        edited_at=(arrow.get(message.edited_at).naive if message.edited_at else None),
+        author=message.author.id,
+        author_is_bot=message.author.id == ClubMemberID.BOT,
+        channel_id=channel.id,
+        channel_name=get_channel_name(channel),
+        parent_channel_id=get_parent_channel(channel).id,
+        parent_channel_name=get_channel_name(get_parent_channel(channel)),
+        category_id=getattr(channel, "category_id", None),
+        type=message.type.name,
+        is_private=is_channel_private(channel),
+        pinned_message_url=get_pinned_message_url(message),
+    )
+
+
 @db.connection_context()
-def _store_user(user: User) -> ClubUser:
-    """
-    Stores in database given Discord User object
+def write_records(records: list[tuple[str, dict]]) -> None:
+    with db.atomic():
+        write_batch(records)
 
-    If given user is already stored, it silently returns the existing database object.
-    """
-    logger["users"][user.id].debug(f"Saving {user.display_name!r}")
-    try:
-        # The message.author can be an instance of Member, but it can also be an instance of User,
-        # if the author isn't a member of the Discord guild/server anymore. User instances don't
-        # have certain properties, hence the getattr() calls below.
-        obj = ClubUser.create(
-            id=user.id,
-            is_bot=user.bot,
-            is_member=bool(getattr(user, "joined_at", False)),
-            has_avatar=bool(user.avatar),
-            display_name=user.display_name,
-            mention=user.mention,
-            joined_at=(
-                arrow.get(user.joined_at).naive if hasattr(user, "joined_at") else None
-            ),
-            initial_roles=get_user_roles(user),
+
+def write_batch(records: list[tuple[str, dict]]) -> None:
+    grouped = {kind: [] for kind in WRITER_ORDER}
+    for kind, record in records:
+        grouped[kind].append(record)
+    for deletion in grouped["deletion"]:
+        _delete_messages(**deletion)
+    # Users and messages can be already stored from previous crawl,
+    # see restore_snapshot(), so those get updated with the crawled data
+    _insert_many(
+        ClubUser.insert_many,
+        grouped["member"],
+        conflict_target=[ClubUser.id],
+        preserve=MEMBER_FIELDS,
+    )
+    _insert_many(ClubUser.insert_many, grouped["user"], ignore=True)
+    _delete_pins([message["id"] for message in grouped["message"]])
+    _insert_many(
+        ClubMessage.insert_many,
+        grouped["message"],
+        conflict_target=[ClubMessage.id],
+        preserve=ClubMessage._meta.sorted_fields,
+    )
+    _insert_many(ClubPin.insert_many, grouped["pin"])
+    for dm_channel in grouped["dm_channel"]:
+        _update_dm_channel(**dm_channel)
+
+
+def _insert_many(
+    insert_many, records, ignore=False, conflict_target=None, preserve=None
+) -> None:
+    for batch in peewee.chunked(records, WRITER_INSERT_CHUNK_SIZE):
+        query = insert_many(batch)
+        if ignore:
+            query = query.on_conflict_ignore()
+        elif preserve:
+            query = query.on_conflict(
+                conflict_target=conflict_target, preserve=preserve
+            )
+        query.execute()
+
+
+def _delete_pins(message_ids: list[int]) -> None:
+    # Pins of re-crawled messages get crawled again, too
+    for batch in peewee.chunked(message_ids, WRITER_INSERT_CHUNK_SIZE):
+        ClubPin.delete().where(ClubPin.pinned_message.in_(batch)).execute()
+
+
+def _update_dm_channel(id: int, member_id: int) -> None:
+    # Assuming the recipient is a member, but also ensuring it REALLY IS a member
+    # in the where() clause below.
+    rows_count = (
+        ClubUser.update({ClubUser.dm_channel_id: id})
+        .where(ClubUser.id == member_id, ClubUser.is_member == True)
+        .execute()
+    )
+    if rows_count != 1:
+        raise RuntimeError(
+            f"Unexpected number of rows updated ({rows_count}) when recording DM channel #{id} to member #{member_id}"
         )
-        logger["users"][user.id].debug(f"Saved {user.display_name!r} as {obj!r}")
-        return obj
-    except peewee.IntegrityError:
-        obj = ClubUser.get_by_id(user.id)
-        logger["users"][user.id].debug(f"Found {user.display_name!r} as {obj!r}")
-        return obj
+
+
+@db.connection_context()
+def _get_user_ids() -> set[int]:
+    return {user.id for user in ClubUser.select(ClubUser.id)}
 
 
 @make_async
 @db.connection_context()
-def store_message(message: Message) -> ClubMessage:
+def restore_snapshot(cache: Cache) -> dict[int, dict]:
     """
-    Stores in database given Discord Message object
+    Restores content stored by the previous crawl from given cache
 
-    If the author isn't stored yet, it stores it along the way.
+    Returns cursors of the restored channels, so that the crawl can
+    continue from them. Restored users aren't members until the crawl
+    stores them again.
     """
-    # The channel can be a GuildChannel, but it can also be a DMChannel.
-    # Those have different properties, hence the get_...() and getattr() calls below.
-    channel = message.channel
-    try:
-        return ClubMessage.create(
-            id=message.id,
-            url=message.jump_url,
-            content=message.content,
-            content_size=len(message.content or ""),
-            content_starting_emoji=get_starting_emoji(message.content),
-            reactions={
-                emoji_name(reaction.emoji): reaction.count
-                for reaction in message.reactions
-            },
-            upvotes_count=count_upvotes(message.reactions),
-            downvotes_count=count_downvotes(message.reactions),
-            created_at=arrow.get(message.created_at).naive,
-            created_month=f"{message.created_at:%Y-%m}",
-            edited_at=(
-                arrow.get(message.edited_at).naive if message.edited_at else None
-            ),
-            author=_store_user(message.author),
-            author_is_bot=message.author.id == ClubMemberID.BOT,
-            channel_id=channel.id,
-            channel_name=get_channel_name(channel),
-            parent_channel_id=get_parent_channel(channel).id,
-            parent_channel_name=get_channel_name(get_parent_channel(channel)),
-            category_id=getattr(channel, "category_id", None),
-            type=message.type.name,
-            is_private=is_channel_private(channel),
-            pinned_message_url=get_pinned_message_url(message),
-        )
-    except peewee.IntegrityError:
-        message_obj = ClubMessage.get_by_id(message.id)
-        logger["messages"].debug(
-            f"Message {message.jump_url} apparently already stored as {message_obj!r}"
-        )
-        return message_obj
+    return load_snapshot(cache)
+
+
+def load_snapshot(cache: Cache) -> dict[int, dict]:
+    cursors = cache.get(SNAPSHOT_CURSORS_KEY, {})
+    file = cache.get(SNAPSHOT_KEY, read=True)
+    if not cursors or file is None:
+        logger.info("Nothing to restore")
+        return {}
+    with file:
+        snapshot_path = file.name
+    with _attached_snapshot(snapshot_path), db.atomic():
+        _restore_snapshot_table(ClubUser, is_member=False)
+        _restore_snapshot_table(ClubMessage)
+        _restore_snapshot_table(ClubPin)
+    logger.info(f"Restored {len(cursors)} channels")
+    return cursors
 
 
 @make_async
 @db.connection_context()
-def store_pin(message: ClubMessage, member: Member) -> ClubPin:
+def save_snapshot(cache: Cache, channel_ids: set[int]) -> None:
     """
-    Stores in database the information about given Discord Member pinning given Discord Message
+    Saves crawled content to given cache, so that the next crawl can be incremental
 
-    If the reacting member isn't stored yet, it stores it along the way.
+    Takes IDs of crawled channels. Restored content of channels which haven't
+    been crawled at all, e.g. because they've been deleted or they've fallen
+    out of history, gets deleted first.
     """
-    logger["pins"].debug(
-        f"Message {message.url} is pinned by member '{member.display_name}' #{member.id}"
+    with db.atomic():
+        prune_content(list(channel_ids))
+    dump_snapshot(cache)
+
+
+def prune_content(channel_ids: list[int]) -> None:
+    messages = ClubMessage.select(ClubMessage.id).where(
+        ClubMessage.channel_id.not_in(channel_ids)
     )
-    return ClubPin.create(
-        pinned_message=message.id, member=ClubUser.get_member_by_id(member.id)
+    ClubPin.delete().where(ClubPin.pinned_message.in_(messages)).execute()
+    deleted_count = ClubMessage.delete().where(ClubMessage.id.in_(messages)).execute()
+    ClubUser.delete().where(
+        ClubUser.is_member == False, ~_is_user_referenced()
+    ).execute()
+    logger.info(f"Deleted {deleted_count} messages of channels not crawled anymore")
+
+
+def dump_snapshot(cache: Cache) -> None:
+    # The whole snapshot is a single SQLite file, which replaces the previous one
+    with TemporaryDirectory() as temp_dir:
+        snapshot_path = Path(temp_dir) / "snapshot.db"
+        with _attached_snapshot(snapshot_path), db.atomic():
+            _create_snapshot_table(
+                ClubUser,
+                ClubUser.select(*USER_DISCORD_FIELDS).where(_is_user_referenced()),
+            )
+            _create_snapshot_table(ClubMessage, ClubMessage.select())
+            _create_snapshot_table(
+                ClubPin, ClubPin.select(ClubPin.pinned_message, ClubPin.member)
+            )
+        with snapshot_path.open("rb") as file:
+            cache.set(SNAPSHOT_KEY, file, read=True)
+
+    # The cursors go last, so that they never point past the saved content
+    cursors = get_cursors()
+    cache[SNAPSHOT_CURSORS_KEY] = cursors
+    for key in set(cache) - {SNAPSHOT_KEY, SNAPSHOT_CURSORS_KEY}:
+        del cache[key]  # left behind by previous versions of the snapshot
+    logger.info(f"Saved {len(cursors)} channels")
+
+
+def get_cursors() -> dict[int, dict]:
+    """
+    Returns the ID of the last message and the time of the last edit
+    for each channel, i.e. the high-water marks of the stored content
+    """
+    query = ClubMessage.select(
+        ClubMessage.channel_id,
+        peewee.fn.max(ClubMessage.id).alias("last_message_id"),
+        peewee.fn.max(ClubMessage.edited_at)
+        .python_value(ClubMessage.edited_at.python_value)
+        .alias("edited_at"),
+    ).group_by(ClubMessage.channel_id)
+    return {cursor.pop("channel_id"): cursor for cursor in query.dicts()}
+
+
+@contextmanager
+def _attached_snapshot(path: Path | str) -> Generator[None, None, None]:
+    # SQLite refuses to attach or detach databases within a transaction,
+    # so this needs to wrap the db.atomic() block
+    db.execute_sql(f"ATTACH DATABASE ? AS {SNAPSHOT_SCHEMA}", (str(path),))
+    try:
+        yield
+    finally:
+        db.execute_sql(f"DETACH DATABASE {SNAPSHOT_SCHEMA}")
+
+
+def _create_snapshot_table(model: type[peewee.Model], query: peewee.Select) -> None:
+    table = model._meta.table_name
+    sql, params = query.sql()
+    db.execute_sql(f'CREATE TABLE {SNAPSHOT_SCHEMA}."{table}" AS {sql}', params)
+
+
+def _restore_snapshot_table(model: type[peewee.Model], **values) -> None:
+    # Only columns present in both the snapshot and the model, so that
+    # changes in the models don't break restoring older snapshots
+    table = model._meta.table_name
+    model_columns = {field.column_name for field in model._meta.sorted_fields}
+    columns = [
+        column.name
+        for column in db.get_columns(table, schema=SNAPSHOT_SCHEMA)
+        if column.name in model_columns and column.name not in values
+    ]
+    columns_sql = ", ".join(f'"{column}"' for column in [*columns, *values])
+    select_sql = ", ".join([f'"{column}"' for column in columns] + ["?"] * len(values))
+    db.execute_sql(
+        f'INSERT INTO "{table}" ({columns_sql})'
+        f' SELECT {select_sql} FROM {SNAPSHOT_SCHEMA}."{table}"',
+        list(values.values()),
     )
 
 
-@make_async
-@db.connection_context()
-def store_dm_channel(channel: DMChannel) -> None:
-    """Stores in database the information about given Discord DM channel"""
-    # Assuming the recipient is a member, but also ensuring it REALLY IS a member
-    # in the where() clause below.
-    member = channel.recipient
-    logger["dm"].debug(
-        f"Channel {channel.id} belongs to member '{member.display_name}' #{member.id}"
+def _is_user_referenced() -> peewee.Expression:
+    return ClubUser.id.in_(ClubMessage.select(ClubMessage.author)) | ClubUser.id.in_(
+        ClubPin.select(ClubPin.member)
     )
-    rows_count = (
-        ClubUser.update({ClubUser.dm_channel_id: channel.id})
-        .where(ClubUser.id == member.id, ClubUser.is_member == True)
-        .execute()
+
+
+def _delete_messages(channel_id: int, before: datetime) -> None:
+    messages = ClubMessage.select(ClubMessage.id).where(
+        ClubMessage.channel_id == channel_id,
+        ClubMessage.created_at < arrow.get(before).naive,
     )
-    if rows_count != 1:
-        raise RuntimeError(
-            f"Unexpected number of rows updated ({rows_count}) when recording DM channel #{channel.id} to member #{member.id}"
-        )
+    ClubPin.delete().where(ClubPin.pinned_message.in_(messages)).execute()
+    deleted_count = ClubMessage.delete().where(ClubMessage.id.in_(messages)).execute()
+    logger["deletions"][channel_id].debug(f"Deleted {deleted_count} messages")
@@ -9,12 +9,7 @@ from strictyaml import CommaSeparated, Int, Map, Optional, Seq, Str, Url, load
 from juniorguru.cli.sync import main as cli
 from juniorguru.lib import discord_sync, loggers
 from juniorguru.lib.discord_club import ClubChannelID, ClubClient, ClubMemberID
-from juniorguru.lib.images import (
-    PostersCache,
-    is_image,
-    render_image_file,
-    validate_image,
-)
+from juniorguru.lib.images import ImageRenderer, PostersCache, is_image, validate_image
 from juniorguru.lib.mutations import MutationsNotAllowedError, mutating_discord
 from juniorguru.lib.template_filters import local_time, md, weekday
 from juniorguru.lib.yaml import Date
@@ -79,7 +74,7 @@ def main(clear_posters):
         logger.debug(f"Validating {path}")
         validate_image(path)
 
-    with db.connection_context():
+    with db.connection_context(), ImageRenderer() as renderer:
         logger.info("Setting up events db tables")
         db.drop_tables([Event, EventSpeaking])
         db.create_tables([Event, EventSpeaking])
@@ -119,7 +114,7 @@ def main(clear_posters):
             tpl_context = dict(event=event)
             tpl_filters = dict(md=md, local_time=local_time, weekday=weekday)
             prefix = event.start_at.date().isoformat().replace("-", "")
-            image_path = render_image_file(
+            image_path = renderer.render_image_file(
                 DISCORD_THUMBNAIL_WIDTH,
                 DISCORD_THUMBNAIL_HEIGHT,
                 "event.jinja",
@@ -131,7 +126,7 @@ def main(clear_posters):
             )
             event.poster_dc_path = image_path.relative_to(IMAGES_DIR)
             posters.record(IMAGES_DIR / event.poster_dc_path)
-            image_path = render_image_file(
+            image_path = renderer.render_image_file(
                 YOUTUBE_THUMBNAIL_WIDTH,
                 YOUTUBE_THUMBNAIL_HEIGHT,
                 "event.jinja",
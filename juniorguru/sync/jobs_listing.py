@@ -3,7 +3,13 @@ from datetime import date
 from juniorguru.cli.sync import main as cli
 from juniorguru.lib import loggers
 from juniorguru.models.base import db
-from juniorguru.models.job import ListedJob, ScrapedJob, SubmittedJob
+from juniorguru.models.job import (
+    ListedJob,
+    ListedJobRegion,
+    ListedJobTag,
+    ScrapedJob,
+    SubmittedJob,
+)
 
 
 MIN_JUNIORITY_RE_SCORE = 1
@@ -15,8 +21,9 @@ logger = loggers.from_path(__file__)
 @cli.sync_command(dependencies=["jobs-scraped", "jobs-submitted"])
 @db.connection_context()
 def main():
-    ListedJob.drop_table()
-    ListedJob.create_table()
+    tables = [ListedJob, ListedJobTag, ListedJobRegion]
+    db.drop_tables(tables)
+    db.create_tables(tables)
 
     listing_date = date.today()
     logger.info(f"Processing submitted jobs: {listing_date}")
@@ -39,3 +46,7 @@ def main():
         job = scraped_job.to_listed()
         job.save()
         logger.debug(f"Saved {scraped_job!r} as {job!r}")
+
+    logger.info("Indexing listed jobs")
+    with db.atomic():
+        ListedJob.index()
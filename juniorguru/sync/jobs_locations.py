@@ -1,26 +1,85 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import click
+from diskcache import Cache
+
 from juniorguru.cli.sync import main as cli
 from juniorguru.lib import loggers
-from juniorguru.lib.locations import fetch_locations
+from juniorguru.lib.locations import (
+    GEOCODE_CACHE_TAG,
+    cache_geocoding,
+    fetch_locations,
+    geocode_mapycz,
+)
 from juniorguru.models.base import db
 from juniorguru.models.job import ListedJob
 
 
+WORKERS = 4
+
+
 logger = loggers.from_path(__file__)
 
 
 @cli.sync_command(dependencies=["jobs-listing"])
+@cli.pass_persistent_cache
+@click.option("--clear-cache/--keep-cache", default=False)
 @db.connection_context()
-def main():
+def main(persistent_cache: Cache, clear_cache: bool):
+    if clear_cache:
+        logger.info("Clearing geocoding cache")
+        persistent_cache.evict(GEOCODE_CACHE_TAG)
+    geocode = cache_geocoding(geocode_mapycz, persistent_cache)
+
+    jobs = []
     for job in ListedJob.listing():
         if job.locations_raw:
+            jobs.append(job)
+        else:
+            logger.debug(f"Job {job!r} has no locations set")
+
+    locations_raw = sorted(
+        {location_raw for job in jobs for location_raw in job.locations_raw}
+    )
+    logger.info(
+        f"Geocoding {len(locations_raw)} distinct locations of {len(jobs)} jobs"
+    )
+    with ThreadPoolExecutor(max_workers=WORKERS) as executor:
+        results = dict(
+            zip(locations_raw, executor.map(geocode_safe(geocode), locations_raw))
+        )
+
+    with db.atomic():
+        for job in jobs:
             logger.debug(f"Normalizing locations for {job!r}: {job.locations_raw!r}")
             job.locations = fetch_locations(
                 job.locations_raw,
+                geocode=geocode_from_results(results),
                 debug_info=dict(title=job.title, company_name=job.company_name),
             )
             logger.info(
                 f"Locations for {job!r} normalized: {job.locations_raw} → {job.locations}"
             )
             job.save()
-        else:
-            logger.debug(f"Job {job!r} has no locations set")
+        logger.info("Indexing listed jobs")
+        ListedJob.index()
+
+
+def geocode_safe(geocode):
+    def wrapper(location_raw):
+        try:
+            return geocode(location_raw)
+        except Exception as e:
+            return e
+
+    return wrapper
+
+
+def geocode_from_results(results):
+    def geocode(location_raw):
+        result = results[location_raw]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    return geocode
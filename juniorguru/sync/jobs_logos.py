@@ -1,12 +1,17 @@
 import hashlib
+import time
+from functools import cache as memoize
 from io import BytesIO
 from multiprocessing import Pool
 from pathlib import Path
 from urllib.parse import urlparse
 
+import click
 import favicon
 import requests
+from diskcache import Cache
 from PIL import Image, ImageChops, ImageOps
+from requests.adapters import HTTPAdapter
 
 from juniorguru.cli.sync import main as cli
 from juniorguru.lib import loggers
@@ -24,6 +29,16 @@ LOGOS_DIR = IMAGES_DIR / "logos-jobs"
 
 WORKERS = 4
 
+CACHE_TAG = "jobs-logos"
+
+ICONS_CACHE_EXPIRE = 60 * 60 * 24 * 7
+
+IMAGES_CACHE_EXPIRE = 60 * 60 * 24 * 30
+
+IMAGES_RECHECK_SEC = 60 * 60 * 24
+
+POOL_MAXSIZE = 10
+
 # https://docs.python-requests.org/en/master/user/advanced/#timeouts
 REQUEST_TIMEOUT = (3.05, 15)
 
@@ -52,9 +67,14 @@ logger = loggers.from_path(__file__)
 
 
 @cli.sync_command(dependencies=["jobs-listing"])
+@cli.pass_persistent_cache
+@click.option("--clear-cache/--keep-cache", default=False)
 @db.connection_context()
-def main():
+def main(persistent_cache: Cache, clear_cache: bool):
     Path(LOGOS_DIR).mkdir(exist_ok=True, parents=True)
+    if clear_cache:
+        logger.info("Clearing logos cache")
+        persistent_cache.evict(CACHE_TAG)
 
     with Pool(WORKERS) as pool:
         jobs = ListedJob.listing()
@@ -67,19 +87,64 @@ def main():
                 urls[logo_url]["jobs"].append(job.id)
 
         logger.info("Fetching and registering company icon URLs")
-        inputs = ((job.id, job.company_url) for job in jobs if job.company_url)
-        results = pool.imap_unordered(fetch_icon_urls, inputs)
-        for job_id, icon_urls in results:
-            for icon_url in icon_urls:
+        company_urls = {}
+        for job in jobs:
+            if job.company_url:
+                company_urls.setdefault(job.company_url, []).append(job.id)
+        icon_urls = {}
+        inputs = []
+        for company_url in company_urls:
+            try:
+                icon_urls[company_url] = persistent_cache[
+                    get_icons_cache_key(company_url)
+                ]
+            except KeyError:
+                inputs.append(company_url)
+        logger.info(
+            f"Icon URLs of {len(icon_urls)} companies loaded from cache, "
+            f"fetching {len(inputs)}"
+        )
+        for company_url, urls_found in pool.imap_unordered(fetch_icon_urls, inputs):
+            if urls_found is None:
+                urls_found = []
+            else:
+                persistent_cache.set(
+                    get_icons_cache_key(company_url),
+                    urls_found,
+                    expire=ICONS_CACHE_EXPIRE,
+                    tag=CACHE_TAG,
+                )
+            icon_urls[company_url] = urls_found
+        for company_url, job_ids in company_urls.items():
+            for icon_url in icon_urls[company_url]:
                 urls.setdefault(icon_url, dict(type="icon", jobs=[]))
-                urls[icon_url]["jobs"].append(job_id)
+                urls[icon_url]["jobs"].extend(job_ids)
 
         logger.info("Downloading images from both logo and icon URLs")
-        results = pool.imap_unordered(download_image, urls.keys())
-        for image_url, image_path, orig_width, orig_height in results:
-            urls[image_url]["image_path"] = image_path
-            urls[image_url]["orig_width"] = orig_width
-            urls[image_url]["orig_height"] = orig_height
+        inputs = []
+        for image_url in urls:
+            image = persistent_cache.get(get_image_cache_key(image_url))
+            if image and not Path(image["image_path"]).exists():
+                # CI doesn't keep the images directory across days, only the cache
+                Path(image["image_path"]).write_bytes(image["image_data"])
+            if image and time.time() - image["checked_at"] < IMAGES_RECHECK_SEC:
+                urls[image_url].update(get_image_info(image))
+            else:
+                inputs.append((image_url, image))
+        logger.info(
+            f"{len(urls) - len(inputs)} images are fresh in cache, "
+            f"checking {len(inputs)}"
+        )
+        for image in pool.imap_unordered(download_image, inputs):
+            urls[image["image_url"]].update(get_image_info(image))
+            if image["image_path"]:
+                image["checked_at"] = time.time()
+                persistent_cache.set(
+                    get_image_cache_key(image["image_url"]),
+                    image,
+                    expire=IMAGES_CACHE_EXPIRE,
+                    tag=CACHE_TAG,
+                )
 
         logger.info("Deciding which images to use")
         logo_paths = {}
@@ -115,34 +180,63 @@ def sort_key(logo):
     return (is_icon, similarity_to_square, area)
 
 
-def fetch_icon_urls(args):
+def get_icons_cache_key(company_url):
+    return f"{CACHE_TAG}:icons:{urlparse(company_url).hostname}"
+
+
+def get_image_cache_key(image_url):
+    return f"{CACHE_TAG}:image:{image_url}"
+
+
+def get_image_info(image):
+    return dict(
+        image_path=image["image_path"],
+        orig_width=image["orig_width"],
+        orig_height=image["orig_height"],
+    )
+
+
+@memoize
+def get_session():
+    # One session per worker process, connections are pooled per host
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=POOL_MAXSIZE, pool_maxsize=POOL_MAXSIZE)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def fetch_icon_urls(company_url):
     logger_f = logger["fetch_icon_urls"]
-    job_id, company_url = args
-    logger_f.debug(f"Fetching icon URLs for <ListedJob: {job_id}>, {company_url}")
+    logger_f.debug(f"Fetching icon URLs for {company_url}")
     try:
         icons = favicon.get(
             company_url, timeout=REQUEST_TIMEOUT, headers=DEFAULT_REQUEST_HEADERS
         )
         urls = unique(icon.url for icon in icons)
-        logger_f.info(
-            f"Icon URLs found for <ListedJob: {job_id}>, {company_url}: {urls!r}"
-        )
-        return job_id, urls
+        logger_f.info(f"Icon URLs found for {company_url}: {urls!r}")
+        return company_url, urls
     except Exception:
-        logger_f.exception(
-            f"Fetching icon URLs for <ListedJob: {job_id}>, {company_url} failed"
-        )
-        return job_id, []
+        logger_f.exception(f"Fetching icon URLs for {company_url} failed")
+        return company_url, None
 
 
-def download_image(image_url):
+def download_image(args):
     logger_d = logger["download_image"]
+    image_url, cached_image = args
     logger_d.debug(f"Downloading {image_url}")
     try:
         headers = dict(DEFAULT_REQUEST_HEADERS)
         headers["User-Agent"] = choose_user_agent(image_url)
-        response = requests.get(image_url, timeout=REQUEST_TIMEOUT, headers=headers)
+        if cached_image:
+            headers.update(get_conditional_headers(cached_image))
+        response = get_session().get(
+            image_url, timeout=REQUEST_TIMEOUT, headers=headers
+        )
         response.raise_for_status()
+        if cached_image and response.status_code == 304:
+            logger_d.debug(f"Not modified {image_url}")
+            return cached_image
 
         orig_image = Image.open(BytesIO(response.content))
         orig_width, orig_height = orig_image.size
@@ -153,13 +247,34 @@ def download_image(image_url):
 
         hash = hashlib.sha1(image_url.encode()).hexdigest()
         image_path = LOGOS_DIR / f"{hash}.png"
-        convert_image(orig_image).save(image_path)
+        image_file = BytesIO()
+        convert_image(orig_image).save(image_file, format="PNG")
+        image_path.write_bytes(image_file.getvalue())
         logger_d.info(f"Downloaded {image_url} as {image_path}")
 
-        return image_url, image_path, orig_width, orig_height
+        return dict(
+            image_url=image_url,
+            image_path=str(image_path),
+            image_data=image_file.getvalue(),
+            orig_width=orig_width,
+            orig_height=orig_height,
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified"),
+        )
     except Exception:
         logger_d.exception(f"Unable to download {image_url}")
-        return image_url, None, None, None
+        return dict(
+            image_url=image_url, image_path=None, orig_width=None, orig_height=None
+        )
+
+
+def get_conditional_headers(cached_image):
+    headers = {}
+    if cached_image.get("etag"):
+        headers["If-None-Match"] = cached_image["etag"]
+    if cached_image.get("last_modified"):
+        headers["If-Modified-Since"] = cached_image["last_modified"]
+    return headers
 
 
 def convert_image(image):
@@ -1,5 +1,6 @@
 import itertools
 import re
+from functools import cache
 
 
 LANG_MAPPING = {
@@ -40,7 +41,23 @@ def rule(identifier, *patterns, ignorecase=True, any_order=False):
                 ),
                 compile_flags,
             )
-            yield (identifier, rule_re)
+            prefilter_res = tuple(
+                dict.fromkeys(
+                    compile_prefilter(pattern, compile_flags)
+                    for pattern in patterns_tuple
+                )
+            )
+            yield (identifier, rule_re, prefilter_res)
+
+
+@cache
+def compile_prefilter(pattern, compile_flags):
+    """
+    Each part of a rule must be found somewhere in the sentence for the whole
+    rule to match. The parts are shared by many rules, so checking them first
+    (once per sentence) rules out most of the rules without running them.
+    """
+    return re.compile(pattern, compile_flags)
 
 
 def rules(rules):
@@ -499,6 +516,23 @@ RULES = {"en": RULES_EN, "cs": RULES_CS}
 SUPPRESSING_RULES = {"en": SUPPRESSING_RULES_EN, "cs": SUPPRESSING_RULES_CS}
 
 
+def index_rules(rules):
+    """
+    Groups positions of given rules by the first part of each rule. Only
+    rules having their first part found in a sentence are candidates to match.
+    """
+    index = {}
+    for position, (_, _, prefilter_res) in enumerate(rules):
+        index.setdefault(prefilter_res[0], []).append(position)
+    return list(index.items())
+
+
+RULES_INDEX = {lang: index_rules(rules) for lang, rules in RULES.items()}
+SUPPRESSING_RULES_INDEX = {
+    lang: index_rules(rules) for lang, rules in SUPPRESSING_RULES.items()
+}
+
+
 def process(item):
     parse_results = deduplicate(
         itertools.chain(
@@ -535,15 +569,46 @@ def parse_from_sentences(sentences, lang):
 
 
 def parse_from_sentence(sentence, lang):
-    for rule_id, rule_re in RULES[lang]:
-        match = rule_re.search(sentence)
-        if match and not is_supressed(rule_id, sentence, lang):
+    search = memoized_search(sentence)
+    suppressing_rule_ids = None
+    for rule_id, rule_re in search_rules(
+        sentence, RULES[lang], RULES_INDEX[lang], search
+    ):
+        if suppressing_rule_ids is None:
+            suppressing_rule_ids = get_suppressing_rule_ids(sentence, lang, search)
+        if not is_supressed(rule_id, suppressing_rule_ids):
             yield (rule_id, sentence, rule_re.pattern)
 
 
-def is_supressed(rule_id, sentence, lang):
-    for suppressing_rule_id, suppressing_rule_re in SUPPRESSING_RULES[lang]:
-        is_relevant = suppressing_rule_id == "" or suppressing_rule_id == rule_id
-        if is_relevant and suppressing_rule_re.search(sentence):
-            return True
-    return False
+def get_suppressing_rule_ids(sentence, lang, search=None):
+    search = search or memoized_search(sentence)
+    return {
+        suppressing_rule_id
+        for suppressing_rule_id, _ in search_rules(
+            sentence, SUPPRESSING_RULES[lang], SUPPRESSING_RULES_INDEX[lang], search
+        )
+    }
+
+
+def search_rules(sentence, rules, rules_index, search):
+    candidates = sorted(
+        itertools.chain.from_iterable(
+            positions for first_re, positions in rules_index if search(first_re)
+        )
+    )
+    for position in candidates:
+        rule_id, rule_re, prefilter_res = rules[position]
+        if all(map(search, prefilter_res[1:])) and rule_re.search(sentence):
+            yield rule_id, rule_re
+
+
+def is_supressed(rule_id, suppressing_rule_ids):
+    return "" in suppressing_rule_ids or rule_id in suppressing_rule_ids
+
+
+def memoized_search(sentence):
+    @cache
+    def search(pattern_re):
+        return pattern_re.search(sentence) is not None
+
+    return search
@@ -1,5 +1,7 @@
 import gzip
+import hashlib
 import importlib
+import importlib.util
 import json
 import os
 from datetime import date
@@ -8,7 +10,7 @@ from pathlib import Path
 from pprint import pformat
 from queue import Empty
 
-from peewee import IntegrityError
+from peewee import chunked
 
 from juniorguru.lib import loggers
 from juniorguru.models.base import db
@@ -25,6 +27,26 @@ LOGGING_POSTPROCESSOR_BATCH_SIZE = 100
 
 LOGGING_PERSISTOR_BATCH_SIZE = 100
 
+WRITER_BATCH_SIZE = 1000
+
+PERSISTOR_BATCH_SIZE = 1000
+
+BATCH_TIMEOUT_SEC = 0.5
+
+INSERT_CHUNK_SIZE = 500
+
+POSTPROCESSOR_BATCH_SIZE = 100
+
+CONTENT_HASH_EXCLUDE_FIELDS = [
+    "id",
+    "first_seen_on",
+    "last_seen_on",
+    "boards_ids",
+    "source_urls",
+    "content_hash",
+    "pipelines_hash",
+]
+
 
 logger = loggers.from_path(__file__)
 
@@ -61,6 +83,8 @@ logger = loggers.from_path(__file__)
 #   around multiple processes.
 # - SQLite doesn't handle concurrent writing well. Concurrent reading is okay.
 #   So the bottleneck here is to save the items to the db, or to save changes made.
+#   That's why there's a single writer process and a single persistor process,
+#   both taking batches from their queues and writing each batch in one transaction.
 
 
 class DropItem(Exception):
@@ -197,44 +221,65 @@ def _writer(item_queue):
     counter = 0
     try:
         while True:
-            item = item_queue.get()
-            logger_w.debug(f"Saving {item['url']}")
-            job = ScrapedJob.from_item(item)
+            items = get_batch(item_queue, WRITER_BATCH_SIZE)
+            logger_w.debug(f"Saving {len(items)} items")
             try:
-                job.save()
-            except IntegrityError:
-                job = ScrapedJob.get_by_item(item)
-                job.merge_item(item)
-                job.save()
+                with db.atomic():
+                    save_items(items)
             except Exception:
-                logger_w.error(f"Error saving the following item:\n{pformat(item)}")
+                urls = [item["url"] for item in items]
+                logger_w.error(
+                    f"Error saving items with following URLs:\n{pformat(urls)}"
+                )
                 raise
-            else:
-                logger_w.debug(f"Saved {item['url']} as {job!r}")
             finally:
-                counter += 1
-                if counter % LOGGING_WRITER_BATCH_SIZE == 0:
-                    logger_w.info(f"Saved {counter} items so far")
-                item_queue.task_done()
+                if (counter + len(items)) // LOGGING_WRITER_BATCH_SIZE > (
+                    counter // LOGGING_WRITER_BATCH_SIZE
+                ):
+                    logger_w.info(f"Saved {counter + len(items)} items so far")
+                counter += len(items)
+                for _ in items:
+                    item_queue.task_done()
     finally:
         logger_w.info(f"Saved {counter} items total")
         logger_w.debug("Closing")
 
 
+def save_items(items):
+    """
+    Saves given items to the db. Items with the same URL get merged, regardless
+    of whether the job is already in the db or it's in the given items
+    multiple times.
+    """
+    urls = {item["url"] for item in items}
+    jobs = {job.url: job for job in ScrapedJob.select().where(ScrapedJob.url.in_(urls))}
+    for item in items:
+        item = dict(item, content_hash=get_content_hash(item))
+        try:
+            jobs[item["url"]].merge_item(item)
+        except KeyError:
+            jobs[item["url"]] = ScrapedJob.from_item(item)
+    upsert_jobs(job.to_item() for job in jobs.values())
+
+
 def postprocess_jobs(pipelines, workers=None):
     """
     Take jobs from the database and apply given postprocessing pipeline
-    on the data. Then update the jobs with the changes.
+    on the data. Then update the jobs with the changes. Jobs which have been
+    already postprocessed by the same pipelines and haven't changed since
+    then are skipped.
     """
     workers = workers or WORKERS
+    pipelines_hash = get_pipelines_hash(pipelines)
+    logger.debug(f"Postprocessing pipelines hash: {pipelines_hash}")
 
     # First we create the ID queue and start a separate process, which
-    # queries the db and fills the queue with IDs of all the jobs.
-    # The process being deamon means that it's going to be terminated
-    # automatically once this program is done and doesn't need to be
-    # managed manually.
+    # queries the db and fills the queue with batches of IDs of the jobs
+    # which need postprocessing. The process being deamon means that it's
+    # going to be terminated automatically once this program is done
+    # and doesn't need to be managed manually.
     id_queue = Queue()
-    Process(target=_query, args=(id_queue,), daemon=True).start()
+    Process(target=_query, args=(id_queue, pipelines_hash), daemon=True).start()
 
     # Then we create the queue for operations. Operation is a tuple
     # containing a string like 'save' or 'delete', and then a dict with
@@ -244,18 +289,19 @@ def postprocess_jobs(pipelines, workers=None):
     op_queue = Queue()
     Process(target=_persistor, args=(op_queue,), daemon=True).start()
 
-    # Postprocessor processes get started. They pop IDs of jobs from the
-    # ID queue, fetch the jobs by ID from the db (concurrent reads are OK),
+    # Postprocessor processes get started. They pop batches of IDs from the
+    # ID queue, fetch the jobs by IDs from the db (concurrent reads are OK),
     # then turn the job into a dict, and run the pipelines over the dict.
     # If the pipelines raise DropItem, a 'delete' operation is returned with
     # a minimalistic dict containing only the ID of the job to delete. Else
     # a 'save' operation with a dict of data to update is returned to the
-    # operation queue.
+    # operation queue. The dict is marked with the pipelines hash, so that
+    # the job can be skipped next time.
     postprocessors = []
     for postprocessor_id in range(workers):
         proc = Process(
             target=_postprocessor,
-            args=(postprocessor_id, op_queue, id_queue, pipelines),
+            args=(postprocessor_id, op_queue, id_queue, pipelines, pipelines_hash),
         )
         postprocessors.append(proc)
         proc.start()
@@ -265,17 +311,25 @@ def postprocess_jobs(pipelines, workers=None):
 
 
 @db.connection_context()
-def _query(id_queue):
+def _query(id_queue, pipelines_hash):
     """
-    A single process taking care of listing all jobs in the db
-    and putting their IDs to the ID queue for postprocessing.
+    A single process taking care of listing jobs in the db which need
+    postprocessing and putting batches of their IDs to the ID queue.
     """
-    for job in ScrapedJob.select(ScrapedJob.id).iterator():
-        id_queue.put(job.id)
+    logger_q = logger["query"]
+    query = ScrapedJob.postprocessing_listing(pipelines_hash)
+    counter = 0
+    for ids in chunked((job.id for job in query.iterator()), POSTPROCESSOR_BATCH_SIZE):
+        id_queue.put(ids)
+        counter += len(ids)
+    logger_q.info(
+        f"Listed {counter} jobs for postprocessing, "
+        f"{ScrapedJob.select().count() - counter} are up to date"
+    )
 
 
 @db.connection_context()
-def _postprocessor(id, op_queue, id_queue, pipelines):
+def _postprocessor(id, op_queue, id_queue, pipelines, pipelines_hash):
     """
     Processes taking care of passing items through the postprocessing
     pipelines.
@@ -286,22 +340,30 @@ def _postprocessor(id, op_queue, id_queue, pipelines):
     counter = 0
     try:
         while True:
-            job_id = id_queue.get(timeout=1)
-            job = ScrapedJob.get(job_id)
-            logger_p.debug(f"Executing pipelines for {job!r}")
-            item = job.to_item()
+            job_ids = id_queue.get(timeout=1)
             try:
-                op_queue.put(("save", execute_pipelines(item, pipelines)))
-            except DropItem:
-                logger_p.info(f"Dropping {job!r}")
-                op_queue.put(("delete", {"id": job_id}))
-            except Exception as e:
-                logger_p.exception(f"Executing pipelines for {job!r} failed: {e}")
-                op_queue.put(("delete", {"id": job_id}))
+                for job in ScrapedJob.select().where(ScrapedJob.id.in_(job_ids)):
+                    logger_p.debug(f"Executing pipelines for {job!r}")
+                    item = job.to_item()
+                    try:
+                        item = execute_pipelines(item, pipelines)
+                        item["pipelines_hash"] = pipelines_hash
+                        op_queue.put(("save", item))
+                    except DropItem:
+                        logger_p.info(f"Dropping {job!r}")
+                        op_queue.put(("delete", {"id": job.id}))
+                    except Exception as e:
+                        logger_p.exception(
+                            f"Executing pipelines for {job!r} failed: {e}"
+                        )
+                        op_queue.put(("delete", {"id": job.id}))
+                    finally:
+                        counter += 1
+                        if counter % LOGGING_POSTPROCESSOR_BATCH_SIZE == 0:
+                            logger_p.info(
+                                f"Processed pipelines for {counter} jobs so far"
+                            )
             finally:
-                counter += 1
-                if counter % LOGGING_POSTPROCESSOR_BATCH_SIZE == 0:
-                    logger_p.info(f"Processed pipelines for {counter} jobs so far")
                 id_queue.task_done()
     except Empty:
         logger_p.info(f"Processed pipelines for {counter} jobs total")
@@ -319,31 +381,103 @@ def _persistor(op_queue):
     counter = 0
     try:
         while True:
-            operation, item = op_queue.get()
-            job = ScrapedJob.from_item(item)
+            operations = get_batch(op_queue, PERSISTOR_BATCH_SIZE)
+            logger_p.debug(f"Persisting {len(operations)} operations")
             try:
-                if operation == "delete":
-                    logger_p.debug(f"Deleting {job!r}")
-                    job.delete_instance()
-                elif operation == "save":
-                    logger_p.debug(f"Updating {job!r}")
-                    job.save()
-                else:
-                    raise ValueError(f"Unknown operation: {operation}")
+                with db.atomic():
+                    persist_operations(operations)
             except Exception:
-                logger_p.error(f"Error saving the following item:\n{pformat(item)}")
+                ids = [item.get("id") for _, item in operations]
+                logger_p.error(
+                    f"Error persisting jobs with following IDs:\n{pformat(ids)}"
+                )
                 raise
             finally:
-                del job
-                counter += 1
-                if counter % LOGGING_PERSISTOR_BATCH_SIZE == 0:
-                    logger_p.info(f"Updated {counter} jobs so far")
-                op_queue.task_done()
+                if (counter + len(operations)) // LOGGING_PERSISTOR_BATCH_SIZE > (
+                    counter // LOGGING_PERSISTOR_BATCH_SIZE
+                ):
+                    logger_p.info(f"Updated {counter + len(operations)} jobs so far")
+                counter += len(operations)
+                for _ in operations:
+                    op_queue.task_done()
     finally:
         logger_p.info(f"Updated {counter} jobs total")
         logger_p.debug("Closing")
 
 
+def persist_operations(operations):
+    """
+    Takes a list of tuples containing a string like 'save' or 'delete',
+    and then a dict with the job data. Deletes or updates the jobs
+    in bulk.
+    """
+    delete_ids = []
+    save_items = []
+    for operation, item in operations:
+        if operation == "delete":
+            delete_ids.append(item["id"])
+        elif operation == "save":
+            save_items.append(item)
+        else:
+            raise ValueError(f"Unknown operation: {operation}")
+    for ids in chunked(delete_ids, INSERT_CHUNK_SIZE):
+        ScrapedJob.delete().where(ScrapedJob.id.in_(ids)).execute()
+    upsert_jobs(ScrapedJob.from_item(item).to_item() for item in save_items)
+
+
+def upsert_jobs(rows):
+    """
+    Inserts given rows as jobs, or updates the existing jobs
+    if the rows contain their IDs.
+    """
+    fields = [field for field in ScrapedJob._meta.sorted_fields if field.name != "id"]
+    for rows_chunk in chunked(rows, INSERT_CHUNK_SIZE):
+        ScrapedJob.insert_many(rows_chunk).on_conflict(
+            conflict_target=[ScrapedJob.id], preserve=fields
+        ).execute()
+
+
+def get_batch(queue, size, timeout=BATCH_TIMEOUT_SEC):
+    """
+    Blocks until there's at least one object in given queue. Then takes
+    more objects from the queue, until there's given number of them,
+    or until the queue doesn't provide more within given timeout.
+    """
+    batch = [queue.get()]
+    while len(batch) < size:
+        try:
+            batch.append(queue.get(timeout=timeout))
+        except Empty:
+            break
+    return batch
+
+
+def get_content_hash(item):
+    """
+    Returns a hash of the scraped content of given item, i.e. of the data
+    which the postprocessing pipelines work with.
+    """
+    data = {
+        key: value
+        for key, value in item.items()
+        if key not in CONTENT_HASH_EXCLUDE_FIELDS
+    }
+    data = json.dumps(data, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+def get_pipelines_hash(pipelines):
+    """
+    Returns a hash of given pipelines, which changes whenever a pipeline
+    gets added, removed, reordered, or its code gets changed.
+    """
+    hash = hashlib.sha256()
+    for pipeline in pipelines:
+        hash.update(pipeline.encode())
+        hash.update(Path(importlib.util.find_spec(pipeline).origin).read_bytes())
+    return hash.hexdigest()
+
+
 def load_pipelines(pipelines):
     """
     Take a list of strings, import paths to pipeline modules,
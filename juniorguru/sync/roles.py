@@ -114,7 +114,8 @@ async def discord_task(client: ClubClient):
         )
 
     logger.info("Preparing data for computing how to re-assign roles")
-    members = ClubUser.members_listing()
+    members = list(ClubUser.members_listing())
+    members_stats = ClubUser.members_stats()
     partners = [partnership.partner for partnership in Partnership.active_listing()]
     changes = []
     top_members_limit = ClubUser.top_members_limit()
@@ -123,11 +124,11 @@ async def discord_task(client: ClubClient):
     logger.info("Computing how to re-assign role: most_discussing")
     role_id = ClubDocumentedRole.get_by_slug("most_discussing").id
     content_size_stats = calc_stats(
-        members, lambda m: m.content_size(), top_members_limit
+        members, lambda m: members_stats[m.id]["content_size"], top_members_limit
     )
     logger.debug(f"content_size {repr_stats(members, content_size_stats)}")
     recent_content_size_stats = calc_stats(
-        members, lambda m: m.recent_content_size(), top_members_limit
+        members, lambda m: members_stats[m.id]["recent_content_size"], top_members_limit
     )
     logger.debug(
         f"recent_content_size {repr_stats(members, recent_content_size_stats)}"
@@ -148,11 +149,13 @@ async def discord_task(client: ClubClient):
     logger.info("Computing how to re-assign role: most_helpful")
     role_id = ClubDocumentedRole.get_by_slug("most_helpful").id
     upvotes_count_stats = calc_stats(
-        members, lambda m: m.upvotes_count(), top_members_limit
+        members, lambda m: members_stats[m.id]["upvotes_count"], top_members_limit
     )
     logger.debug(f"upvotes_count {repr_stats(members, upvotes_count_stats)}")
     recent_upvotes_count_stats = calc_stats(
-        members, lambda m: m.recent_upvotes_count(), top_members_limit
+        members,
+        lambda m: members_stats[m.id]["recent_upvotes_count"],
+        top_members_limit,
     )
     logger.debug(
         f"recent_upvotes_count {repr_stats(members, recent_upvotes_count_stats)}"
@@ -171,7 +174,9 @@ async def discord_task(client: ClubClient):
     logger.info("Computing how to re-assign role: has_intro_and_avatar")
     role_id = ClubDocumentedRole.get_by_slug("has_intro_and_avatar").id
     intro_avatar_members_ids = [
-        member.id for member in members if member.has_avatar and member.intro
+        member.id
+        for member in members
+        if member.has_avatar and members_stats[member.id]["has_intro"]
     ]
     logger.debug(f"intro_avatar_members: {repr_ids(members, intro_avatar_members_ids)}")
     for member in members:
@@ -183,7 +188,9 @@ async def discord_task(client: ClubClient):
 
     logger.info("Computing how to re-assign role: newcomer")
     role_id = ClubDocumentedRole.get_by_slug("newcomer").id
-    new_members_ids = [member.id for member in members if member.is_new()]
+    new_members_ids = [
+        member.id for member in members if members_stats[member.id]["is_new"]
+    ]
     logger.debug(f"new_members_ids: {repr_ids(members, new_members_ids)}")
     for member in members:
         changes.extend(
@@ -1,8 +1,7 @@
-import itertools
 from datetime import date, datetime, time, timezone
 from operator import itemgetter
 from pathlib import Path
-from typing import Generator
+from typing import Callable, Generator, Iterable
 
 import click
 
@@ -16,6 +15,7 @@ from juniorguru.models.partner import Partner
 from juniorguru.models.subscription import (
     SubscriptionActivity,
     SubscriptionActivityType,
+    SubscriptionSnapshot,
     SubscriptionType,
 )
 
@@ -33,6 +33,10 @@ ACTIVITY_TYPES_MAPPING = {
 
 SUBSCRIPTIONS_GQL_PATH = Path(__file__).parent / "subscriptions.gql"
 
+MEMBERFUL_WORKERS = 4
+
+MEMBERFUL_REQUESTS_PER_SEC = 2
+
 SUBSCRIPTION_TYPES_MAPPING = {
     "thankyou": SubscriptionType.FREE,
     "thankyouforever": SubscriptionType.FREE,
@@ -50,7 +54,7 @@ logger = loggers.from_path(__file__)
 
 
 @cli.sync_command(dependencies=["partners", "feminine-names"])
-@cli.pass_cache
+@cli.pass_persistent_cache
 @click.option("--from-date", default="2021-01-01", type=date.fromisoformat)
 @click.option("--clear-cache/--keep-cache", default=False)
 @click.option(
@@ -59,10 +63,24 @@ logger = loggers.from_path(__file__)
     type=click.Path(exists=True, path_type=Path),
 )
 @click.option("--clear-history/--keep-history", default=False)
+@click.option("--workers", default=MEMBERFUL_WORKERS, type=int)
+@click.option("--requests-per-sec", default=MEMBERFUL_REQUESTS_PER_SEC, type=float)
 @db.connection_context()
-def main(cache, from_date, clear_cache, history_path, clear_history):
+def main(
+    persistent_cache,
+    from_date,
+    clear_cache,
+    history_path,
+    clear_history,
+    workers,
+    requests_per_sec,
+):
     logger.info("Preparing")
-    memberful = MemberfulAPI(cache=cache, clear_cache=clear_cache)
+    memberful = MemberfulAPI(
+        cache=persistent_cache,
+        clear_cache=clear_cache,
+        requests_per_sec=requests_per_sec,
+    )
 
     SubscriptionActivity.drop_table()
     SubscriptionActivity.create_table()
@@ -89,9 +107,8 @@ def main(cache, from_date, clear_cache, history_path, clear_history):
     if clear_history:
         history_path.write_text("")
     else:
-        with history_path.open() as f:
-            for line in f:
-                SubscriptionActivity.deserialize(line)
+        with history_path.open() as f, db.atomic():
+            SubscriptionActivity.deserialize_many(f)
     from_date = SubscriptionActivity.history_end_on() or from_date
 
     logger.info(f"Fetching activities from Memberful API, since {from_date}")
@@ -99,29 +116,20 @@ def main(cache, from_date, clear_cache, history_path, clear_history):
     # since the beginning of time. That's very slow and won't finish, because Memberful API
     # will ban the IP address until the next day. It can be done with cache and different
     # IP addresses (like starting over tethering using LTE of my phone, and re-starting over WiFi).
-    queries = (
-        memberful.get_nodes(
+    # Interrupted crawls resume from a checkpoint kept in the persistent cache for a week.
+    queries = [
+        (
             ACTIVITIES_GQL_PATH.read_text(),
             dict(type=type, createdAt=dict(gte=get_timestamp(from_date))),
         )
         for type in ACTIVITY_TYPES_MAPPING
-    )
-    for activity in logger.progress(itertools.chain.from_iterable(queries)):
-        try:
-            account_id = int(activity["member"]["id"])
-        except (KeyError, TypeError):
-            logger.debug("Activity with no account ID, skipping")
-        else:
-            happened_at = datetime.utcfromtimestamp(activity["createdAt"])
-            SubscriptionActivity.add(
-                account_id=account_id,
-                account_has_feminine_name=has_feminine_name(
-                    activity["member"]["fullName"]
-                ),
-                happened_on=happened_at.date(),
-                happened_at=happened_at,
-                type=ACTIVITY_TYPES_MAPPING[activity["type"]],
-            )
+    ]
+    # Fetching everything before writing keeps the database transaction short,
+    # so that other sync commands running in parallel don't wait for the crawl
+    nodes = memberful.get_nodes_concurrently(queries, workers=workers)
+    activities = list(activities_from_nodes(logger.progress(nodes), has_feminine_name))
+    with db.atomic():
+        SubscriptionActivity.add_many(activities)
     logger.info(f"Finished with {SubscriptionActivity.total_count()} activities")
 
     logger.info("Fetching subscriptions from Memberful API")
@@ -130,12 +138,18 @@ def main(cache, from_date, clear_cache, history_path, clear_history):
     # we do it is to have a backup (and a git commits to inspect) in case there is something
     # messing with the data again.
     subscriptions = memberful.get_nodes(SUBSCRIPTIONS_GQL_PATH.read_text())
-    for subscription in logger.progress(subscriptions):
-        for activity in activities_from_subscription(subscription):
-            activity["account_has_feminine_name"] = has_feminine_name(
+    activities = [
+        dict(
+            account_has_feminine_name=has_feminine_name(
                 subscription["member"]["fullName"]
-            )
-            SubscriptionActivity.add(**activity)
+            ),
+            **activity,
+        )
+        for subscription in logger.progress(subscriptions)
+        for activity in activities_from_subscription(subscription)
+    ]
+    with db.atomic():
+        SubscriptionActivity.add_many(activities)
     logger.info(f"Finished with {SubscriptionActivity.total_count()} activities")
 
     logger.info("Saving history to a file")
@@ -147,18 +161,37 @@ def main(cache, from_date, clear_cache, history_path, clear_history):
     # History only stores coupon slug, so this is done as part of post-processing.
     # It's better than to store the subscription type in the history, because
     # this way over time we can change how the subscription types are classified.
-    for activity in SubscriptionActivity.select():
-        try:
-            activity.subscription_type = subscripton_types_mapping[
-                activity.order_coupon_slug
-            ]
-        except KeyError:
-            activity.subscription_type = SubscriptionType.INDIVIDUAL
-        activity.save()
+    SubscriptionActivity.classify_subscription_types(subscripton_types_mapping)
 
     logger.info("Cleansing data")
     SubscriptionActivity.cleanse_data()
 
+    logger.info("Taking monthly snapshots")
+    SubscriptionSnapshot.drop_table()
+    SubscriptionSnapshot.create_table()
+    with db.atomic():
+        count = SubscriptionSnapshot.create_snapshots(date.today())
+    logger.info(f"Finished with {count} snapshots")
+
+
+def activities_from_nodes(
+    nodes: Iterable[dict], has_feminine_name: Callable[[str], bool]
+) -> Generator[dict, None, None]:
+    for node in nodes:
+        try:
+            account_id = int(node["member"]["id"])
+        except (KeyError, TypeError):
+            logger.debug("Activity with no account ID, skipping")
+        else:
+            happened_at = datetime.utcfromtimestamp(node["createdAt"])
+            yield dict(
+                account_id=account_id,
+                account_has_feminine_name=has_feminine_name(node["member"]["fullName"]),
+                happened_on=happened_at.date(),
+                happened_at=happened_at,
+                type=ACTIVITY_TYPES_MAPPING[node["type"]],
+            )
+
 
 def activities_from_subscription(subscription: dict) -> Generator[dict, None, None]:
     account_id = int(subscription["member"]["id"])
@@ -1,11 +1,10 @@
-from multiprocessing import Pool
 from pathlib import Path
 
 import click
 
 from juniorguru.cli.sync import main as cli
 from juniorguru.lib import loggers
-from juniorguru.lib.images import render_image_file
+from juniorguru.lib.images import PostersCache, render_image_files
 from juniorguru.models.base import db
 from juniorguru.models.job import ListedJob
 from juniorguru.models.page import LegacyThumbnail, Page
@@ -34,148 +33,127 @@ def main(images_path, output_dir, width, height, clear):
     output_path = images_path / output_dir
     output_path.mkdir(exist_ok=True)
 
-    if clear:
-        existing_paths = list(output_path.glob("*.png"))
-        logger.info(f"Removing {len(existing_paths)} existing thumbnails")
-        for existing_path in existing_paths:
-            existing_path.unlink()
-
-    with Pool(WORKERS) as pool:
-        pages = list(Page.listing())
-        logger.info(f"Generating {len(pages)} thumbnails")
-        args = []
-        for i, page in enumerate(pages):
-            context = dict(
-                title=page.meta.get("thumbnail_title", page.meta["title"]),
-                badge=page.meta.get("thumbnail_badge"),
-                image_path=page.meta.get("thumbnail_image_path"),
-            )
-            args.append((i, width, height, "thumbnail.jinja", context, output_path))
-        for i, image_path in pool.imap_unordered(process_thumbnail, args):
-            page = pages[i]
-            page.thumbnail_path = image_path.relative_to(images_path)
-            page.save()
-            logger.info(f"Page {page.src_uri}: {image_path}")
-
-        logger.info(
-            "Dealing with legacy pages"
-        )  # all below can be deleted once Flask is gone
-        LegacyThumbnail.drop_table()
-        LegacyThumbnail.create_table()
-
-        equivalents = {
-            "/": "index.jinja",
-            "/club/": "club.md",
-            "/events/": "events.md",
-            "/courses/": "courses.md",
-            "/open/": "open.md",
-            "/podcast/": "podcast.md",
-            "/handbook/": "handbook/index.md",
-            "/handbook/candidate/": "handbook/candidate.md",
-            "/hire-juniors/": "pricing.md",
-            "/pricing/": "pricing.md",
-            "/news/": "news.jinja",
-        }
-        for url, src_uri in equivalents.items():
-            page = Page.get(Page.src_uri == src_uri)
-            LegacyThumbnail.create(url=url, image_path=page.thumbnail_path)
-
-        default_image_path = render_image_file(
-            width, height, "thumbnail_legacy.jinja", {}, output_path
+    thumbnails = PostersCache(output_path)
+    thumbnails.init(clear=clear)
+
+    pages = list(Page.listing())
+    pages_args = []
+    for page in pages:
+        context = dict(
+            title=page.meta.get("thumbnail_title", page.meta["title"]),
+            badge=page.meta.get("thumbnail_badge"),
+            image_path=page.meta.get("thumbnail_image_path"),
+        )
+        pages_args.append((width, height, "thumbnail.jinja", context, output_path))
+
+    # all below can be deleted once Flask is gone
+    default_urls = [
+        "/404.html",
+        "/donate/",
+        "/press/",
+        "/press/crisis/",
+        "/press/handbook/",
+        "/press/women/",
+    ]
+    legacy_urls = []
+    legacy_args = [(width, height, "thumbnail_legacy.jinja", {}, output_path)]
+    for url, title in [
+        ("/membership/", "Rozcestník pro členy klubu"),
+        ("/jobs/", "Práce v IT pro začátečníky"),
+        ("/jobs/remote/", "Práce v IT pro začátečníky — na dálku"),
+        ("/jobs/region/praha/", "Práce v IT pro začátečníky — Praha"),
+        ("/jobs/region/brno/", "Práce v IT pro začátečníky — Brno"),
+        ("/jobs/region/ostrava/", "Práce v IT pro začátečníky — Ostrava"),
+        (
+            "/jobs/region/ceske-budejovice/",
+            "Práce v IT pro začátečníky — České Budějovice",
+        ),
+        (
+            "/jobs/region/hradec-kralove/",
+            "Práce v IT pro začátečníky — Hradec Králové",
+        ),
+        ("/jobs/region/jihlava/", "Práce v IT pro začátečníky — Jihlava"),
+        (
+            "/jobs/region/karlovy-vary/",
+            "Práce v IT pro začátečníky — Karlovy Vary",
+        ),
+        ("/jobs/region/liberec/", "Práce v IT pro začátečníky — Liberec"),
+        ("/jobs/region/olomouc/", "Práce v IT pro začátečníky — Olomouc"),
+        ("/jobs/region/pardubice/", "Práce v IT pro začátečníky — Pardubice"),
+        ("/jobs/region/plzen/", "Práce v IT pro začátečníky — Plzeň"),
+        (
+            "/jobs/region/usti-nad-labem/",
+            "Práce v IT pro začátečníky — Ústí nad Labem",
+        ),
+        ("/jobs/region/zlin/", "Práce v IT pro začátečníky — Zlín"),
+        ("/jobs/region/germany/", "Práce v IT pro začátečníky — Německo"),
+        ("/jobs/region/poland/", "Práce v IT pro začátečníky — Polsko"),
+        ("/jobs/region/austria/", "Práce v IT pro začátečníky — Rakousko"),
+        ("/jobs/region/slovakia/", "Práce v IT pro začátečníky — Slovensko"),
+    ]:
+        legacy_urls.append(url)
+        legacy_args.append(
+            (width, height, "thumbnail_legacy.jinja", dict(title=title), output_path)
+        )
+    for _, params in generate_job_pages():
+        job = ListedJob.get_by_submitted_id(params["job_id"])
+        context = dict(
+            job_title=job.title,
+            job_company=job.company_name,
+            job_location=job.location,
+        )
+        legacy_urls.append(f"/jobs/{params['job_id']}/")
+        legacy_args.append(
+            (width, height, "thumbnail_legacy.jinja", context, output_path)
         )
-        for url in [
-            "/404.html",
-            "/donate/",
-            "/press/",
-            "/press/crisis/",
-            "/press/handbook/",
-            "/press/women/",
-        ]:
-            LegacyThumbnail.create(
-                url=url, image_path=default_image_path.relative_to(images_path)
-            )
-
-        args = [
-            (
-                url,
-                width,
-                height,
-                "thumbnail_legacy.jinja",
-                dict(title=title),
-                output_path,
-            )
-            for url, title in [
-                ("/membership/", "Rozcestník pro členy klubu"),
-                ("/jobs/", "Práce v IT pro začátečníky"),
-                ("/jobs/remote/", "Práce v IT pro začátečníky — na dálku"),
-                ("/jobs/region/praha/", "Práce v IT pro začátečníky — Praha"),
-                ("/jobs/region/brno/", "Práce v IT pro začátečníky — Brno"),
-                ("/jobs/region/ostrava/", "Práce v IT pro začátečníky — Ostrava"),
-                (
-                    "/jobs/region/ceske-budejovice/",
-                    "Práce v IT pro začátečníky — České Budějovice",
-                ),
-                (
-                    "/jobs/region/hradec-kralove/",
-                    "Práce v IT pro začátečníky — Hradec Králové",
-                ),
-                ("/jobs/region/jihlava/", "Práce v IT pro začátečníky — Jihlava"),
-                (
-                    "/jobs/region/karlovy-vary/",
-                    "Práce v IT pro začátečníky — Karlovy Vary",
-                ),
-                ("/jobs/region/liberec/", "Práce v IT pro začátečníky — Liberec"),
-                ("/jobs/region/olomouc/", "Práce v IT pro začátečníky — Olomouc"),
-                ("/jobs/region/pardubice/", "Práce v IT pro začátečníky — Pardubice"),
-                ("/jobs/region/plzen/", "Práce v IT pro začátečníky — Plzeň"),
-                (
-                    "/jobs/region/usti-nad-labem/",
-                    "Práce v IT pro začátečníky — Ústí nad Labem",
-                ),
-                ("/jobs/region/zlin/", "Práce v IT pro začátečníky — Zlín"),
-                ("/jobs/region/germany/", "Práce v IT pro začátečníky — Německo"),
-                ("/jobs/region/poland/", "Práce v IT pro začátečníky — Polsko"),
-                ("/jobs/region/austria/", "Práce v IT pro začátečníky — Rakousko"),
-                ("/jobs/region/slovakia/", "Práce v IT pro začátečníky — Slovensko"),
-            ]
-        ]
-        for url, image_path in pool.imap_unordered(process_thumbnail, args):
-            LegacyThumbnail.create(
-                url=url, image_path=image_path.relative_to(images_path)
-            )
-
-        args = []
-        for _, params in generate_job_pages():
-            job = ListedJob.get_by_submitted_id(params["job_id"])
-            context = dict(
-                job_title=job.title,
-                job_company=job.company_name,
-                job_location=job.location,
-            )
-            args.append(
-                (
-                    f"/jobs/{params['job_id']}/",
-                    width,
-                    height,
-                    "thumbnail_legacy.jinja",
-                    context,
-                    output_path,
-                )
-            )
-        for url, image_path in pool.imap_unordered(process_thumbnail, args):
-            LegacyThumbnail.create(
-                url=url, image_path=image_path.relative_to(images_path)
-            )
-
-        expected_urls = frozenset(get_freezer(app).all_urls())
-        urls = frozenset(thumbnail.url for thumbnail in LegacyThumbnail.select())
-        missing_urls = expected_urls - urls
-        if missing_urls:
-            logger.error(f'Missing legacy pages: {", ".join(sorted(missing_urls))}')
-            raise click.Abort()
-
-
-def process_thumbnail(args):
-    id, args = args[0], args[1:]
-    image_path = render_image_file(*args)
-    return id, image_path
+
+    # Rendering all thumbnails in a single batch, so that each worker
+    # launches the browser just once
+    logger.info(f"Generating {len(pages)} thumbnails and legacy thumbnails")
+    image_paths = render_image_files(pages_args + legacy_args, workers=WORKERS)
+    for image_path in image_paths:
+        thumbnails.record(image_path)
+    pages_image_paths = image_paths[: len(pages_args)]
+    default_image_path, *legacy_image_paths = image_paths[len(pages_args) :]
+
+    for page, image_path in zip(pages, pages_image_paths):
+        page.thumbnail_path = image_path.relative_to(images_path)
+        page.save()
+        logger.info(f"Page {page.src_uri}: {image_path}")
+
+    logger.info("Dealing with legacy pages")
+    LegacyThumbnail.drop_table()
+    LegacyThumbnail.create_table()
+
+    equivalents = {
+        "/": "index.jinja",
+        "/club/": "club.md",
+        "/events/": "events.md",
+        "/courses/": "courses.md",
+        "/open/": "open.md",
+        "/podcast/": "podcast.md",
+        "/handbook/": "handbook/index.md",
+        "/handbook/candidate/": "handbook/candidate.md",
+        "/hire-juniors/": "pricing.md",
+        "/pricing/": "pricing.md",
+        "/news/": "news.jinja",
+    }
+    for url, src_uri in equivalents.items():
+        page = Page.get(Page.src_uri == src_uri)
+        LegacyThumbnail.create(url=url, image_path=page.thumbnail_path)
+
+    for url in default_urls:
+        LegacyThumbnail.create(
+            url=url, image_path=default_image_path.relative_to(images_path)
+        )
+    for url, image_path in zip(legacy_urls, legacy_image_paths):
+        LegacyThumbnail.create(url=url, image_path=image_path.relative_to(images_path))
+
+    thumbnails.cleanup()
+
+    expected_urls = frozenset(get_freezer(app).all_urls())
+    urls = frozenset(thumbnail.url for thumbnail in LegacyThumbnail.select())
+    missing_urls = expected_urls - urls
+    if missing_urls:
+        logger.error(f'Missing legacy pages: {", ".join(sorted(missing_urls))}')
+        raise click.Abort()
@@ -4,10 +4,12 @@ from operator import attrgetter
 from urllib.parse import urljoin
 
 import arrow
+from peewee import Query
 
 from juniorguru.lib import loggers
 from juniorguru.lib.benefits_evaluators import BENEFITS_EVALUATORS
 from juniorguru.lib.discord_club import CLUB_GUILD
+from juniorguru.lib.mkdocs_jinja import LazyValue
 from juniorguru.models.base import db
 from juniorguru.models.blog import BlogArticle
 from juniorguru.models.chart import Chart
@@ -29,37 +31,64 @@ from juniorguru.models.wisdom import Wisdom
 CLOUDINARY_HOST = os.getenv("CLOUDINARY_HOST", "res.cloudinary.com")
 
 
+META_MODELS = (
+    ("topic_name", Topic.name, "topic"),
+    ("event_id", Event.id, "event"),
+    ("partner_slug", Partner.slug, "partner"),
+    ("course_provider_slug", CourseProvider.slug, "course_provider"),
+    ("podcast_episode_number", PodcastEpisode.number, "podcast_episode"),
+)
+
+
 logger = loggers.from_path(__file__)
 
 
+def lazy(fn, *args, **kwargs) -> LazyValue:
+    # Queries get materialized, so that templates iterating over them
+    # don't hit the database again and again
+    @db.connection_context()
+    def evaluate():
+        value = fn(*args, **kwargs)
+        if isinstance(value, Query):
+            return list(value)
+        return value
+
+    return LazyValue(evaluate)
+
+
 ####################################################################
 # SHARED DOCS AND THEME CONTEXT                                    #
 ####################################################################
 
 
-@db.connection_context()
 def on_shared_context(context):
     now = arrow.utcnow()
     today = now.date()
-    context["now"] = now
-    context["today"] = today
+
+    # lazy only so that incremental builds know which pages depend on them
+    context["now"] = LazyValue(lambda: now)
+    context["today"] = LazyValue(lambda: today)
 
     # main.html
-    context["revenue_ttm_breakdown"] = Transaction.revenue_ttm_breakdown(today)
+    context["revenue_ttm_breakdown"] = lazy(Transaction.revenue_ttm_breakdown, today)
 
     # main.html, open.md
-    profit_ttm = Transaction.profit_ttm(today)
+    profit_ttm = lazy(Transaction.profit_ttm, today)
     context["profit_ttm"] = profit_ttm
 
     # open.md
-    context["profit_ttm_usd"] = ExchangeRate.in_currency(profit_ttm, "USD")
-    context["profit_ttm_eur"] = ExchangeRate.in_currency(profit_ttm, "EUR")
+    context["profit_ttm_usd"] = lazy(
+        lambda: ExchangeRate.in_currency(profit_ttm.get(), "USD")
+    )
+    context["profit_ttm_eur"] = lazy(
+        lambda: ExchangeRate.in_currency(profit_ttm.get(), "EUR")
+    )
 
     # club.md, courses/*.md, main_stories.html
-    context["members"] = ClubUser.avatars_listing()
+    context["members"] = lazy(ClubUser.avatars_listing)
 
     # club.md, open.md, main_stories.html
-    context["members_total_count"] = ClubUser.members_count()
+    context["members_total_count"] = lazy(ClubUser.members_count)
 
 
 def on_shared_page_context(context, page, config, files):
@@ -71,84 +100,100 @@ def on_shared_page_context(context, page, config, files):
 ####################################################################
 
 
-@db.connection_context()
 def on_docs_context(context):
+    partners_active = lazy(Partner.active_listing)
+
     # club.md
-    context["messages_count"] = ClubMessage.count()
-    context["partners_having_students"] = [
-        partner for partner in Partner.active_listing() if partner.has_students
-    ]
-    context["events"] = Event.listing()
-    context["events_promo"] = Event.promo_listing()
+    context["messages_count"] = lazy(ClubMessage.count)
+    context["partners_having_students"] = lazy(
+        lambda: [partner for partner in partners_active.get() if partner.has_students]
+    )
+    context["events"] = lazy(Event.listing)
+    context["events_promo"] = lazy(Event.promo_listing)
 
     # club.md, open.md
-    context["partnerships"] = Partnership.active_listing()
+    context["partnerships"] = lazy(Partnership.active_listing)
 
     # courses.md
-    context["course_providers"] = CourseProvider.listing()
+    context["course_providers"] = lazy(CourseProvider.listing)
 
     # faq.md
-    context["partners_course_providers"] = [
-        partner for partner in Partner.active_listing() if partner.course_provider
-    ]
+    context["partners_course_providers"] = lazy(
+        lambda: [
+            partner for partner in partners_active.get() if partner.course_provider
+        ]
+    )
 
     # handbook/motivation.md
-    context["stories_by_tags"] = Story.tags_mapping()
+    context["stories_by_tags"] = lazy(Story.tags_mapping)
 
     # handbook/candidate.md
-    context["jobs"] = ListedJob.listing()
-    context["jobs_remote"] = ListedJob.remote_listing()
-    context["jobs_internship"] = ListedJob.internship_listing()
-    context["jobs_volunteering"] = ListedJob.volunteering_listing()
+    context["jobs"] = lazy(ListedJob.listing)
+    context["jobs_remote"] = lazy(ListedJob.remote_listing)
+    context["jobs_internship"] = lazy(ListedJob.internship_listing)
+    context["jobs_volunteering"] = lazy(ListedJob.volunteering_listing)
 
     # open.md
-    context["blog"] = BlogArticle.listing()
-    context["partners_expired"] = Partner.expired_listing()
-    context["handbook_total_size"] = Page.handbook_total_size()
-    context["charts"] = Chart.as_dict()
+    context["blog"] = lazy(BlogArticle.listing)
+    context["partners_expired"] = lazy(Partner.expired_listing)
+    context["handbook_total_size"] = lazy(Page.handbook_total_size)
+    context["charts"] = lazy(Chart.as_dict)
 
     # open/*
     context["benefits_evaluators"] = BENEFITS_EVALUATORS
 
     # index.jinja, podcast.md, handbook/cv.md, news.jinja
-    context["podcast_episodes"] = PodcastEpisode.listing()
+    context["podcast_episodes"] = lazy(PodcastEpisode.listing)
 
     # index.jinja, events.md, news.jinja
-    context["events_planned"] = Event.planned_listing()
-    context["events_archive"] = Event.archive_listing()
+    context["events_planned"] = lazy(Event.planned_listing)
+    context["events_archive"] = lazy(Event.archive_listing)
 
     # index.jinja, stories.md, news.jinja
-    stories_links = list(Story.listing())
-    stories_pages = list(Page.stories_listing())
+    stories_links = lazy(Story.listing)
+    stories_pages = lazy(Page.stories_listing)
     context["stories_links"] = stories_links
     context["stories_pages"] = stories_pages
-    context["stories"] = sorted(
-        stories_links + stories_pages, key=attrgetter("date"), reverse=True
+    context["stories"] = lazy(
+        lambda: sorted(
+            stories_links.get() + stories_pages.get(),
+            key=attrgetter("date"),
+            reverse=True,
+        )
     )
 
     # wisdom.jinja, news.jinja
-    context["wisdoms"] = Wisdom.listing()
+    context["wisdoms"] = lazy(Wisdom.listing)
 
     # news.jinja
-    context["newsletter_subscribers_count"] = Followers.get_latest("newsletter").count
+    context["newsletter_subscribers_count"] = lazy(
+        lambda: Followers.get_latest("newsletter").count
+    )
     context["club_guild_id"] = CLUB_GUILD
-    context["channels_digest"] = ClubMessage.digest_channels(
-        date.today() - timedelta(days=7), limit=5
+    context["channels_digest"] = lazy(
+        ClubMessage.digest_channels, date.today() - timedelta(days=7), limit=5
     )
 
+    # on_docs_page_context()
+    context["meta_models"] = {
+        meta_key: lazy(get_models_mapping, field) for meta_key, field, _ in META_MODELS
+    }
+
 
-@db.connection_context()
 def on_docs_page_context(context, page, config, files):
-    meta_model_getters = (
-        ("topic_name", Topic.get_by_id, "topic"),
-        ("event_id", Event.get_by_id, "event"),
-        ("partner_slug", Partner.get_by_slug, "partner"),
-        ("course_provider_slug", CourseProvider.get_by_slug, "course_provider"),
-        ("podcast_episode_number", PodcastEpisode.get_by_number, "podcast_episode"),
-    )
-    for meta_key, model_getter, model_var in meta_model_getters:
+    for meta_key, field, model_var in META_MODELS:
         if meta_key in page.meta:
-            context[model_var] = model_getter(page.meta[meta_key])
+            value = field.adapt(page.meta[meta_key])
+            try:
+                context[model_var] = context["meta_models"][meta_key].get()[value]
+            except KeyError:
+                raise field.model.DoesNotExist(
+                    f"{field.model.__name__} with {field.name}={value!r} does not exist"
+                )
+
+
+def get_models_mapping(field):
+    return {getattr(obj, field.name): obj for obj in field.model.select()}
 
 
 ####################################################################
@@ -156,19 +201,22 @@ def on_docs_page_context(context, page, config, files):
 ####################################################################
 
 
-@db.connection_context()
 def on_theme_context(context):
     context["cloudinary_host"] = CLOUDINARY_HOST
-    context["partnerships_handbook"] = Partnership.handbook_listing()
-    context["course_providers"] = CourseProvider.listing()
+    context["partnerships_handbook"] = lazy(Partnership.handbook_listing)
+    context["course_providers"] = lazy(CourseProvider.listing)
+
+    # on_theme_page_context()
+    context["thumbnail_paths"] = lazy(
+        lambda: dict(Page.select(Page.src_uri, Page.thumbnail_path).tuples())
+    )
 
 
-@db.connection_context()
 def on_theme_page_context(context, page, config, files):
     try:
-        thumbnail_path = Page.get_by_src_uri(page.file.src_uri).thumbnail_path
+        thumbnail_path = context["thumbnail_paths"].get()[page.file.src_uri]
         context["thumbnail_url"] = urljoin(
             config["site_url"], f"static/{thumbnail_path}"
         )
-    except Page.DoesNotExist:
+    except KeyError:
         logger.warning(f"No thumbnail for {page.file.src_uri}")
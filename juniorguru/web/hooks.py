@@ -2,21 +2,96 @@ from pathlib import Path
 
 from mkdocs.utils import get_relative_url
 
-from juniorguru.lib import mkdocs_jinja
+from juniorguru.lib import loggers, mkdocs_incremental, mkdocs_jinja, template_filters
+from juniorguru.models.base import db
 from juniorguru.web import api, context as context_hooks
 
 
+logger = loggers.from_path(__file__)
+
+
 mkdocs_jinja.monkey_patch()
 
 
+def on_config(config):
+    # Flask owns the sitemap, and with dirty builds MkDocs would write its own
+    # directly to the output directory
+    config["theme"].static_templates.discard("sitemap.xml")
+    # Parallel builds render the static templates only in the first shard
+    if not is_in_shard(0, config.get("shard")):
+        config["theme"].static_templates.clear()
+    return config
+
+
 def on_pre_build(config):
-    config["theme"].dirs.append(mkdocs_jinja.get_macros_dir(config))
-    config["shared_context"] = {}
-    context_hooks.on_shared_context(config["shared_context"])
-    config["docs_context"] = {}
-    context_hooks.on_docs_context(config["docs_context"])
-    config["theme_context"] = {}
-    context_hooks.on_theme_context(config["theme_context"])
+    config["timings"] = timings = mkdocs_jinja.BuildTimings()
+    with timings.measure("context"):
+        config["theme"].dirs.append(mkdocs_jinja.get_macros_dir(config))
+        config["shared_context"] = {}
+        context_hooks.on_shared_context(config["shared_context"])
+        config["docs_context"] = {}
+        context_hooks.on_docs_context(config["docs_context"])
+        config["theme_context"] = {}
+        context_hooks.on_theme_context(config["theme_context"])
+
+
+def on_files(files, config):
+    config["docs_env"] = mkdocs_jinja.get_env(config, files, timings=config["timings"])
+
+    # Only matters for dirty builds, which skip pages where is_modified() is false
+    with config["timings"].measure("incremental"):
+        config["manifest"] = manifest = mkdocs_incremental.BuildManifest()
+        config["build_fingerprint"] = mkdocs_incremental.get_build_fingerprint(
+            get_build_paths(config), files
+        )
+        lazy_values = get_lazy_values(config)
+        config["database_tables"] = tables = mkdocs_incremental.DatabaseTables(db)
+        config["documentation_pages"] = files.documentation_pages()
+        config["modified_pages"] = modified_pages = set()
+        for index, file in enumerate(config["documentation_pages"]):
+            is_modified = is_in_shard(index, config.get("shard")) and (
+                manifest.is_modified(
+                    file, config["build_fingerprint"], lazy_values, tables
+                )
+            )
+            if is_modified:
+                modified_pages.add(file.src_uri)
+            file.is_modified = lambda is_modified=is_modified: is_modified
+
+        # Static files are copied only by the first of the parallel builds
+        if not is_in_shard(0, config.get("shard")):
+            for file in files:
+                if not file.is_documentation_page():
+                    file.is_modified = lambda: False
+        logger.info(
+            f"Pages modified since the last build: {len(modified_pages)}"
+            f" of {len(config['documentation_pages'])}"
+        )
+
+        # Records tables read by the pages from now on, until on_post_build()
+        tables.install()
+
+
+def on_nav(nav, config, files):
+    # Dirty builds don't read unmodified pages at all, but their titles
+    # and meta are needed for the navigation on the modified ones, and
+    # if any of them changed, all pages need to be rendered again
+    with config["timings"].measure("incremental"):
+        pages = [file.page for file in files.documentation_pages()]
+        for page in pages:
+            page.read_source(config)
+        config["nav_fingerprint"] = mkdocs_incremental.get_nav_fingerprint(pages)
+        if config["manifest"].is_nav_modified(config["nav_fingerprint"]):
+            modified_pages = config["modified_pages"]
+            for index, file in enumerate(config["documentation_pages"]):
+                if is_in_shard(index, config.get("shard")):
+                    modified_pages.add(file.src_uri)
+                    file.is_modified = lambda: True
+            logger.info(
+                "Titles or meta of pages changed, pages modified:"
+                f" {len(modified_pages)} of {len(config['documentation_pages'])}"
+            )
+    return nav
 
 
 def on_page_markdown(markdown, page, config, files) -> str:
@@ -24,19 +99,21 @@ def on_page_markdown(markdown, page, config, files) -> str:
 
     Inspired by https://github.com/fralau/mkdocs_macros_plugin
     """
-    env = mkdocs_jinja.get_env(page, config, files)
-    context = dict(
-        page=page,
-        config=config,
-        pages=files,
-        base_url=get_relative_url(".", page.url),
-        **config["shared_context"],
-        **config["docs_context"],
-    )
-    context_hooks.on_shared_page_context(context, page, config, files)
-    context_hooks.on_docs_page_context(context, page, config, files)
-    template = env.from_string(markdown)
-    return template.render(**context)
+    timings = config["timings"]
+    with timings.measure("page_context", page=page), mkdocs_jinja.rendering_page(page):
+        context = dict(
+            page=page,
+            config=config,
+            pages=files,
+            base_url=get_relative_url(".", page.url),
+            **config["shared_context"],
+            **config["docs_context"],
+        )
+        context_hooks.on_shared_page_context(context, page, config, files)
+        context_hooks.on_docs_page_context(context, page, config, files)
+    with timings.measure("jinja", page=page), mkdocs_jinja.rendering_page(page):
+        template = config["docs_env"].from_string(markdown)
+        return template.render(**context)
 
 
 def on_env(env, config, files):
@@ -49,20 +126,95 @@ def on_env(env, config, files):
 
     filters["md"] = md
     env.filters.update(filters)
+    env.context_class = mkdocs_jinja.LazyContext
 
 
 def on_page_context(context, page, config, nav):
-    context.update(config["shared_context"])
-    context.update(config["theme_context"])
-    context_hooks.on_shared_page_context(context, page, config, context["pages"])
-    context_hooks.on_theme_page_context(context, page, config, context["pages"])
+    # MkDocs renders the theme template right after this hook, so this
+    # attributes lazy context values used by the theme to the page,
+    # until on_post_page() resets it
+    config["current_page_token"] = mkdocs_jinja.current_page.set(page)
+    with config["timings"].measure("page_context", page=page):
+        context.update(config["shared_context"])
+        context.update(config["theme_context"])
+        context_hooks.on_shared_page_context(context, page, config, context["pages"])
+        context_hooks.on_theme_page_context(context, page, config, context["pages"])
+
+
+def on_post_page(output, page, config):
+    mkdocs_jinja.current_page.reset(config.pop("current_page_token"))
+    return output
 
 
 def on_post_build(config):
-    api_dir = Path(config["site_dir"]) / "api"
-    api_dir.mkdir(parents=True, exist_ok=True)
+    timings = config["timings"]
+    if is_in_shard(0, config.get("shard")):
+        with timings.measure("api"):
+            api_dir = Path(config["site_dir"]) / "api"
+            api_dir.mkdir(parents=True, exist_ok=True)
+
+            api.build_events_ics(api_dir, config)
+            api.build_events_honza_ics(api_dir, config)
+            api.build_podcast_xml(api_dir, config)
+            api.build_czechitas_csv(api_dir, config)
+
+    with timings.measure("incremental"):
+        tables = config["database_tables"]
+        tables.uninstall()
+        manifest = config["manifest"]
+        manifest.update(
+            config["documentation_pages"],
+            config["build_fingerprint"],
+            config["nav_fingerprint"],
+            get_lazy_values(config),
+            tables,
+            config["modified_pages"],
+        )
+        # Parallel builds merge the manifests of all shards and save it at once
+        if not config.get("shard"):
+            manifest.save()
+
+    logger.info("Timings (the slowest pages at the end):")
+    for line in timings.report():
+        logger.info(line)
+    for context_name in ["shared_context", "docs_context", "theme_context"]:
+        logger.info(f"Lazy values in {context_name}:")
+        for line in mkdocs_jinja.report_lazy_values(config[context_name]):
+            logger.info(line)
+
+
+def on_build_error(error):
+    # Stops recording the tables read by pages, see on_files()
+    mkdocs_incremental.DatabaseTables(db).uninstall()
+
+
+def get_build_paths(config) -> list[Path]:
+    paths = [Path(config.config_file_path)]
+    paths.extend(Path(__file__).parent.glob("*.py"))
+    paths.extend(
+        Path(module.__file__)
+        for module in [template_filters, mkdocs_jinja, mkdocs_incremental]
+    )
+    for theme_dir in config["theme"].dirs:
+        paths.extend(path for path in Path(theme_dir).glob("**/*") if path.is_file())
+    return paths
+
+
+def get_lazy_values(config) -> dict:
+    lazy_values = {}
+    for context_name in ["shared_context", "docs_context", "theme_context"]:
+        lazy_values.update(
+            mkdocs_incremental.collect_lazy_values(
+                config[context_name], prefix=f"{context_name}."
+            )
+        )
+    return lazy_values
+
 
-    api.build_events_ics(api_dir, config)
-    api.build_events_honza_ics(api_dir, config)
-    api.build_podcast_xml(api_dir, config)
-    api.build_czechitas_csv(api_dir, config)
+def is_in_shard(index: int, shard: tuple[int, int] | None) -> bool:
+    # Parallel builds set the shard as (shard_index, shards_count),
+    # see juniorguru.cli.web.build_mkdocs_parallel()
+    if not shard:
+        return True
+    shard_index, shards_count = shard
+    return index % shards_count == shard_index
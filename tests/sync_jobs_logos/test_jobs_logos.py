@@ -3,10 +3,14 @@ from pathlib import Path
 import pytest
 from PIL import Image
 
+from juniorguru.sync import jobs_logos
 from juniorguru.sync.jobs_logos import (
     SIZE_PX,
     choose_user_agent,
     convert_image,
+    download_image,
+    get_conditional_headers,
+    get_icons_cache_key,
     sort_key,
     unique,
 )
@@ -192,3 +196,79 @@ def test_unique_skips_none():
 )
 def test_choose_user_agent(url, expected):
     assert choose_user_agent(url) == expected
+
+
+class FakeResponse:
+    def __init__(self, status_code, content=b"", headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        pass
+
+
+class FakeSession:
+    def __init__(self, response):
+        self.response = response
+        self.headers = None
+
+    def get(self, url, timeout, headers):
+        self.headers = headers
+        return self.response
+
+
+@pytest.fixture
+def logos_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs_logos, "LOGOS_DIR", tmp_path)
+    return tmp_path
+
+
+def test_get_icons_cache_key_uses_domain():
+    assert get_icons_cache_key("https://example.com/about") == get_icons_cache_key(
+        "https://example.com/"
+    )
+
+
+@pytest.mark.parametrize(
+    "cached_image, expected",
+    [
+        (dict(etag='"abc"'), {"If-None-Match": '"abc"'}),
+        (
+            dict(last_modified="Wed, 21 Oct 2015 07:28:00 GMT"),
+            {"If-Modified-Since": "Wed, 21 Oct 2015 07:28:00 GMT"},
+        ),
+        (dict(etag=None, last_modified=None), {}),
+    ],
+)
+def test_get_conditional_headers(cached_image, expected):
+    assert get_conditional_headers(cached_image) == expected
+
+
+def test_download_image(logos_dir, monkeypatch):
+    content = (FIXTURES_DIR / "logo.png").read_bytes()
+    session = FakeSession(FakeResponse(200, content, {"ETag": '"abc"'}))
+    monkeypatch.setattr(jobs_logos, "get_session", lambda: session)
+    image = download_image(("https://example.com/logo.png", None))
+
+    assert Path(image["image_path"]).parent == logos_dir
+    assert Path(image["image_path"]).read_bytes() == image["image_data"]
+    assert image["etag"] == '"abc"'
+    assert "If-None-Match" not in session.headers
+
+
+def test_download_image_not_modified(logos_dir, monkeypatch):
+    cached_image = dict(
+        image_url="https://example.com/logo.png",
+        image_path=str(logos_dir / "logo.png"),
+        orig_width=100,
+        orig_height=100,
+        etag='"abc"',
+        last_modified=None,
+    )
+    session = FakeSession(FakeResponse(304))
+    monkeypatch.setattr(jobs_logos, "get_session", lambda: session)
+    image = download_image(("https://example.com/logo.png", cached_image))
+
+    assert image == cached_image
+    assert session.headers["If-None-Match"] == '"abc"'
@@ -0,0 +1,79 @@
+import pytest
+
+from juniorguru.sync.jobs_scraped.pipelines.features_parser import (
+    RULES,
+    SUPPRESSING_RULES,
+    deduplicate,
+    parse_from_sentence,
+    process,
+)
+
+
+def parse_from_sentence_naive(sentence, lang):
+    for rule_id, rule_re, _ in RULES[lang]:
+        if rule_re.search(sentence) and not any(
+            suppressing_rule_id in ("", rule_id)
+            and suppressing_rule_re.search(sentence)
+            for suppressing_rule_id, suppressing_rule_re, _ in SUPPRESSING_RULES[lang]
+        ):
+            yield (rule_id, sentence, rule_re.pattern)
+
+
+def test_process():
+    item = process(
+        dict(
+            lang="en",
+            title="Senior C# Developer",
+            description_sentences=["5 years experience with C#"],
+        )
+    )
+
+    assert item["features"][0] == dict(
+        name="ENGLISH_REQUIRED", origin="language_filter"
+    )
+    assert item["features"][1]["name"] == "EXPLICITLY_SENIOR"
+    assert item["features"][1]["sentence"] == "Senior C# Developer"
+    assert item["features"][2]["name"] == "YEARS_EXPERIENCE_REQUIRED"
+    assert item["features"][2]["sentence"] == "5 years experience with C#"
+
+
+@pytest.mark.parametrize(
+    "sentence, lang",
+    [
+        ("Senior C# Developer", "en"),
+        ("5 years experience with C#", "en"),
+        ("You have a degree in Computer Science, Mathematics or Physics.", "en"),
+        ("Bachelor’s degree or higher in Computer Science or related field.", "en"),
+        ("Excellent communication skills and fluent English", "en"),
+        ("No degree required, we welcome juniors and students", "en"),
+        ("Multiple years of experience with microservices architecture", "en"),
+        ("Hledáme seniorního vývojáře s praxí alespoň 5 let", "cs"),
+        ("Vysokoškolské vzdělání technického směru výhodou", "cs"),
+        ("Znalost angličtiny výhodou, není nutná", "cs"),
+        ("Práce z domova, home office, spolupráce na IČO", "cs"),
+        ("Nevadí, když nemáš praxi, vše tě naučíme", "cs"),
+    ],
+)
+def test_parse_from_sentence_same_as_naive(sentence, lang):
+    assert list(parse_from_sentence(sentence, lang)) == list(
+        parse_from_sentence_naive(sentence, lang)
+    )
+
+
+def test_deduplicate():
+    assert deduplicate(
+        [
+            ("ADVANCED_REQUIRED", "you need very advanced English", r"advanced"),
+            ("ADVANCED_REQUIRED", "you need very advanced English", r"be very"),
+            ("ENGLISH_REQUIRED", "you need very advanced English", r"english"),
+            ("ADVANCED_REQUIRED", "different sentence", r"advanced"),
+        ]
+    ) == [
+        (
+            "ADVANCED_REQUIRED",
+            "you need very advanced English",
+            [r"advanced", r"be very"],
+        ),
+        ("ENGLISH_REQUIRED", "you need very advanced English", [r"english"]),
+        ("ADVANCED_REQUIRED", "different sentence", [r"advanced"]),
+    ]
@@ -1,8 +1,23 @@
+import random
+from pathlib import Path
 from textwrap import dedent
 
 import pytest
+from diskcache import Cache
+from sqlite_utils import Database
 
-from juniorguru.cli.data import get_row_updates, make_schema_idempotent
+from juniorguru.cli.data import (
+    format_snapshot_line,
+    get_hash,
+    get_row_updates,
+    is_modified,
+    load_file,
+    make_schema_idempotent,
+    merge_databases,
+    parse_snapshot_line,
+    prune_caches,
+    take_snapshot,
+)
 
 
 def test_make_schema_idempotent():
@@ -76,3 +91,197 @@ def test_get_row_updates_raises_conflict(row_from, row_to):
 def test_get_row_updates_raises_inconsistence(row_from, row_to):
     with pytest.raises(ValueError):
         get_row_updates(row_from, row_to)
+
+
+@pytest.fixture
+def db_paths(tmp_path):
+    path_from, path_to = tmp_path / "from.db", tmp_path / "to.db"
+    for path in [path_from, path_to]:
+        db = Database(path)
+        db.execute(
+            'CREATE TABLE "job" ("id" INTEGER NOT NULL PRIMARY KEY, "title" TEXT, "score" INTEGER)'
+        )
+        db.execute(
+            'CREATE TABLE "reaction" ("user_id" INTEGER NOT NULL, "message_id" INTEGER NOT NULL, "emoji" TEXT, PRIMARY KEY ("user_id", "message_id"))'
+        )
+        db.conn.commit()
+        db.close()
+    return path_from, path_to
+
+
+def test_merge_databases(db_paths):
+    path_from, path_to = db_paths
+    db_from, db_to = Database(path_from), Database(path_to)
+    db_from["job"].insert_all(
+        [
+            dict(id=1, title="Python", score=None),
+            dict(id=2, title="Java", score=42),
+            dict(id=3, title="Ruby", score=3),
+        ]
+    )
+    db_to["job"].insert_all(
+        [
+            dict(id=1, title="Python", score=1),
+            dict(id=2, title=None, score=42),
+            dict(id=4, title="Go", score=None),
+        ]
+    )
+    db_from["reaction"].insert_all(
+        [
+            dict(user_id=1, message_id=1, emoji="👍"),
+            dict(user_id=1, message_id=2, emoji=None),
+        ]
+    )
+    db_to["reaction"].insert_all([dict(user_id=1, message_id=2, emoji="👎")])
+    merge_databases(path_from, path_to)
+
+    assert list(Database(path_to)["job"].rows) == [
+        dict(id=1, title="Python", score=1),
+        dict(id=2, title="Java", score=42),
+        dict(id=3, title="Ruby", score=3),
+        dict(id=4, title="Go", score=None),
+    ]
+    assert list(
+        Database(path_to)["reaction"].rows_where(order_by="user_id, message_id")
+    ) == [
+        dict(user_id=1, message_id=1, emoji="👍"),
+        dict(user_id=1, message_id=2, emoji="👎"),
+    ]
+
+
+def test_merge_databases_raises_conflict_and_changes_nothing(db_paths):
+    path_from, path_to = db_paths
+    db_from, db_to = Database(path_from), Database(path_to)
+    db_from["job"].insert_all(
+        [
+            dict(id=1, title="Python", score=1),
+            dict(id=2, title="Java", score=None),
+        ]
+    )
+    db_to["job"].insert_all(
+        [
+            dict(id=1, title=None, score=1),
+            dict(id=2, title="Ruby", score=None),
+        ]
+    )
+
+    with pytest.raises(RuntimeError):
+        merge_databases(path_from, path_to)
+    assert list(Database(path_to)["job"].rows) == [
+        dict(id=1, title=None, score=1),
+        dict(id=2, title="Ruby", score=None),
+    ]
+
+
+def test_merge_databases_is_consistent_with_get_row_updates(db_paths):
+    path_from, path_to = db_paths
+    db_from, db_to = Database(path_from), Database(path_to)
+    random.seed(42)
+    values = [None, None, "a", "b"]
+    rows_from = {
+        id: dict(id=id, title=random.choice(values), score=random.choice([None, 1]))
+        for id in random.sample(range(100), 60)
+    }
+    rows_to = {
+        id: dict(id=id, title=random.choice(values), score=random.choice([None, 1]))
+        for id in random.sample(range(100), 60)
+    }
+    rows_from = {
+        id: row
+        for id, row in rows_from.items()
+        if id not in rows_to or get_row_updates_safe(row, rows_to[id]) is not None
+    }
+    db_from["job"].insert_all(rows_from.values())
+    db_to["job"].insert_all(rows_to.values())
+    merge_databases(path_from, path_to)
+
+    expected = dict(rows_to)
+    for id, row_from in rows_from.items():
+        if id in expected:
+            expected[id] = {**expected[id], **get_row_updates(row_from, expected[id])}
+        else:
+            expected[id] = row_from
+    assert list(Database(path_to)["job"].rows) == [
+        expected[id] for id in sorted(expected)
+    ]
+
+
+def get_row_updates_safe(row_from, row_to):
+    try:
+        return get_row_updates(row_from, row_to)
+    except RuntimeError:
+        return None
+
+
+def test_take_snapshot(tmp_path):
+    (tmp_path / "a" / "b").mkdir(parents=True)
+    (tmp_path / "a" / "b" / "c.txt").write_text("c")
+    (tmp_path / "a" / "d.txt").write_text("dd")
+    (tmp_path / "node_modules" / "e").mkdir(parents=True)
+    (tmp_path / "node_modules" / "e" / "f.js").write_text("f")
+    (tmp_path / ".snapshot").write_text("")
+    snapshot = take_snapshot(tmp_path, exclude=["node_modules/", ".snapshot"])
+
+    assert sorted((path, size) for path, mtime, size in snapshot) == [
+        (Path("a/b/c.txt"), 1),
+        (Path("a/d.txt"), 2),
+    ]
+
+
+@pytest.mark.parametrize("hash", ["abc", None])
+def test_snapshot_line(hash):
+    line = format_snapshot_line(Path("a/b c.txt"), 1.5, 42, hash)
+
+    assert parse_snapshot_line(line) == (Path("a/b c.txt"), (1.5, 42, hash))
+
+
+@pytest.mark.parametrize(
+    "mtime, size, content, expected",
+    [
+        (1.0, 1, "a", False),
+        (2.0, 1, "a", False),
+        (2.0, 1, "b", True),
+        (1.0, 2, "aa", True),
+    ],
+)
+def test_is_modified(tmp_path, mtime, size, content, expected):
+    path = tmp_path / "file.txt"
+    path.write_text("a")
+    snapshot_hash = get_hash(path)
+    path.write_text(content)
+
+    assert is_modified(path, mtime, size, 1.0, 1, snapshot_hash) is expected
+
+
+def test_is_modified_without_hash(tmp_path):
+    path = tmp_path / "file.txt"
+    path.write_text("a")
+
+    assert is_modified(path, 2.0, 1, 1.0, 1, None) is True
+
+
+def test_load_file_overwrites_matching_databases(tmp_path):
+    persist_dir, source_dir = tmp_path / "persist", tmp_path / "source"
+    persist_path = persist_dir / ".persistent_cache" / "cmd" / "cache.db"
+    source_path = source_dir / ".persistent_cache" / "cmd" / "cache.db"
+    for path, value in [(persist_path, "new"), (source_path, "old")]:
+        path.parent.mkdir(parents=True)
+        Database(path)["cache"].insert(dict(key="checkpoint", value=value), pk="key")
+    load_file(persist_dir, persist_path, source_dir, overwrite=[".persistent_cache/*"])
+
+    assert list(Database(source_path)["cache"].rows) == [
+        dict(key="checkpoint", value="new")
+    ]
+
+
+def test_prune_caches(tmp_path):
+    with Cache(tmp_path / "cmd") as cache:
+        cache.set("key", b"value" * 10000)
+        value_paths = list((tmp_path / "cmd").glob("**/*.val"))
+    stale_path = value_paths[0].parent / "stale.val"
+    stale_path.write_bytes(b"stale")
+    prune_caches(tmp_path)
+
+    assert list((tmp_path / "cmd").glob("**/*.val")) == value_paths
+    with Cache(tmp_path / "cmd") as cache:
+        assert cache["key"] == b"value" * 10000
@@ -1,4 +1,31 @@
-from juniorguru.cli.sync import default_from_env, get_parallel_chains
+import time
+from multiprocessing import Barrier
+
+import click
+import pytest
+from peewee import CharField
+
+from juniorguru.cli import sync as sync_module
+from juniorguru.cli.sync import (
+    Cache,
+    Group,
+    default_from_env,
+    get_balanced_chains,
+    get_chain_time,
+    get_job_chains,
+    get_parallel_chains,
+    get_ready_commands,
+    run_parallel,
+)
+from juniorguru.models.base import DB_FILE, BaseModel, db
+from juniorguru.models.sync import Sync, SyncCommand
+
+
+PARALLEL_COMMAND_SEC = 0.5
+
+
+class ParallelRecord(BaseModel):
+    name = CharField()
 
 
 def test_get_parallel_chains():
@@ -53,6 +80,73 @@ def test_get_parallel_chains_exclude():
     ]
 
 
+def test_get_job_chains_sync_1():
+    dependencies = {"a": [], "b": ["a"], "c": [], "d": ["c"], "e": []}
+
+    assert get_job_chains(dependencies, "sync-1") == [["a"], ["c"], ["e"]]
+
+
+def test_get_job_chains_sync_2():
+    dependencies = {"a": [], "b": ["a"], "c": [], "d": ["c"], "e": ["d"]}
+
+    assert get_job_chains(dependencies, "sync-2") == [["b"], ["d", "e"]]
+
+
+def test_get_chain_time():
+    assert get_chain_time(["a", "b"], {"a": 2.5, "b": 1.5}) == 4
+
+
+def test_get_chain_time_default():
+    assert get_chain_time(["a", "b"], {"a": 2.5}) == 3.5
+
+
+def test_get_balanced_chains():
+    chains = [["a"], ["b", "c"], ["d"], ["e"]]
+    times = {"a": 10, "b": 3, "c": 3, "d": 4, "e": 2}
+
+    assert get_balanced_chains(chains, times, 2) == [["a", "e"], ["b", "c", "d"]]
+
+
+def test_get_balanced_chains_node_per_chain():
+    chains = [["a"], ["b", "c"], ["d"]]
+    times = {"a": 10, "b": 3, "c": 3, "d": 4}
+
+    assert get_balanced_chains(chains, times, 3) == [["a"], ["b", "c"], ["d"]]
+
+
+def test_get_balanced_chains_single_node():
+    chains = [["a"], ["b", "c"], ["d"]]
+
+    assert get_balanced_chains(chains, {}, 1) == [["a", "b", "c", "d"]]
+
+
+def test_get_ready_commands():
+    dependencies = {"a": [], "b": ["a"], "c": [], "d": ["b", "c"]}
+
+    assert get_ready_commands(dependencies, set(), {"a", "b", "c", "d"}) == [
+        "a",
+        "c",
+    ]
+
+
+def test_get_ready_commands_some_done():
+    dependencies = {"a": [], "b": ["a"], "c": [], "d": ["b", "c"]}
+
+    assert get_ready_commands(dependencies, {"a", "c"}, {"b", "d"}) == ["b"]
+
+
+def test_get_ready_commands_all_dependencies_done():
+    dependencies = {"a": [], "b": ["a"], "c": [], "d": ["b", "c"]}
+
+    assert get_ready_commands(dependencies, {"a", "b", "c"}, {"d"}) == ["d"]
+
+
+def test_get_ready_commands_nothing_pending():
+    dependencies = {"a": [], "b": ["a"]}
+
+    assert get_ready_commands(dependencies, {"a", "b"}, set()) == []
+
+
 def test_default_from_env(monkeypatch):
     monkeypatch.setenv("FOO", "something")
     env_reader = default_from_env("FOO")
@@ -79,3 +173,51 @@ def test_default_from_env_type_default(monkeypatch):
     env_reader = default_from_env("FOO", default=123, type=int)
 
     assert env_reader() == 123
+
+
+@pytest.fixture
+def db_file(tmp_path):
+    db.init(str(tmp_path / "data.db"))
+    with db.connection_context():
+        db.create_tables([Sync, SyncCommand, ParallelRecord])
+    yield db
+    db.init(DB_FILE)
+
+
+def create_parallel_command(group, module_name, barrier):
+    def command():
+        barrier.wait(timeout=10)  # fails unless the other command runs too
+        with db.connection_context(), db.atomic():
+            ParallelRecord.create(name=module_name)
+            time.sleep(PARALLEL_COMMAND_SEC)  # keeps the write lock
+
+    command.__module__ = f"{__name__}.{module_name}"  # sets the command name
+    return group.sync_command()(command)
+
+
+def test_run_parallel(db_file, tmp_path, monkeypatch):
+    group = Group()
+    group.dependencies_map = {"parallel-a": [], "parallel-b": []}
+    barrier = Barrier(2)
+    create_parallel_command(group, "parallel_a", barrier)
+    create_parallel_command(group, "parallel_b", barrier)
+    monkeypatch.setattr(sync_module, "main", group)
+    with db.connection_context():
+        sync = Sync.start("test_run_parallel")
+    with Cache(tmp_path / "cache") as cache:
+        obj = dict(
+            sync=sync,
+            cache=cache,
+            persistent_cache_dir=tmp_path / "persistent_cache",
+            skip_dependencies=False,
+            jobs=2,
+        )
+        with click.Context(group, info_name="sync", obj=obj) as context:
+            run_parallel(context, group.dependencies_map, 2)
+
+    with db.connection_context():
+        records = list(ParallelRecord.select().order_by(ParallelRecord.name))
+        commands = sorted(sync.times_min())
+
+    assert [record.name for record in records] == ["parallel_a", "parallel_b"]
+    assert commands == ["parallel-a", "parallel-b"]
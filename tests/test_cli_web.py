@@ -2,7 +2,9 @@ from pathlib import Path
 
 import pytest
 
+from juniorguru.cli import web
 from juniorguru.cli.web import resolve_path
+from juniorguru.lib import mkdocs_incremental
 
 
 @pytest.mark.parametrize(
@@ -31,3 +33,34 @@ def test_resolve_path_raises():
             Path("public/jobs/region/liberec/index.html"),
             "https://example.com",
         )
+
+
+def build_mkdocs_shard_fake(config_path, site_dir, shards_count, shard_index):
+    old_pages = {
+        "a.md": dict(source="old", context={}, tables={}),
+        "b.md": dict(source="old", context={}, tables={}),
+    }
+    new_pages = {
+        0: {"a.md": dict(source="new", context={"x": "123"}, tables={"item": "1"})},
+        1: {"b.md": dict(source="new", context={}, tables={})},
+    }[shard_index]
+    return dict(
+        build="abc",
+        nav="def",
+        pages={**old_pages, **new_pages},
+        modified=set(new_pages.keys()),
+    )
+
+
+def test_build_mkdocs_parallel(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(web, "build_mkdocs_shard", build_mkdocs_shard_fake)
+    web.build_mkdocs_parallel(Path("mkdocs.yml"), tmp_path / "site", 2)
+    manifest = mkdocs_incremental.BuildManifest()
+
+    assert manifest.build == "abc"
+    assert manifest.nav == "def"
+    assert manifest.pages == {
+        "a.md": dict(source="new", context={"x": "123"}, tables={"item": "1"}),
+        "b.md": dict(source="new", context={}, tables={}),
+    }
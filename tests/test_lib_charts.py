@@ -149,3 +149,56 @@ def test_milestones_label_respects_nbsp():
     annotation = result["annotations"]["velikonocni-pondeli-label"]
 
     assert annotation["content"] == ["Velikonoční pondělí"]
+
+
+def test_merge_breakdowns():
+    breakdowns = [{"a": 1, "b": 2}, {"b": 3}, {}]
+
+    assert charts.merge_breakdowns(breakdowns) == {
+        "a": [1, None, None],
+        "b": [2, 3, None],
+    }
+
+
+def test_sum_per_range():
+    values = [
+        (date(2020, 3, 1), 1),
+        (date(2020, 1, 1), 2),
+        (date(2020, 1, 31), 4),
+        (date(2020, 2, 15), 8),
+        (date(2020, 1, 31), 16),
+    ]
+    ranges = [
+        (date(2020, 1, 1), date(2020, 1, 31)),
+        (date(2020, 2, 1), date(2020, 2, 29)),
+        (date(2020, 1, 1), date(2020, 3, 1)),
+        (date(2020, 4, 1), date(2020, 4, 30)),
+    ]
+
+    assert charts.sum_per_range(values, ranges) == [22, 8, 31, 0]
+
+
+def test_sum_per_range_empty():
+    ranges = [(date(2020, 1, 1), date(2020, 1, 31))]
+
+    assert charts.sum_per_range([], ranges) == [0]
+
+
+def test_sum_per_range_breakdown():
+    values = [
+        (date(2020, 1, 1), "a", 1),
+        (date(2020, 1, 15), "b", 2),
+        (date(2020, 2, 1), "a", 4),
+        (date(2020, 2, 2), "b", 0),
+    ]
+    ranges = [
+        (date(2020, 1, 1), date(2020, 1, 31)),
+        (date(2020, 2, 1), date(2020, 2, 29)),
+        (date(2020, 3, 1), date(2020, 3, 31)),
+    ]
+
+    assert charts.sum_per_range_breakdown(values, ranges) == [
+        {"a": 1, "b": 2},
+        {"a": 4, "b": 0},
+        {},
+    ]
@@ -0,0 +1,54 @@
+import subprocess
+import sys
+
+import pytest
+
+from juniorguru.lib.hyphenation import Hyphenator
+
+
+FAKE_HYPHENATE_SCRIPT = """
+import json, os, sys
+
+for line in sys.stdin:
+    htmls = json.loads(line)
+    if htmls == ["crash"]:
+        sys.exit(1)
+    print(json.dumps([f"{os.getpid()}:" + html.upper() for html in htmls]), flush=True)
+"""
+
+
+@pytest.fixture
+def hyphenator():
+    with Hyphenator([sys.executable, "-c", FAKE_HYPHENATE_SCRIPT]) as hyphenator:
+        yield hyphenator
+
+
+def test_hyphenator_hyphenate(hyphenator):
+    results = hyphenator.hyphenate(["<p>a</p>", "<p>b</p>"])
+
+    assert [result.split(":")[1] for result in results] == ["<P>A</P>", "<P>B</P>"]
+
+
+def test_hyphenator_reuses_process(hyphenator):
+    result1 = hyphenator.hyphenate(["<p>a</p>"])[0]
+    result2 = hyphenator.hyphenate(["<p>b</p>"])[0]
+
+    assert result1.split(":")[0] == result2.split(":")[0]
+
+
+def test_hyphenator_doesnt_start_process_for_nothing():
+    hyphenator = Hyphenator(["/nonexistent"])
+
+    assert hyphenator.hyphenate([]) == []
+
+
+def test_hyphenator_raises_if_process_fails(hyphenator):
+    with pytest.raises(subprocess.CalledProcessError):
+        hyphenator.hyphenate(["crash"])
+
+
+def test_hyphenator_close(hyphenator):
+    hyphenator.hyphenate(["<p>a</p>"])
+
+    assert hyphenator.close() == 0
+    assert hyphenator.close() is None
@@ -13,3 +13,117 @@ from juniorguru.lib import images
 )
 def test_is_image_mimetype(mimetype, expected):
     assert images.is_image_mimetype(mimetype) == expected
+
+
+@pytest.mark.parametrize("workers", [1, 3, 20])
+def test_render_image_files_keeps_order(monkeypatch, workers):
+    def render_image_file(self, width, *args, **kwargs):
+        return width
+
+    monkeypatch.setattr(images.ImageRenderer, "render_image_file", render_image_file)
+    args_list = [(width, 100, "thumbnail.jinja", {}, "output") for width in range(10)]
+
+    assert images.render_image_files(args_list, workers=workers) == list(range(10))
+
+
+def test_image_renderer_launches_browser_lazily():
+    with images.ImageRenderer() as renderer:
+        assert renderer._browser is None
+
+
+def test_get_environment_is_cached():
+    filters = frozenset(dict(upper=str.upper).items())
+
+    assert images.get_environment(filters) is images.get_environment(filters)
+    assert images.get_environment(filters) is not images.get_environment()
+    assert images.get_environment(filters).filters["upper"] is str.upper
+
+
+@pytest.fixture
+def templates_dirs(tmp_path, monkeypatch):
+    templates_dir = tmp_path / "templates"
+    templates_dir.mkdir()
+    (templates_dir / "poster.jinja").write_text(
+        '<link rel="stylesheet" href="./poster.css"><h1>{{ title }}</h1>'
+    )
+    cache_dir = tmp_path / "cache"
+    (cache_dir / "assets").mkdir(parents=True)
+    (cache_dir / "poster.css").write_text("h1{background:url(./assets/bg.png)}")
+    (cache_dir / "assets" / "bg.png").write_bytes(b"\x89PNG")
+
+    monkeypatch.setattr(images, "TEMPLATES_DIR", templates_dir)
+    monkeypatch.setattr(images, "CACHE_DIR", cache_dir)
+    images.get_template_hash.cache_clear()
+    yield templates_dir, cache_dir
+    images.get_template_hash.cache_clear()
+
+
+@pytest.mark.parametrize(
+    "path, content",
+    [
+        ("templates/poster.jinja", "<h1>{{ title|upper }}</h1>"),
+        ("cache/poster.css", "h1{color:red}"),
+        ("cache/assets/bg.png", b"\x89PNG!"),
+    ],
+)
+def test_get_template_hash_changes(tmp_path, templates_dirs, path, content):
+    hash = images.get_template_hash("poster.jinja")
+    path = tmp_path / path
+    if isinstance(content, bytes):
+        path.write_bytes(content)
+    else:
+        path.write_text(path.read_text() + content)
+    images.get_template_hash.cache_clear()
+
+    assert images.get_template_hash("poster.jinja") != hash
+
+
+def test_get_template_hash_missing_css(templates_dirs):
+    templates_dir, cache_dir = templates_dirs
+    (cache_dir / "poster.css").unlink()
+
+    with pytest.raises(FileNotFoundError):
+        images.get_template_hash("poster.jinja")
+
+
+def test_render_image_file_renders_only_when_inputs_change(
+    tmp_path, templates_dirs, monkeypatch
+):
+    templates_dir, cache_dir = templates_dirs
+    calls = []
+
+    def render_template(self, *args, **kwargs):
+        calls.append(args)
+        return b"\x89PNG"
+
+    monkeypatch.setattr(images.ImageRenderer, "render_template", render_template)
+    args = (100, 100, "poster.jinja", {"title": "Hello"}, tmp_path / "output")
+
+    image_path1 = images.render_image_file(*args)
+    image_path2 = images.render_image_file(*args)
+    (cache_dir / "poster.css").write_text("h1{color:red}")
+    images.get_template_hash.cache_clear()
+    image_path3 = images.render_image_file(*args)
+
+    assert image_path1 == image_path2
+    assert image_path1 != image_path3
+    assert len(calls) == 2
+
+
+def test_posters_cache_cleanup(tmp_path):
+    (tmp_path / "a.png").write_bytes(b"")
+    (tmp_path / "b.png").write_bytes(b"")
+    posters = images.PostersCache(tmp_path)
+    posters.init()
+    posters.record(tmp_path / "a.png")
+    posters.cleanup()
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["a.png"]
+
+
+def test_posters_cache_clear(tmp_path):
+    (tmp_path / "a.png").write_bytes(b"")
+    posters = images.PostersCache(tmp_path)
+    posters.init(clear=True)
+
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,161 @@
+import asyncio
+import re
+from pathlib import Path
+
+import pytest
+from aiohttp import web
+
+from juniorguru.lib import link_checker
+
+
+@pytest.mark.parametrize(
+    "html_path, expected",
+    [
+        ("index.html", "/"),
+        ("podcast/index.html", "/podcast/"),
+        ("jobs/region/liberec/index.html", "/jobs/region/liberec/"),
+        ("404.html", "/404.html"),
+    ],
+)
+def test_get_page_url(html_path: str, expected: str):
+    assert link_checker.get_page_url(Path("public"), Path("public") / html_path) == (
+        expected
+    )
+
+
+@pytest.mark.parametrize(
+    "href, expected",
+    [
+        ("https://example.com/foo", "https://example.com/foo"),
+        ("https://example.com/foo#bar", "https://example.com/foo"),
+        ("http://example.com", "http://example.com"),
+        ("/static/js/index.js", "/static/js/index.js"),
+        ("../static/js/index.js", "/static/js/index.js"),
+        ("club/", "/podcast/club/"),
+        ("/jobs/?page=2#top", "/jobs/"),
+        ("#top", None),
+        ("mailto:honza@junior.guru", None),
+        ("tel:+420123456789", None),
+        ("javascript:void(0)", None),
+        ("  ", None),
+        (None, None),
+        ("http://[::1", "http://[::1"),
+    ],
+)
+def test_normalize_link(href: str | None, expected: str | None):
+    assert link_checker.normalize_link("/podcast/", href) == expected
+
+
+def test_extract_links(tmp_path: Path):
+    (tmp_path / "podcast").mkdir()
+    (tmp_path / "index.html").write_text(
+        '<a href="https://example.com/#foo">Example</a>'
+        '<a href="podcast/">Podcast</a>'
+        '<img src="/static/logo.svg">'
+    )
+    (tmp_path / "podcast" / "index.html").write_text(
+        '<a href="https://example.com/">Example</a>'
+        '<a href="mailto:honza@junior.guru">E-mail</a>'
+    )
+    (tmp_path / "404.html").write_text("\n")
+
+    assert link_checker.extract_links(tmp_path, workers=2) == {
+        "https://example.com/": {"/", "/podcast/"},
+        "/podcast/": {"/"},
+        "/static/logo.svg": {"/"},
+    }
+
+
+@pytest.mark.parametrize(
+    "link, expected",
+    [
+        ("/static/js/index.js", True),
+        ("https://www.facebook.com/search/top?q=junior.guru", True),
+        ("https://juniorguru.memberful.com/account", True),
+        ("/static/", False),
+        ("https://www.facebook.com/groups/", False),
+        ("https://example.com/", False),
+    ],
+)
+def test_is_excluded(link: str, expected: bool):
+    patterns = ["*static/*.*", "facebook.com/search/", "juniorguru.memberful.com"]
+
+    assert link_checker.is_excluded(link, patterns) is expected
+
+
+@pytest.mark.parametrize(
+    "reason, expected",
+    [
+        ("HTTP_429", True),
+        ("HTTP_503", True),
+        ("HTTP_404", False),
+        ("HTTP_4290", False),
+    ],
+)
+def test_is_ignored_reason(reason: str, expected: bool):
+    patterns = [re.compile(r"^HTTP_429$"), re.compile(r"^HTTP_5\d\d$")]
+
+    assert link_checker.is_ignored_reason(reason, patterns) is expected
+
+
+@pytest.mark.parametrize(
+    "link, expected",
+    [
+        ("/", None),
+        ("/podcast/", None),
+        ("/podcast", None),
+        ("/static/logo%20dark.svg", None),
+        ("/club/", "HTTP_404"),
+        ("/static/missing.svg", "HTTP_404"),
+    ],
+)
+def test_check_local_link(tmp_path: Path, link: str, expected: str | None):
+    (tmp_path / "podcast").mkdir()
+    (tmp_path / "static").mkdir()
+    (tmp_path / "index.html").write_text("")
+    (tmp_path / "podcast" / "index.html").write_text("")
+    (tmp_path / "static" / "logo dark.svg").write_text("")
+
+    assert link_checker.check_local_link(tmp_path, link) == expected
+
+
+def test_get_os_error_reason():
+    assert link_checker.get_os_error_reason(ConnectionRefusedError(111, "")) == (
+        "ERRNO_ECONNREFUSED"
+    )
+
+
+async def check_urls_with_server() -> tuple[dict[str, str | None], list[str]]:
+    user_agents = []
+
+    async def handler(request: web.Request) -> web.Response:
+        user_agents.append(request.headers["User-Agent"])
+        status = int(request.match_info["status"])
+        return web.Response(status=status, text="Hello!")
+
+    app = web.Application()
+    app.router.add_get("/{status}", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    try:
+        port = site._server.sockets[0].getsockname()[1]
+        urls = [f"http://127.0.0.1:{port}/{status}" for status in (200, 404, 503)]
+        reasons = await link_checker.check_urls_async(urls, "Test/1.0")
+        reasons = {url.split("/")[-1]: reason for url, reason in reasons.items()}
+        return reasons, user_agents
+    finally:
+        await runner.cleanup()
+
+
+def test_check_urls_async():
+    reasons, user_agents = asyncio.run(check_urls_with_server())
+
+    assert reasons == {"200": None, "404": "HTTP_404", "503": "HTTP_503"}
+    assert user_agents == ["Test/1.0"] * 3
+
+
+@pytest.mark.parametrize("url", ["http://", "http://[::1"])
+def test_check_urls_reports_invalid_urls(url: str):
+    assert link_checker.check_urls([url], "Test/1.0") == {url: "INVALID_URL"}
@@ -2,7 +2,13 @@ from operator import itemgetter
 
 import pytest
 
-from juniorguru.lib.locations import fetch_locations, get_region, optimize_geocoding
+from juniorguru.cli.sync import Cache
+from juniorguru.lib.locations import (
+    cache_geocoding,
+    fetch_locations,
+    get_region,
+    optimize_geocoding,
+)
 
 
 def test_locations():
@@ -111,3 +117,71 @@ def test_optimize_geocoding(location_raw, expected):
         return GEOCODED_ADDRESS
 
     assert optimize_geocoding(geocode)(location_raw) == expected
+
+
+def test_optimize_geocoding_memoizes():
+    calls = []
+
+    def geocode(location_raw):
+        calls.append(location_raw)
+        return GEOCODED_ADDRESS
+
+    geocode = optimize_geocoding(geocode)
+    geocode("252 30 Řevnice, Česko")
+    geocode("252 30 Řevnice, Česko")
+
+    assert calls == ["252 30 Řevnice, Česko"]
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = Cache(tmp_path)
+    yield cache
+    cache.close()
+
+
+def test_cache_geocoding(cache):
+    calls = []
+
+    def geocode(location_raw):
+        calls.append(location_raw)
+        return GEOCODED_ADDRESS
+
+    cache_geocoding(geocode, cache)("252 30 Řevnice, Česko")
+    address = cache_geocoding(geocode, cache)(" 252 30  ŘEVNICE, česko")
+
+    assert address == GEOCODED_ADDRESS
+    assert calls == ["252 30 Řevnice, Česko"]
+
+
+def test_cache_geocoding_empty_result(cache):
+    calls = []
+
+    def geocode(location_raw):
+        calls.append(location_raw)
+        return None
+
+    cache_geocoding(geocode, cache)("???")
+    address = cache_geocoding(geocode, cache)("???")
+
+    assert address is None
+    assert calls == ["???"]
+
+
+def test_cache_geocoding_empty_result_expires_sooner(cache):
+    def geocode(location_raw):
+        return None
+
+    cache_geocoding(geocode, cache, expire=100, expire_empty=0)("???")
+
+    assert cache.get("geocode:???", "missing") == "missing"
+
+
+def test_cache_geocoding_error(cache):
+    def geocode(location_raw):
+        raise RuntimeError()
+
+    with pytest.raises(RuntimeError):
+        cache_geocoding(geocode, cache)("???")
+
+    assert len(cache) == 0
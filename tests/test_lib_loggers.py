@@ -38,6 +38,8 @@ def test_getitem(key, expected):
         ("SpawnPoolWorker-1", "/worker1"),
         ("ForkPoolWorker-2", "/worker2"),
         ("Process-3", "/process3"),
+        ("SpawnProcess-4", "/worker4"),
+        ("ForkProcess-5", "/worker5"),
     ],
 )
 def test_get_process_suffix(process_name, expected):
@@ -0,0 +1,156 @@
+import time
+
+import pytest
+from diskcache import Cache
+
+from juniorguru.lib.memberful import CACHE_EXPIRE_SEC, MemberfulAPI
+
+
+QUERY = """
+query getActivities($cursor: String!, $type: String!) {
+    activities(after: $cursor, type: $type) {
+        totalCount
+        pageInfo { endCursor hasNextPage }
+        edges { node { id } }
+    }
+}
+"""
+
+
+class FakeClient:
+    def __init__(self, pages_count=2, total_count=None, fail_at=None):
+        self.pages_count = pages_count
+        self.total_count = total_count or pages_count * 2
+        self.fail_at = fail_at
+        self.cursors = []
+
+    def execute(self, document, variable_values):
+        type = variable_values["type"]
+        cursor = variable_values["cursor"]
+        self.cursors.append(cursor)
+        if self.fail_at is not None and len(self.cursors) > self.fail_at:
+            raise ConnectionError("Banned!")
+        page = int(cursor) if cursor else 0
+        return {
+            "activities": {
+                "totalCount": self.total_count,
+                "pageInfo": {
+                    "endCursor": str(page + 1),
+                    "hasNextPage": page + 1 < self.pages_count,
+                },
+                "edges": [{"node": {"id": f"{type}-{page}-{i}"}} for i in range(2)],
+            }
+        }
+
+
+@pytest.fixture
+def cache(tmp_path):
+    with Cache(tmp_path) as cache:
+        yield cache
+
+
+def create_memberful(client, **kwargs):
+    memberful = MemberfulAPI(api_key="abc", **kwargs)
+    memberful._create_client = lambda: client
+    return memberful
+
+
+def test_get_nodes():
+    memberful = create_memberful(FakeClient())
+    nodes = memberful.get_nodes(QUERY, dict(type="a"))
+
+    assert [node["id"] for node in nodes] == ["a-0-0", "a-0-1", "a-1-0", "a-1-1"]
+
+
+def test_get_nodes_concurrently():
+    memberful = create_memberful(FakeClient())
+    queries = [(QUERY, dict(type="a")), (QUERY, dict(type="b"))]
+    nodes = memberful.get_nodes_concurrently(queries, workers=1)
+
+    assert sorted(node["id"] for node in nodes) == [
+        "a-0-0",
+        "a-0-1",
+        "a-1-0",
+        "a-1-1",
+        "b-0-0",
+        "b-0-1",
+        "b-1-0",
+        "b-1-1",
+    ]
+
+
+def test_get_nodes_concurrently_raises():
+    memberful = create_memberful(FakeClient(fail_at=1))
+    queries = [(QUERY, dict(type="a"))]
+
+    with pytest.raises(ConnectionError):
+        list(memberful.get_nodes_concurrently(queries, workers=1))
+
+
+def test_get_nodes_resumes_from_checkpoint(cache):
+    memberful = create_memberful(FakeClient(pages_count=4, fail_at=2), cache=cache)
+    with pytest.raises(ConnectionError):
+        list(memberful.get_nodes(QUERY, dict(type="a")))
+
+    client = FakeClient(pages_count=4)
+    memberful = create_memberful(client, cache=cache)
+    nodes = memberful.get_nodes(QUERY, dict(type="a"))
+
+    assert len(list(nodes)) == 8
+    assert client.cursors == ["", "2", "3"]  # the first page checks the total count
+
+
+def test_get_nodes_drops_checkpoint_when_finished(cache):
+    memberful = create_memberful(FakeClient(), cache=cache)
+    list(memberful.get_nodes(QUERY, dict(type="a")))
+
+    expire_times = [cache.get(key, expire_time=True)[1] for key in cache]
+
+    assert len(expire_times) == 2  # just the pages
+    assert all(
+        expire_time <= time.time() + CACHE_EXPIRE_SEC for expire_time in expire_times
+    )
+
+
+def test_get_nodes_checkpoint_with_grown_total_count(cache):
+    memberful = create_memberful(FakeClient(pages_count=4, fail_at=2), cache=cache)
+    with pytest.raises(ConnectionError):
+        list(memberful.get_nodes(QUERY, dict(type="a")))
+
+    client = FakeClient(pages_count=5)
+    memberful = create_memberful(client, cache=cache)
+    nodes = memberful.get_nodes(QUERY, dict(type="a"))
+
+    assert len(list(nodes)) == 10
+    assert client.cursors == ["", "1", "2", "3", "4"]
+
+
+def test_get_nodes_checkpoint_with_shrunk_total_count(cache):
+    memberful = create_memberful(FakeClient(pages_count=4, fail_at=2), cache=cache)
+    with pytest.raises(ConnectionError):
+        list(memberful.get_nodes(QUERY, dict(type="a")))
+
+    client = FakeClient(pages_count=3)
+    memberful = create_memberful(client, cache=cache)
+    nodes = memberful.get_nodes(QUERY, dict(type="a"))
+
+    assert len(list(nodes)) == 6
+    assert client.cursors == ["", "1", "2"]
+
+
+def test_wait_for_rate_limit():
+    memberful = MemberfulAPI(api_key="abc", requests_per_sec=20)
+    start = time.monotonic()
+    for _ in range(3):
+        memberful._wait_for_rate_limit()
+
+    assert time.monotonic() - start >= 0.1
+
+
+def test_wait_for_rate_limit_disabled():
+    memberful = MemberfulAPI(api_key="abc")
+    start = time.monotonic()
+    for _ in range(3):
+        memberful._wait_for_rate_limit()
+
+    assert time.monotonic() - start < 0.1
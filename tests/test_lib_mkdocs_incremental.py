@@ -0,0 +1,324 @@
+from datetime import date
+
+import pytest
+from mkdocs.structure.files import File, Files
+from peewee import CharField, Model, SqliteDatabase
+
+from juniorguru.lib import mkdocs_incremental, mkdocs_jinja
+from juniorguru.lib.mkdocs_jinja import LazyValue
+
+
+class Item(Model):
+    name = CharField()
+
+
+class Tag(Model):
+    name = CharField()
+
+
+@pytest.fixture
+def docs_dir(tmp_path):
+    path = tmp_path / "docs"
+    path.mkdir()
+    return path
+
+
+@pytest.fixture
+def site_dir(tmp_path):
+    path = tmp_path / "site"
+    path.mkdir()
+    return path
+
+
+@pytest.fixture
+def file(docs_dir, site_dir):
+    (docs_dir / "a.md").write_text("Hello {{ x }}")
+    file = File("a.md", str(docs_dir), str(site_dir), True)
+    (site_dir / "a").mkdir()
+    (site_dir / "a" / "index.html").write_text("<p>Hello 42</p>")
+    return file
+
+
+@pytest.fixture
+def page(file):
+    return type("FakePage", (), dict(file=file))()
+
+
+@pytest.fixture
+def test_db():
+    db = SqliteDatabase(":memory:")
+    with db.connection_context():
+        db.bind([Item, Tag])
+        db.create_tables([Item, Tag])
+        yield db
+
+
+@pytest.fixture
+def tables(test_db):
+    return mkdocs_incremental.DatabaseTables(test_db)
+
+
+def build_page(manifest, page, lazy_values, tables, build="abc", queries=None):
+    tables.install()
+    try:
+        with mkdocs_jinja.rendering_page(page):
+            for lazy_value in lazy_values.values():
+                lazy_value.get()
+            for query in queries or []:
+                list(query)
+    finally:
+        tables.uninstall()
+    manifest.update([page.file], build, "nav", lazy_values, tables, {page.file.src_uri})
+
+
+def create_page(title, meta, src_uri="a.md"):
+    file = type("FakeFile", (), dict(src_uri=src_uri))()
+    return type("FakePage", (), dict(file=file, title=title, meta=meta))()
+
+
+def test_serialize():
+    value = dict(b=[Item(name="x"), date(2023, 1, 1)], a={3, 1, 2}, c=(1, "2"))
+
+    assert mkdocs_incremental.serialize(value) == (
+        "{'a': {1, 2, 3}, 'b': [Item({'name': 'x'}), 2023-01-01], 'c': [1, '2']}"
+    )
+
+
+def test_fingerprint():
+    assert mkdocs_incremental.fingerprint(
+        [Item(name="x")]
+    ) == mkdocs_incremental.fingerprint([Item(name="x")])
+    assert mkdocs_incremental.fingerprint(
+        [Item(name="x")]
+    ) != mkdocs_incremental.fingerprint([Item(name="y")])
+
+
+def test_collect_lazy_values():
+    x = LazyValue(lambda: 1)
+    y = LazyValue(lambda: 2)
+    context = dict(x=x, z=3, nested=dict(y=y, z=3))
+
+    assert mkdocs_incremental.collect_lazy_values(context, prefix="docs.") == {
+        "docs.x": x,
+        "docs.nested.y": y,
+    }
+
+
+def test_get_build_fingerprint(tmp_path, docs_dir, site_dir):
+    template_path = tmp_path / "main.html"
+    template_path.write_text("{{ page.content }}")
+    files = Files([File("a.md", str(docs_dir), str(site_dir), True)])
+    fingerprint = mkdocs_incremental.get_build_fingerprint([template_path], files)
+    template_path.write_text("<main>{{ page.content }}</main>")
+
+    assert fingerprint != mkdocs_incremental.get_build_fingerprint(
+        [template_path], files
+    )
+
+
+def test_get_build_fingerprint_changes_with_pages(tmp_path, docs_dir, site_dir):
+    template_path = tmp_path / "main.html"
+    template_path.write_text("{{ page.content }}")
+    files = Files([File("a.md", str(docs_dir), str(site_dir), True)])
+    more_files = Files(
+        [
+            File("a.md", str(docs_dir), str(site_dir), True),
+            File("b.md", str(docs_dir), str(site_dir), True),
+        ]
+    )
+
+    assert mkdocs_incremental.get_build_fingerprint(
+        [template_path], files
+    ) != mkdocs_incremental.get_build_fingerprint([template_path], more_files)
+
+
+def test_get_nav_fingerprint():
+    pages = [create_page("A", {"x": 1}), create_page("B", {}, src_uri="b.md")]
+
+    assert mkdocs_incremental.get_nav_fingerprint(
+        pages
+    ) == mkdocs_incremental.get_nav_fingerprint(list(reversed(pages)))
+
+
+@pytest.mark.parametrize(
+    "title, meta",
+    [
+        ("A", {"x": 2}),
+        ("A", {}),
+        ("Á", {"x": 1}),
+    ],
+)
+def test_get_nav_fingerprint_changes_with_titles_and_meta(title, meta):
+    assert mkdocs_incremental.get_nav_fingerprint(
+        [create_page("A", {"x": 1})]
+    ) != mkdocs_incremental.get_nav_fingerprint([create_page(title, meta)])
+
+
+def test_database_tables_records_tables_read_by_pages(tables, page):
+    tables.install()
+    try:
+        list(Tag.select())
+        with mkdocs_jinja.rendering_page(page):
+            list(Item.select().join(Tag, on=(Item.name == Tag.name)))
+    finally:
+        tables.uninstall()
+    list(Tag.select())
+
+    assert tables.pages == {"a.md": {"item", "tag"}}
+
+
+def test_database_tables_fingerprint(tables):
+    Item.create(name="x")
+    Item.create(name="y")
+    fingerprint = tables.fingerprint("item")
+    Item.delete().execute()
+    Item.create(name="y")
+    Item.create(name="x")
+
+    assert mkdocs_incremental.DatabaseTables(tables.db).fingerprint("item") != (
+        fingerprint
+    )
+    assert tables.fingerprint("item") == fingerprint  # cached for the build
+
+
+def test_database_tables_fingerprint_ignores_order(test_db, tables):
+    test_db.execute_sql("INSERT INTO item (id, name) VALUES (2, 'y'), (1, 'x')")
+    fingerprint = tables.fingerprint("item")
+    test_db.execute_sql("DELETE FROM item")
+    test_db.execute_sql("INSERT INTO item (id, name) VALUES (1, 'x'), (2, 'y')")
+
+    assert mkdocs_incremental.DatabaseTables(test_db).fingerprint("item") == (
+        fingerprint
+    )
+
+
+def test_database_tables_fingerprint_missing_table(tables):
+    assert tables.fingerprint("missing") is None
+
+
+def test_manifest_is_modified_without_previous_build(tmp_path, file, tables):
+    manifest = mkdocs_incremental.BuildManifest(tmp_path / "manifest.json")
+
+    assert manifest.is_modified(file, "abc", {}, tables) is True
+
+
+def test_manifest_is_modified_unchanged(tmp_path, page, tables):
+    path = tmp_path / "manifest.json"
+    manifest = mkdocs_incremental.BuildManifest(path)
+    build_page(manifest, page, {"x": LazyValue(lambda: 42)}, tables=tables)
+    manifest.save()
+    manifest = mkdocs_incremental.BuildManifest(path)
+    tables = mkdocs_incremental.DatabaseTables(tables.db)
+
+    assert (
+        manifest.is_modified(page.file, "abc", {"x": LazyValue(lambda: 42)}, tables)
+        is False
+    )
+
+
+def test_manifest_is_modified_different_build(tmp_path, page, tables):
+    manifest = mkdocs_incremental.BuildManifest(tmp_path / "manifest.json")
+    build_page(manifest, page, {"x": LazyValue(lambda: 42)}, tables=tables)
+
+    assert (
+        manifest.is_modified(page.file, "xyz", {"x": LazyValue(lambda: 42)}, tables)
+        is True
+    )
+
+
+def test_manifest_is_modified_different_source(tmp_path, docs_dir, page, tables):
+    manifest = mkdocs_incremental.BuildManifest(tmp_path / "manifest.json")
+    build_page(manifest, page, {"x": LazyValue(lambda: 42)}, tables=tables)
+    (docs_dir / "a.md").write_text("Bye {{ x }}")
+
+    assert (
+        manifest.is_modified(page.file, "abc", {"x": LazyValue(lambda: 42)}, tables)
+        is True
+    )
+
+
+def test_manifest_is_modified_missing_output(tmp_path, site_dir, page, tables):
+    manifest = mkdocs_incremental.BuildManifest(tmp_path / "manifest.json")
+    build_page(manifest, page, {"x": LazyValue(lambda: 42)}, tables=tables)
+    (site_dir / "a" / "index.html").unlink()
+
+    assert (
+        manifest.is_modified(page.file, "abc", {"x": LazyValue(lambda: 42)}, tables)
+        is True
+    )
+
+
+@pytest.mark.parametrize(
+    "lazy_values, expected",
+    [
+        ({"x": LazyValue(lambda: 42)}, False),
+        ({"x": LazyValue(lambda: 42), "y": LazyValue(lambda: 1)}, False),
+        ({"x": LazyValue(lambda: 43)}, True),
+        ({"y": LazyValue(lambda: 42)}, True),
+    ],
+)
+def test_manifest_is_modified_context(tmp_path, page, lazy_values, expected, tables):
+    manifest = mkdocs_incremental.BuildManifest(tmp_path / "manifest.json")
+    build_page(manifest, page, {"x": LazyValue(lambda: 42)}, tables=tables)
+
+    assert manifest.is_modified(page.file, "abc", lazy_values, tables) is expected
+
+
+def test_manifest_update_ignores_unused_values(tmp_path, page, tables):
+    manifest = mkdocs_incremental.BuildManifest(tmp_path / "manifest.json")
+    unused = LazyValue(lambda: 1)
+    build_page(manifest, page, {"x": LazyValue(lambda: 42)}, tables=tables)
+    manifest.update([page.file], "abc", "nav", {"y": unused}, tables, set())
+
+    assert list(manifest.pages["a.md"]["context"].keys()) == ["x"]
+    assert unused.duration is None
+
+
+def test_manifest_update_drops_removed_pages(tmp_path, page, tables):
+    manifest = mkdocs_incremental.BuildManifest(tmp_path / "manifest.json")
+    build_page(manifest, page, {"x": LazyValue(lambda: 42)}, tables=tables)
+    manifest.update([], "abc", "nav", {}, tables, set())
+
+    assert manifest.pages == {}
+
+
+def test_manifest_is_modified_different_table(tmp_path, page, tables):
+    Item.create(name="x")
+    Tag.create(name="a")
+    manifest = mkdocs_incremental.BuildManifest(tmp_path / "manifest.json")
+    build_page(manifest, page, {}, tables=tables, queries=[Item.select()])
+    Tag.create(name="b")
+
+    assert (
+        manifest.is_modified(
+            page.file, "abc", {}, mkdocs_incremental.DatabaseTables(tables.db)
+        )
+        is False
+    )
+
+    Item.create(name="y")
+
+    assert (
+        manifest.is_modified(
+            page.file, "abc", {}, mkdocs_incremental.DatabaseTables(tables.db)
+        )
+        is True
+    )
+
+
+def test_manifest_update_records_tables(tmp_path, page, tables):
+    manifest = mkdocs_incremental.BuildManifest(tmp_path / "manifest.json")
+    build_page(manifest, page, {}, tables=tables, queries=[Item.select()])
+
+    assert list(manifest.pages["a.md"]["tables"].keys()) == ["item"]
+
+
+def test_manifest_is_nav_modified(tmp_path, page, tables):
+    path = tmp_path / "manifest.json"
+    manifest = mkdocs_incremental.BuildManifest(path)
+    build_page(manifest, page, {}, tables=tables)
+    manifest.save()
+    manifest = mkdocs_incremental.BuildManifest(path)
+
+    assert manifest.is_nav_modified("nav") is False
+    assert manifest.is_nav_modified("different") is True
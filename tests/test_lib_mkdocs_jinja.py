@@ -0,0 +1,158 @@
+import pytest
+from jinja2 import DictLoader, Environment
+from mkdocs.config.defaults import MkDocsConfig
+from mkdocs.structure.files import File, Files
+from mkdocs.structure.pages import Page
+
+from juniorguru.lib import mkdocs_jinja
+
+
+@pytest.fixture
+def config(tmp_path):
+    (tmp_path / "docs").mkdir()
+    config = MkDocsConfig()
+    config.load_dict(
+        dict(
+            site_name="Test",
+            docs_dir=str(tmp_path / "docs"),
+            site_dir=str(tmp_path / "site"),
+            markdown_extensions=["attr_list", "footnotes"],
+        )
+    )
+    errors, _ = config.validate()
+    assert not errors
+    return config
+
+
+@pytest.fixture
+def files(config):
+    return Files(
+        [
+            File(path, config["docs_dir"], config["site_dir"], True)
+            for path in ["a.md", "b.md", "sub/c.md"]
+        ]
+    )
+
+
+@pytest.fixture
+def pages(config, files):
+    return {file.src_uri: Page(None, file, config) for file in files}
+
+
+def render_original(markdown, page, config, files):
+    page.markdown = markdown
+    Page.render(page, config, files)
+    return page.content
+
+
+@pytest.mark.parametrize(
+    "src_uri, markdown",
+    [
+        ("a.md", "[B](b.md){: .link }"),
+        ("sub/c.md", "[B](../b.md)"),
+        ("sub/c.md", "Footnote[^1]\n\n[^1]: Hello"),
+    ],
+)
+def test_md_filter_renders_like_mkdocs(config, files, pages, src_uri, markdown):
+    md = mkdocs_jinja.create_md_filter(config, files)
+    with mkdocs_jinja.rendering_page(pages[src_uri]):
+        html = md(markdown)
+
+    assert html == render_original(markdown, pages[src_uri], config, files)
+
+
+def test_md_filter_switches_pages(config, files, pages):
+    md = mkdocs_jinja.create_md_filter(config, files)
+    with mkdocs_jinja.rendering_page(pages["a.md"]):
+        html_a = md("[B](b.md)")
+    with mkdocs_jinja.rendering_page(pages["sub/c.md"]):
+        html_c = md("[B](../b.md)")
+
+    assert 'href="../b/"' in html_a
+    assert 'href="../../b/"' in html_c
+
+
+def test_md_filter_resets_state_between_calls(config, files, pages):
+    md = mkdocs_jinja.create_md_filter(config, files)
+    with mkdocs_jinja.rendering_page(pages["a.md"]):
+        md("Footnote[^1]\n\n[^1]: Hello")
+        html = md("No footnote")
+
+    assert html == "<p>No footnote</p>"
+
+
+def test_md_filter_measures_time(config, files, pages):
+    timings = mkdocs_jinja.BuildTimings()
+    md = mkdocs_jinja.create_md_filter(config, files, timings=timings)
+    with mkdocs_jinja.rendering_page(pages["a.md"]):
+        md("Hello")
+        md("World")
+
+    assert timings.counts["md"] == 2
+
+
+def test_build_timings_report(pages):
+    timings = mkdocs_jinja.BuildTimings()
+    timings.add("jinja", 1.5, page=pages["a.md"])
+    timings.add("jinja", 0.5, page=pages["b.md"])
+    timings.add("md", 0.25)
+
+    assert timings.report(pages_count=1) == [
+        "jinja: 2.00s in 2 calls",
+        "md: 0.25s in 1 calls",
+        "a.md: 1.50s",
+    ]
+
+
+def test_lazy_value_computes_once(pages):
+    calls = []
+    value = mkdocs_jinja.LazyValue(lambda: calls.append(1) or 42)
+    with mkdocs_jinja.rendering_page(pages["a.md"]):
+        value.get()
+    with mkdocs_jinja.rendering_page(pages["b.md"]):
+        value.get()
+        value.get()
+
+    assert value.get() == 42
+    assert calls == [1]
+    assert value.hits == 4
+    assert value.pages == {"a.md", "b.md"}
+
+
+def test_lazy_context_resolves_lazy_values():
+    env = Environment(
+        loader=DictLoader({"macros.html": "{% macro answer() %}{{ x }}{% endmacro %}"})
+    )
+    env.context_class = mkdocs_jinja.LazyContext
+    template = env.from_string(
+        "{% from 'macros.html' import answer with context %}"
+        "{{ x }} {{ items|length }} {{ answer() }}"
+    )
+    x = mkdocs_jinja.LazyValue(lambda: 42)
+    items = mkdocs_jinja.LazyValue(lambda: [1, 2, 3])
+
+    assert template.render(x=x, items=items) == "42 3 42"
+
+
+def test_lazy_context_doesnt_compute_unused_values():
+    env = Environment()
+    env.context_class = mkdocs_jinja.LazyContext
+    template = env.from_string("{{ x }}")
+    y = mkdocs_jinja.LazyValue(lambda: 1 / 0)
+    template.render(x=1, y=y)
+
+    assert y.duration is None
+
+
+def test_report_lazy_values(pages):
+    used = mkdocs_jinja.LazyValue(lambda: 42)
+    with mkdocs_jinja.rendering_page(pages["a.md"]):
+        used.get()
+        used.get()
+    unused = mkdocs_jinja.LazyValue(lambda: 42)
+    context = dict(x=1, used=used, unused=unused)
+
+    assert mkdocs_jinja.report_lazy_values(context) == [
+        "used: 0.00s, 2 hits on 1 pages",
+        "unused: never used",
+    ]
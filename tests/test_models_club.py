@@ -751,3 +751,101 @@ def test_last_bot_message_filters_by_emoji_and_text(test_db, juniorguru_bot):
     create_message(3, juniorguru_bot, content="🔥 ghi", channel_id=123)
 
     assert ClubMessage.last_bot_message(123, "🔥", "ab") == message1
+
+
+def test_message_content_size_per_month(test_db, juniorguru_bot):
+    user = create_user(1)
+    create_message(1, user, content="abcd", created_month="2023-01")
+    create_message(2, user, content="ab", created_month="2023-01")
+    create_message(3, user, content="abc", created_month="2023-03")
+    create_message(4, user, content="abc", created_month="2023-03", is_private=True)
+    create_message(5, juniorguru_bot, content="abc", created_month="2023-03")
+    months = [date(2023, 1, 31), date(2023, 2, 28), date(2023, 3, 31)]
+
+    assert ClubMessage.content_size_per_month(months) == [6, 0, 3]
+    assert ClubMessage.content_size_per_month(months) == [
+        ClubMessage.content_size_by_month(month) for month in months
+    ]
+
+
+def test_members_stats(test_db):
+    user1 = create_user(1, joined_at=datetime(2021, 1, 1))
+    create_user(2, joined_at=datetime(2021, 3, 20))
+    create_message(
+        1,
+        user1,
+        created_at=datetime(2021, 2, 15),
+        content="0123456789",
+        upvotes_count=1,
+    )
+    create_message(
+        2,
+        user1,
+        created_at=datetime(2021, 3, 10),
+        content="0123456789",
+        upvotes_count=4,
+    )
+    create_message(
+        3,
+        user1,
+        created_at=datetime(2021, 3, 15),
+        content="0123456789",
+        upvotes_count=10,
+        channel_id=ClubChannelID.INTRO,
+    )
+    create_message(
+        4,
+        user1,
+        created_at=datetime(2021, 3, 15),
+        content="0123456789",
+        upvotes_count=300,
+        is_private=True,
+    )
+
+    assert ClubUser.members_stats(today=date(2021, 4, 1)) == {
+        1: dict(
+            content_size=30,
+            recent_content_size=20,
+            upvotes_count=5,
+            recent_upvotes_count=4,
+            has_intro=True,
+            first_seen_on=date(2021, 2, 15),
+            is_new=False,
+        ),
+        2: dict(
+            content_size=0,
+            recent_content_size=0,
+            upvotes_count=0,
+            recent_upvotes_count=0,
+            has_intro=False,
+            first_seen_on=date(2021, 3, 20),
+            is_new=True,
+        ),
+    }
+
+
+def test_members_stats_match_per_member_methods(test_db):
+    today = date(2021, 4, 1)
+    user1 = create_user(1, joined_at=datetime(2021, 3, 1))
+    user2 = create_user(2, joined_at=None)
+    create_user(3, is_bot=True)
+    create_message(1, user1, created_at=datetime(2021, 3, 5), upvotes_count=3)
+    create_message(2, user1, created_at=datetime(2021, 1, 5), is_private=True)
+    create_message(
+        3, user1, channel_id=ClubChannelID.INTRO, type="new_member", upvotes_count=2
+    )
+    message = create_message(4, user1, created_at=datetime(2021, 3, 25))
+    ClubPin.create(member=user2, pinned_message=message)
+    stats = ClubUser.members_stats(today=today)
+
+    assert sorted(stats.keys()) == [1, 2]
+    for user in [user1, user2]:
+        assert stats[user.id] == dict(
+            content_size=user.content_size(),
+            recent_content_size=user.recent_content_size(today=today),
+            upvotes_count=user.upvotes_count(),
+            recent_upvotes_count=user.recent_upvotes_count(today=today),
+            has_intro=bool(user.intro),
+            first_seen_on=user.first_seen_on(),
+            is_new=user.is_new(today=today),
+        )
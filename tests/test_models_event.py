@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import date, datetime
 
 import pytest
 
@@ -136,3 +136,41 @@ def test_url(test_db):
     event = create_event(1)
 
     assert event.url == "https://junior.guru/events/1/"
+
+
+def test_count_per_month(test_db):
+    create_event(1, start_at=datetime(2021, 1, 1, 18))
+    create_event(2, start_at=datetime(2021, 1, 31, 23))
+    create_event(3, start_at=datetime(2021, 3, 1, 18))
+    months = [date(2021, 1, 31), date(2021, 2, 28), date(2021, 3, 31)]
+
+    assert Event.count_per_month(months) == [2, 0, 1]
+    assert Event.count_ttm_per_month(months) == [1, 1, 1]
+
+
+def test_count_per_month_includes_last_day_of_month(test_db):
+    create_event(1, start_at=datetime(2021, 1, 15, 23))
+    create_event(2, start_at=datetime(2021, 1, 31, 23))
+    create_event(3, start_at=datetime(2021, 2, 1, 0))
+
+    assert Event.count_per_month([date(2021, 1, 31), date(2021, 2, 28)]) == [2, 1]
+
+
+def test_women_ptc_ttm_per_month(test_db):
+    jane = create_member(1)
+    jane.has_feminine_name = True
+    jane.save()
+    john = create_member(2)
+    event1 = create_event(1, start_at=datetime(2021, 1, 15))
+    event2 = create_event(2, start_at=datetime(2021, 3, 15))
+    event3 = create_event(3, start_at=datetime(2021, 3, 31, 18))
+    EventSpeaking.create(speaker=jane, event=event1)
+    EventSpeaking.create(speaker=john, event=event1)
+    EventSpeaking.create(speaker=john, event=event2)
+    EventSpeaking.create(speaker=jane, event=event3)
+    months = [date(2020, 12, 31), date(2021, 1, 31), date(2021, 3, 31)]
+
+    assert EventSpeaking.women_ptc_ttm_per_month(months) == [0, 50, 50]
+    assert EventSpeaking.women_ptc_ttm_per_month(months) == [
+        EventSpeaking.women_ptc_ttm(month) for month in months
+    ]
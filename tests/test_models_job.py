@@ -0,0 +1,151 @@
+from datetime import date
+
+import pytest
+
+from juniorguru.models.job import (
+    ListedJob,
+    ListedJobRegion,
+    ListedJobTag,
+    SubmittedJob,
+    format_location,
+)
+
+from testing_utils import prepare_test_db
+
+
+@pytest.fixture
+def test_db():
+    yield from prepare_test_db([ListedJob, ListedJobTag, ListedJobRegion, SubmittedJob])
+
+
+def create_job(id, **kwargs):
+    return ListedJob.create(
+        id=id,
+        title=kwargs.get("title", "Junior Python Developer"),
+        first_seen_on=kwargs.get("first_seen_on", date(2023, 1, 1)),
+        lang=kwargs.get("lang", "cs"),
+        url=kwargs.get("url", f"https://example.com/{id}"),
+        company_name=kwargs.get("company_name", "Honza Ltd."),
+        locations=kwargs.get("locations"),
+        remote=kwargs.get("remote", False),
+        employment_types=kwargs.get("employment_types"),
+    )
+
+
+def create_location(name, region=None):
+    return dict(name=name, region=region or name)
+
+
+@pytest.mark.parametrize(
+    "locations, remote, expected",
+    [
+        (None, False, "?"),
+        (None, True, "na dálku"),
+        ([create_location("Praha")], False, "Praha"),
+        ([create_location("Praha")], True, "Praha, na dálku"),
+        (
+            [create_location("Kolín", "Středočeský kraj")],
+            False,
+            "Kolín, Středočeský kraj",
+        ),
+        ([create_location("Praha"), create_location("Brno")], False, "Brno, Praha"),
+        (
+            [
+                create_location("Praha"),
+                create_location("Brno"),
+                create_location("Ostrava"),
+            ],
+            False,
+            "Brno, Ostrava…",
+        ),
+        (
+            [
+                create_location("Praha"),
+                create_location("Brno"),
+                create_location("Ostrava"),
+            ],
+            True,
+            "Brno, Ostrava a další, na dálku",
+        ),
+    ],
+)
+def test_format_location(locations, remote, expected):
+    assert format_location(locations, remote) == expected
+
+
+def test_index_sets_location(test_db):
+    create_job(1, locations=[create_location("Praha")], remote=True)
+    create_job(2)
+    ListedJob.index()
+
+    assert [job.location for job in ListedJob.select().order_by(ListedJob.id)] == [
+        "Praha, na dálku",
+        "?",
+    ]
+
+
+def test_index_is_repeatable(test_db):
+    create_job(1, remote=True, locations=[create_location("Praha")])
+    ListedJob.index()
+    ListedJob.index()
+
+    assert ListedJobTag.select().count() == 1
+    assert ListedJobRegion.select().count() == 1
+
+
+def test_tags_listing(test_db):
+    create_job(1, employment_types=["FULL_TIME"])
+    create_job(2, employment_types=["PAID_INTERNSHIP"])
+    create_job(3, employment_types=["FULL_TIME", "INTERNSHIP"])
+    create_job(4, employment_types=["VOLUNTEERING"])
+    ListedJob.index()
+
+    assert {job.id for job in ListedJob.internship_listing()} == {2, 3}
+    assert {job.id for job in ListedJob.volunteering_listing()} == {4}
+
+
+def test_tags_listing_new(test_db):
+    create_job(1, first_seen_on=date(2023, 1, 1))
+    create_job(2, first_seen_on=date(2023, 1, 2))
+    create_job(3, first_seen_on=date(2023, 1, 4))
+    create_job(4, first_seen_on=date(2023, 1, 1), remote=True)
+    ListedJob.index()
+    today = date(2023, 1, 4)
+
+    assert {job.id for job in ListedJob.tags_listing(["NEW"], today=today)} == {2, 3}
+    assert {
+        job.id for job in ListedJob.tags_listing(["NEW", "REMOTE"], today=today)
+    } == {2, 3, 4}
+    assert {
+        job.id for job in ListedJob.listing() if "NEW" in job.tags(today=today)
+    } == {2, 3}
+
+
+def test_tags(test_db):
+    job = create_job(
+        1,
+        first_seen_on=date(2023, 1, 1),
+        remote=True,
+        employment_types=["PAID_INTERNSHIP"],
+    )
+
+    assert job.tags(today=date(2023, 1, 2)) == ["NEW", "REMOTE", "INTERNSHIP"]
+    assert job.tags(today=date(2023, 2, 1)) == ["REMOTE", "INTERNSHIP"]
+
+
+def test_region_listing(test_db):
+    create_job(1, locations=[create_location("Praha")])
+    create_job(
+        2,
+        locations=[
+            create_location("Kolín", "Středočeský kraj"),
+            create_location("Beroun", "Středočeský kraj"),
+        ],
+    )
+    create_job(3, locations=[create_location("Praha"), create_location("Brno")])
+    create_job(4)
+    ListedJob.index()
+
+    assert sorted(job.id for job in ListedJob.region_listing("Praha")) == [1, 3]
+    assert [job.id for job in ListedJob.region_listing("Středočeský kraj")] == [2]
+    assert list(ListedJob.region_listing("Zlínský kraj")) == []
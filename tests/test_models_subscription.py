@@ -2,26 +2,29 @@ from datetime import date, datetime
 
 import pytest
 
-from juniorguru.models.subscription import SubscriptionActivity
+from juniorguru.models.subscription import SubscriptionActivity, SubscriptionSnapshot
 
 from testing_utils import prepare_test_db
 
 
 def create_activity(
-    account_id: int, type: str, happened_at: datetime
+    account_id: int, type: str, happened_at: datetime, **kwargs
 ) -> SubscriptionActivity:
     return SubscriptionActivity.create(
         account_id=account_id,
         type=type,
-        account_has_feminine_name=True,
+        account_has_feminine_name=kwargs.get("account_has_feminine_name", True),
         happened_at=happened_at,
         happened_on=happened_at.date(),
+        subscription_type=kwargs.get("subscription_type", "individual"),
+        subscription_interval=kwargs.get("subscription_interval", "month"),
+        order_coupon_slug=kwargs.get("order_coupon_slug"),
     )
 
 
 @pytest.fixture
 def test_db():
-    yield from prepare_test_db([SubscriptionActivity])
+    yield from prepare_test_db([SubscriptionActivity, SubscriptionSnapshot])
 
 
 def test_account_subscribed_at(test_db):
@@ -68,3 +71,252 @@ def test_account_subscribed_days_duplicate_deactivation(test_db):
     assert SubscriptionActivity.account_subscribed_days(1, today=today) == (
         (date(2023, 1, 31) - date(2021, 3, 4)).days
     )
+
+
+def test_create_snapshots(test_db):
+    create_activity(1, "order", datetime(2023, 1, 10))
+    create_activity(1, "deactivation", datetime(2023, 2, 28, 12))
+    create_activity(1, "order", datetime(2023, 4, 1))
+    create_activity(2, "order", datetime(2023, 3, 15), subscription_type="free")
+    create_activity(2, "order", datetime(2023, 4, 20))
+    count = SubscriptionSnapshot.create_snapshots(date(2023, 4, 15))
+    snapshots = SubscriptionSnapshot.select().order_by(
+        SubscriptionSnapshot.month, SubscriptionSnapshot.account_id
+    )
+
+    assert count == 4
+    assert [
+        (snapshot.month, snapshot.account_id, snapshot.subscription_type)
+        for snapshot in snapshots
+    ] == [
+        ("2023-01", 1, "individual"),
+        ("2023-03", 2, "free"),
+        ("2023-04", 1, "individual"),
+        ("2023-04", 2, "free"),
+    ]
+
+
+def test_create_snapshots_subscribed_on(test_db):
+    create_activity(1, "order", datetime(2023, 1, 10))
+    create_activity(1, "deactivation", datetime(2023, 2, 1))
+    create_activity(1, "order", datetime(2023, 3, 1))
+    SubscriptionSnapshot.create_snapshots(date(2023, 3, 31))
+
+    assert [
+        snapshot.account_subscribed_on for snapshot in SubscriptionSnapshot.select()
+    ] == [date(2023, 1, 10), date(2023, 1, 10)]
+
+
+def test_active_counts_match_activities(test_db):
+    for account_id in range(1, 6):
+        create_activity(
+            account_id,
+            "order",
+            datetime(2023, account_id, 5),
+            account_has_feminine_name=account_id % 2 == 0,
+            subscription_interval="year" if account_id == 3 else "month",
+        )
+    create_activity(2, "deactivation", datetime(2023, 3, 31))
+    create_activity(2, "order", datetime(2023, 5, 1))
+    create_activity(4, "deactivation", datetime(2023, 4, 30, 23))
+    months = [
+        date(2023, 1, 31),
+        date(2023, 2, 28),
+        date(2023, 3, 31),
+        date(2023, 4, 30),
+        date(2023, 5, 31),
+        date(2023, 6, 15),
+    ]
+    SubscriptionSnapshot.create_snapshots(months[-1])
+
+    assert [SubscriptionActivity.active_count(month) for month in months] == [
+        SubscriptionActivity.listing(month)
+        .where(SubscriptionActivity.type != "deactivation")
+        .count()
+        for month in months
+    ]
+    assert [SubscriptionActivity.active_count(month) for month in months] == [
+        1,
+        2,
+        2,
+        2,
+        4,
+        4,
+    ]
+    assert [SubscriptionActivity.active_women_ptc(month) for month in months] == [
+        0,
+        50,
+        0,
+        0,
+        25,
+        25,
+    ]
+    assert [
+        SubscriptionActivity.active_individuals_yearly_count(month) for month in months
+    ] == [None, None, 1, 1, 1, 1]
+
+
+def test_active_duration_avg(test_db):
+    create_activity(1, "order", datetime(2023, 1, 1))
+    create_activity(2, "order", datetime(2023, 1, 31))
+    SubscriptionSnapshot.create_snapshots(date(2023, 3, 2))
+
+    assert SubscriptionActivity.active_duration_avg(date(2023, 3, 2)) == 1.5
+
+
+def test_add_many_upserts_like_add(test_db):
+    rows = [
+        dict(
+            account_id=1,
+            type="order",
+            account_has_feminine_name=True,
+            happened_at=datetime(2023, 5, 17, 10),
+            happened_on=date(2023, 5, 17),
+            order_coupon_slug="thankyou",
+        ),
+        dict(
+            account_id=1,
+            type="order",
+            account_has_feminine_name=True,
+            happened_at=datetime(2023, 5, 17, 12),
+            happened_on=date(2023, 5, 17),
+            subscription_interval="month",
+        ),
+        dict(
+            account_id=1,
+            type="order",
+            account_has_feminine_name=True,
+            happened_at=datetime(2023, 5, 17, 8),
+            happened_on=date(2023, 5, 17),
+            order_coupon_slug="finaid",
+        ),
+        dict(
+            account_id=2,
+            type="deactivation",
+            account_has_feminine_name=False,
+            happened_at=datetime(2023, 6, 1),
+            happened_on=date(2023, 6, 1),
+        ),
+    ]
+    for row in rows:
+        SubscriptionActivity.add(**row)
+    expected = [
+        activity.serialize()
+        for activity in SubscriptionActivity.select().order_by(
+            SubscriptionActivity.account_id
+        )
+    ]
+    SubscriptionActivity.delete().execute()
+    SubscriptionActivity.add_many(rows, batch_size=2)
+
+    assert [
+        activity.serialize()
+        for activity in SubscriptionActivity.select().order_by(
+            SubscriptionActivity.account_id
+        )
+    ] == expected
+
+
+def test_deserialize_many(test_db):
+    lines = [
+        create_activity(1, "order", datetime(2023, 5, 17)).serialize(),
+        create_activity(2, "deactivation", datetime(2023, 6, 1)).serialize(),
+    ]
+    SubscriptionActivity.delete().execute()
+    SubscriptionActivity.deserialize_many(lines)
+
+    assert [
+        activity.serialize()
+        for activity in SubscriptionActivity.select().order_by(
+            SubscriptionActivity.account_id
+        )
+    ] == lines
+
+
+def test_classify_subscription_types(test_db):
+    create_activity(1, "order", datetime(2023, 5, 17), order_coupon_slug="thankyou")
+    create_activity(2, "order", datetime(2023, 5, 17))
+
+    SubscriptionActivity.classify_subscription_types({"thankyou": "free"})
+
+    assert [
+        activity.subscription_type
+        for activity in SubscriptionActivity.select().order_by(
+            SubscriptionActivity.account_id
+        )
+    ] == ["free", "individual"]
+
+
+@pytest.fixture
+def test_db_history(test_db):
+    create_activity(1, "order", datetime(2023, 1, 10))
+    create_activity(1, "deactivation", datetime(2023, 3, 31, 23))
+    create_activity(1, "deactivation", datetime(2023, 4, 2))
+    create_activity(1, "order", datetime(2023, 5, 1))
+    create_activity(2, "trial_start", datetime(2023, 3, 25), subscription_type="trial")
+    create_activity(2, "order", datetime(2023, 3, 25), subscription_type="trial")
+    create_activity(2, "trial_end", datetime(2023, 4, 8), subscription_type="trial")
+    create_activity(2, "order", datetime(2023, 4, 9))
+    create_activity(2, "deactivation", datetime(2023, 6, 1))
+    create_activity(3, "trial_start", datetime(2023, 4, 20), subscription_type="trial")
+    create_activity(3, "order", datetime(2023, 4, 20), subscription_type="trial")
+    create_activity(3, "trial_end", datetime(2023, 5, 4), subscription_type="trial")
+    create_activity(
+        3, "deactivation", datetime(2023, 5, 4, 1), subscription_type="trial"
+    )
+    create_activity(4, "order", datetime(2023, 2, 1), subscription_type="free")
+    create_activity(4, "order", datetime(2023, 4, 1))
+    create_activity(4, "deactivation", datetime(2023, 4, 30))
+    create_activity(5, "order", datetime(2023, 5, 15), subscription_type="partner")
+    create_activity(5, "deactivation", datetime(2023, 6, 10))
+    SubscriptionSnapshot.create_snapshots(date(2023, 6, 30))
+    yield
+
+
+MONTHS = [
+    date(2023, 1, 31),
+    date(2023, 2, 28),
+    date(2023, 3, 31),
+    date(2023, 4, 30),
+    date(2023, 5, 31),
+    date(2023, 6, 30),
+]
+
+
+@pytest.mark.parametrize(
+    "method_name",
+    [
+        "signups_count",
+        "individuals_signups_count",
+        "quits_count",
+        "individuals_quits_count",
+        "churn_ptc",
+        "individuals_churn_ptc",
+    ],
+)
+def test_per_month_matches_per_date(test_db_history, method_name: str):
+    per_date = getattr(SubscriptionActivity, method_name)
+    per_month = getattr(
+        SubscriptionActivity, f"{method_name.removesuffix('_count')}_per_month"
+    )
+
+    assert per_month(MONTHS) == [per_date(month) for month in MONTHS]
+
+
+def test_trial_conversion_ptc_per_month(test_db_history):
+    months = MONTHS[2:]
+
+    assert SubscriptionActivity.trial_conversion_ptc_per_month(months) == [
+        SubscriptionActivity.trial_conversion_ptc(month) for month in months
+    ]
+    assert SubscriptionActivity.trial_conversion_ptc_per_month(months) == [
+        100,
+        0,
+        0,
+        0,
+    ]
+
+
+def test_signups_and_quits_per_month(test_db_history):
+    assert SubscriptionActivity.signups_per_month(MONTHS) == [1, 1, 1, 1, 1, 0]
+    assert SubscriptionActivity.quits_per_month(MONTHS) == [0, 0, 1, 1, 1, 2]
@@ -163,3 +163,53 @@ def test_listing_sorts_from_newest_to_oldest(test_db):
 #     create_transaction(amount=-300, category='d', happened_on=date(2020, 11, 9))
 
 #     assert Transaction.profit_monthly(date(2020, 12, 12)) == 30
+
+
+@pytest.fixture
+def transactions(test_db):
+    for i, (happened_on, category, amount) in enumerate(
+        [
+            (date(2021, 1, 5), "memberships", 1000),
+            (date(2021, 1, 5), "memberships", 500),
+            (date(2021, 1, 20), "partnerships", 20000),
+            (date(2021, 1, 31), "tax", 300),
+            (date(2021, 2, 1), "discord", -200),
+            (date(2021, 2, 28), "memberships", 700),
+            (date(2021, 3, 15), "lawyer", -5000),
+            (date(2021, 12, 31), "donations", 100),
+            (date(2022, 1, 1), "marketing", -1234),
+        ]
+    ):
+        create_transaction(
+            str(i), happened_on=happened_on, category=category, amount=amount
+        )
+
+
+MONTHS = [
+    date(2020, 12, 31),
+    date(2021, 1, 31),
+    date(2021, 2, 28),
+    date(2021, 3, 31),
+    date(2021, 12, 31),
+    date(2022, 1, 31),
+]
+
+
+@pytest.mark.parametrize(
+    "method_name",
+    [
+        "revenue",
+        "revenue_ttm",
+        "cost",
+        "cost_ttm",
+        "profit",
+        "profit_ttm",
+        "revenue_breakdown",
+        "cost_breakdown",
+    ],
+)
+def test_per_month_matches_single_month(transactions, method_name):
+    method = getattr(Transaction, method_name)
+    method_per_month = getattr(Transaction, f"{method_name}_per_month")
+
+    assert method_per_month(MONTHS) == [method(month) for month in MONTHS]
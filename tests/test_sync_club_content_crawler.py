@@ -1,10 +1,17 @@
+import asyncio
 import logging
 from collections import namedtuple
 from datetime import datetime, timedelta, timezone
 
 import pytest
+from discord.utils import time_snowflake
 
-from juniorguru.sync.club_content.crawler import get_channel_logger, get_history_after
+from juniorguru.sync.club_content.crawler import (
+    get_channel_logger,
+    get_history_after,
+    get_incremental_history_after,
+    prepare_incremental_crawl,
+)
 
 
 def test_get_history_after_given_naive_datetime():
@@ -37,3 +44,63 @@ def test_get_channel_logger_thread():
     channel_logger = get_channel_logger(logger, thread)
 
     assert channel_logger.name == "test_get_channel_logger.1.2"
+
+
+def test_get_incremental_history_after():
+    history_after = get_incremental_history_after(
+        datetime(2023, 1, 1, tzinfo=timezone.utc),
+        datetime(2023, 8, 30, tzinfo=timezone.utc),
+        refetch_since=timedelta(days=2),
+    )
+
+    assert history_after == datetime(2023, 8, 28, tzinfo=timezone.utc)
+
+
+def test_get_incremental_history_after_limited_by_history():
+    history_after = get_incremental_history_after(
+        datetime(2023, 8, 29, tzinfo=timezone.utc),
+        datetime(2023, 8, 30, tzinfo=timezone.utc),
+        refetch_since=timedelta(days=2),
+    )
+
+    assert history_after == datetime(2023, 8, 29, tzinfo=timezone.utc)
+
+
+def test_get_incremental_history_after_all_history():
+    history_after = get_incremental_history_after(
+        None,
+        datetime(2023, 8, 30, tzinfo=timezone.utc),
+        refetch_since=timedelta(days=2),
+    )
+
+    assert history_after == datetime(2023, 8, 28, tzinfo=timezone.utc)
+
+
+def test_get_incremental_history_after_given_naive_datetime():
+    with pytest.raises(ValueError):
+        get_incremental_history_after(
+            None, datetime(2023, 8, 30), refetch_since=timedelta(days=2)
+        )
+
+
+def test_prepare_incremental_crawl():
+    deletions = []
+
+    class StubWriter:
+        async def delete_messages(self, channel_id, before):
+            deletions.append((channel_id, before))
+
+    StubChannel = namedtuple("Channel", ["id"])
+    last_message_id = time_snowflake(datetime(2023, 8, 30, tzinfo=timezone.utc))
+    crawl_after = asyncio.run(
+        prepare_incremental_crawl(
+            StubChannel(1),
+            StubWriter(),
+            datetime(2023, 1, 1, tzinfo=timezone.utc),
+            dict(last_message_id=last_message_id, edited_at=None),
+            logging.getLogger("test_prepare_incremental_crawl"),
+        )
+    )
+
+    assert crawl_after == datetime(2023, 8, 27, tzinfo=timezone.utc)
+    assert deletions == [(1, datetime(2023, 1, 1, tzinfo=timezone.utc))]
@@ -0,0 +1,259 @@
+import asyncio
+from datetime import datetime
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+from diskcache import Cache
+
+from juniorguru.models.club import ClubMessage, ClubPin, ClubUser
+from juniorguru.sync.club_content import store
+
+from testing_utils import prepare_test_db
+
+
+def user_record(id_, **kwargs):
+    return dict(
+        id=id_,
+        is_bot=False,
+        is_member=kwargs.get("is_member", False),
+        has_avatar=False,
+        display_name=kwargs.get("display_name", "Kuře Žluté"),
+        mention=f"<@{id_}>",
+        joined_at=None,
+        initial_roles=[],
+    )
+
+
+def message_record(id_, author_id, **kwargs):
+    created_at = kwargs.get("created_at", datetime(2023, 8, 30))
+    return dict(
+        id=id_,
+        url=f"https://example.com/messages/{id_}",
+        content=kwargs.get("content", "hello"),
+        content_size=5,
+        created_at=created_at,
+        created_month=f"{created_at:%Y-%m}",
+        edited_at=kwargs.get("edited_at"),
+        author=author_id,
+        author_is_bot=False,
+        channel_id=kwargs.get("channel_id", 123),
+        channel_name="random-discussions",
+        parent_channel_id=kwargs.get("channel_id", 123),
+        parent_channel_name="random-discussions",
+    )
+
+
+@pytest.fixture
+def test_db(monkeypatch):
+    for db in prepare_test_db([ClubUser, ClubMessage, ClubPin]):
+        monkeypatch.setattr(store, "db", db)  # snapshots work with raw SQL
+        yield db
+
+
+@pytest.fixture
+def cache(tmp_path):
+    with Cache(tmp_path) as cache:
+        yield cache
+
+
+@pytest.fixture
+def written_batches(monkeypatch):
+    batches = []
+    monkeypatch.setattr(store, "_get_user_ids", lambda: {1})
+    monkeypatch.setattr(store, "write_records", batches.append)
+    monkeypatch.setattr(store, "message_to_record", lambda message: message.id)
+    monkeypatch.setattr(store, "user_to_record", lambda user: user.id)
+    return batches
+
+
+def create_message(id_, author_id):
+    author = SimpleNamespace(id=author_id, display_name="Kuře Žluté")
+    return SimpleNamespace(id=id_, author=author)
+
+
+def test_writer_stores_records_in_batches(written_batches):
+    async def crawl():
+        async with store.Writer(batch_size=2) as writer:
+            for id_ in range(5):
+                await writer.store_message(create_message(id_, 1))
+        return writer
+
+    writer = asyncio.run(crawl())
+
+    assert [len(batch) for batch in written_batches] == [2, 2, 1]
+    assert writer.counter == 5
+
+
+def test_writer_stores_unknown_authors_only_once(written_batches):
+    async def crawl():
+        async with store.Writer() as writer:
+            await writer.store_message(create_message(10, 1))
+            await writer.store_message(create_message(11, 2))
+            await writer.store_message(create_message(12, 2))
+
+    asyncio.run(crawl())
+
+    assert [record for batch in written_batches for record in batch] == [
+        ("message", 10),
+        ("user", 2),
+        ("message", 11),
+        ("message", 12),
+    ]
+
+
+def test_write_batch_updates_members(test_db):
+    store.write_batch([("user", user_record(1, display_name="Old"))])
+    ClubUser.update(account_id=42).execute()
+    store.write_batch([("member", user_record(1, display_name="New", is_member=True))])
+
+    user = ClubUser.get_by_id(1)
+
+    assert user.display_name == "New"
+    assert user.is_member is True
+    assert user.account_id == 42
+
+
+def test_write_batch_ignores_known_users_and_updates_messages(test_db):
+    store.write_batch(
+        [
+            ("member", user_record(1, display_name="Member", is_member=True)),
+            ("message", message_record(10, 1, content="first")),
+        ]
+    )
+    store.write_batch(
+        [
+            ("user", user_record(1, display_name="User")),
+            ("message", message_record(10, 1, content="second")),
+        ]
+    )
+
+    assert ClubUser.get_by_id(1).display_name == "Member"
+    assert ClubMessage.get_by_id(10).content == "second"
+
+
+def test_write_batch_deletes_before_storing(test_db):
+    store.write_batch(
+        [
+            ("user", user_record(1)),
+            ("message", message_record(10, 1, created_at=datetime(2023, 8, 1))),
+            ("message", message_record(11, 1, created_at=datetime(2023, 8, 20))),
+            (
+                "message",
+                message_record(12, 1, created_at=datetime(2023, 8, 1), channel_id=456),
+            ),
+            ("pin", dict(pinned_message=10, member=1)),
+        ]
+    )
+    store.write_batch(
+        [
+            ("message", message_record(10, 1, created_at=datetime(2023, 8, 1))),
+            ("deletion", dict(channel_id=123, before=datetime(2023, 8, 10))),
+        ]
+    )
+
+    assert [message.id for message in ClubMessage.select()] == [10, 11, 12]
+    assert ClubPin.select().count() == 0
+
+
+def test_write_batch_stores_pins_of_updated_messages_again(test_db):
+    store.write_batch(
+        [
+            ("member", user_record(1, is_member=True)),
+            ("member", user_record(2, is_member=True)),
+            ("message", message_record(10, 1)),
+            ("pin", dict(pinned_message=10, member=1)),
+            ("pin", dict(pinned_message=10, member=2)),
+        ]
+    )
+    store.write_batch(
+        [
+            ("message", message_record(10, 1, edited_at=datetime(2023, 8, 31))),
+            ("pin", dict(pinned_message=10, member=2)),
+        ]
+    )
+
+    assert ClubMessage.get_by_id(10).edited_at == datetime(2023, 8, 31)
+    assert [pin.member.id for pin in ClubPin.select()] == [2]
+
+
+def test_insert_many_chunks_records(test_db, monkeypatch):
+    monkeypatch.setattr(store, "WRITER_INSERT_CHUNK_SIZE", 2)
+    chunks = []
+
+    def insert_many(records):
+        chunks.append(len(records))
+        return ClubUser.insert_many(records)
+
+    store._insert_many(insert_many, [user_record(id_) for id_ in range(5)])
+
+    assert chunks == [2, 2, 1]
+    assert ClubUser.select().count() == 5
+
+
+def test_dump_and_load_snapshot(test_db, cache):
+    store.write_batch(
+        [
+            ("member", user_record(1, is_member=True)),
+            ("user", user_record(2)),
+            ("message", message_record(10, 1)),
+            ("message", message_record(11, 2, edited_at=datetime(2023, 8, 31))),
+            ("message", message_record(12, 2, channel_id=456)),
+            ("pin", dict(pinned_message=11, member=1)),
+        ]
+    )
+    ClubUser.update(account_id=42).where(ClubUser.id == 1).execute()
+    store.dump_snapshot(cache)
+    test_db.drop_tables([ClubUser, ClubMessage, ClubPin])
+    test_db.create_tables([ClubUser, ClubMessage, ClubPin])
+    cursors = store.load_snapshot(cache)
+
+    assert cursors == {
+        123: dict(last_message_id=11, edited_at=datetime(2023, 8, 31)),
+        456: dict(last_message_id=12, edited_at=None),
+    }
+    assert [message.id for message in ClubMessage.select()] == [10, 11, 12]
+    assert ClubMessage.get_by_id(11).edited_at == datetime(2023, 8, 31)
+    assert [(pin.pinned_message.id, pin.member.id) for pin in ClubPin.select()] == [
+        (11, 1)
+    ]
+    assert [
+        (user.id, user.is_member, user.account_id) for user in ClubUser.select()
+    ] == [
+        (1, False, None),
+        (2, False, None),
+    ]
+
+
+def test_dump_snapshot_replaces_previous_one(test_db, cache):
+    cache[("messages", 123)] = ["left behind by an older version"]
+    store.write_batch([("user", user_record(1)), ("message", message_record(10, 1))])
+    store.dump_snapshot(cache)
+    store.write_batch([("message", message_record(11, 1))])
+    store.dump_snapshot(cache)
+
+    assert sorted(cache) == ["cursors", "snapshot"]
+    assert len(list(Path(cache.directory).glob("**/*.val"))) == 1
+
+
+def test_load_snapshot_empty_cache(test_db, cache):
+    assert store.load_snapshot(cache) == {}
+    assert ClubMessage.select().count() == 0
+
+
+def test_prune_content(test_db):
+    store.write_batch(
+        [
+            ("member", user_record(1, is_member=True)),
+            ("user", user_record(2)),
+            ("user", user_record(3)),
+            ("message", message_record(10, 2)),
+            ("message", message_record(11, 3, channel_id=456)),
+            ("pin", dict(pinned_message=11, member=1)),
+        ]
+    )
+    store.prune_content([123])
+
+    assert [message.id for message in ClubMessage.select()] == [10]
+    assert ClubPin.select().count() == 0
+    assert [user.id for user in ClubUser.select()] == [1, 2]
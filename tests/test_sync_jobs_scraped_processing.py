@@ -0,0 +1,186 @@
+from datetime import date
+from queue import Queue
+
+import pytest
+
+from juniorguru.models.job import ScrapedJob
+from juniorguru.sync.jobs_scraped.processing import (
+    get_batch,
+    get_content_hash,
+    get_pipelines_hash,
+    persist_operations,
+    save_items,
+)
+
+from testing_utils import prepare_test_db
+
+
+@pytest.fixture
+def test_db():
+    yield from prepare_test_db([ScrapedJob])
+
+
+def create_item(url, **kwargs):
+    return dict(
+        title=kwargs.get("title", "Junior Python Developer"),
+        first_seen_on=kwargs.get("first_seen_on", date(2023, 1, 1)),
+        last_seen_on=kwargs.get("last_seen_on", date(2023, 1, 1)),
+        url=url,
+        company_name=kwargs.get("company_name", "Honza Ltd."),
+        description_html=kwargs.get("description_html", "<p>Hello!</p>"),
+        source=kwargs.get("source", "startupjobs"),
+        source_urls=kwargs.get("source_urls", []),
+    )
+
+
+def test_get_batch():
+    queue = Queue()
+    for i in range(5):
+        queue.put(i)
+
+    assert get_batch(queue, 3, timeout=0) == [0, 1, 2]
+    assert get_batch(queue, 3, timeout=0) == [3, 4]
+
+
+def test_save_items(test_db):
+    save_items(
+        [create_item("https://example.com/1"), create_item("https://example.com/2")]
+    )
+
+    assert sorted(job.url for job in ScrapedJob.select()) == [
+        "https://example.com/1",
+        "https://example.com/2",
+    ]
+
+
+def test_save_items_merges_duplicates_within_items(test_db):
+    save_items(
+        [
+            create_item("https://example.com/1", source_urls=["a"]),
+            create_item("https://example.com/1", source_urls=["b"]),
+        ]
+    )
+    job = ScrapedJob.get()
+
+    assert sorted(job.source_urls) == ["a", "b"]
+
+
+def test_save_items_merges_duplicates_with_db(test_db):
+    save_items([create_item("https://example.com/1", title="Old", source_urls=["a"])])
+    save_items(
+        [
+            create_item(
+                "https://example.com/1",
+                title="New",
+                source_urls=["b"],
+                last_seen_on=date(2023, 1, 2),
+            )
+        ]
+    )
+    job = ScrapedJob.get()
+
+    assert ScrapedJob.select().count() == 1
+    assert job.title == "New"
+    assert sorted(job.source_urls) == ["a", "b"]
+    assert job.last_seen_on == date(2023, 1, 2)
+
+
+def test_persist_operations(test_db):
+    save_items([create_item(f"https://example.com/{i}") for i in range(3)])
+    job1, job2, job3 = ScrapedJob.select().order_by(ScrapedJob.url)
+    item = job2.to_item()
+    item["title"] = "Changed"
+
+    persist_operations([("delete", {"id": job1.id}), ("save", item)])
+
+    assert [
+        (job.id, job.title) for job in ScrapedJob.select().order_by(ScrapedJob.url)
+    ] == [
+        (job2.id, "Changed"),
+        (job3.id, "Junior Python Developer"),
+    ]
+
+
+def test_persist_operations_raises_on_unknown_operation(test_db):
+    with pytest.raises(ValueError):
+        persist_operations([("explode", {"id": 1})])
+
+
+def test_get_content_hash_ignores_bookkeeping_fields():
+    item1 = create_item("https://example.com/1", source_urls=["a"])
+    item2 = create_item(
+        "https://example.com/1",
+        source_urls=["b"],
+        first_seen_on=date(2023, 1, 2),
+        last_seen_on=date(2023, 1, 2),
+    )
+
+    assert get_content_hash(item1) == get_content_hash(item2)
+
+
+def test_get_content_hash_changes_with_content():
+    item1 = create_item("https://example.com/1", title="Junior Developer")
+    item2 = create_item("https://example.com/1", title="Senior Developer")
+
+    assert get_content_hash(item1) != get_content_hash(item2)
+
+
+def test_get_pipelines_hash():
+    pipelines = [
+        "juniorguru.sync.jobs_scraped.pipelines.gender_remover",
+        "juniorguru.sync.jobs_scraped.pipelines.emoji_remover",
+    ]
+
+    assert get_pipelines_hash(pipelines) == get_pipelines_hash(pipelines)
+    assert get_pipelines_hash(pipelines) != get_pipelines_hash(pipelines[::-1])
+    assert get_pipelines_hash(pipelines) != get_pipelines_hash(pipelines[:1])
+
+
+def test_save_items_keeps_postprocessed_job_if_content_is_the_same(test_db):
+    save_items([create_item("https://example.com/1", source_urls=["a"])])
+    ScrapedJob.update(title="Postprocessed", pipelines_hash="abc").execute()
+    save_items(
+        [
+            create_item(
+                "https://example.com/1",
+                source_urls=["b"],
+                last_seen_on=date(2023, 1, 2),
+            )
+        ]
+    )
+    job = ScrapedJob.get()
+
+    assert job.title == "Postprocessed"
+    assert job.pipelines_hash == "abc"
+    assert sorted(job.source_urls) == ["a", "b"]
+    assert job.last_seen_on == date(2023, 1, 2)
+
+
+def test_save_items_resets_postprocessed_job_if_content_changes(test_db):
+    save_items([create_item("https://example.com/1")])
+    ScrapedJob.update(title="Postprocessed", pipelines_hash="abc").execute()
+    save_items(
+        [
+            create_item(
+                "https://example.com/1",
+                title="Changed",
+                last_seen_on=date(2023, 1, 2),
+            )
+        ]
+    )
+    job = ScrapedJob.get()
+
+    assert job.title == "Changed"
+    assert job.pipelines_hash is None
+
+
+def test_postprocessing_listing(test_db):
+    save_items([create_item(f"https://example.com/{i}") for i in range(3)])
+    job1, job2, job3 = ScrapedJob.select().order_by(ScrapedJob.url)
+    ScrapedJob.update(pipelines_hash="abc").where(ScrapedJob.id == job1.id).execute()
+    ScrapedJob.update(pipelines_hash="xyz").where(ScrapedJob.id == job2.id).execute()
+
+    assert {job.id for job in ScrapedJob.postprocessing_listing("abc")} == {
+        job2.id,
+        job3.id,
+    }
@@ -3,6 +3,7 @@ from datetime import date, datetime
 import pytest
 
 from juniorguru.sync.subscriptions import (
+    activities_from_nodes,
     activities_from_subscription,
     get_coupon_slug,
     get_timestamp,
@@ -101,3 +102,37 @@ def test_get_coupon_slug(coupon_data, expected):
 
 def test_get_timestamp():
     assert get_timestamp(date(2021, 10, 12)) == 1633996800
+
+
+def test_activities_from_nodes():
+    nodes = [
+        {
+            "createdAt": 1684318210,
+            "type": "renewal",
+            "member": {"id": "123", "fullName": "Jana Nováková"},
+        },
+        {"createdAt": 1684318210, "type": "renewal", "member": None},
+        {
+            "createdAt": 1684318210,
+            "type": "subscription_deactivated",
+            "member": {"id": "456", "fullName": "Jan Novák"},
+        },
+    ]
+    activities = activities_from_nodes(nodes, lambda name: name.startswith("Jana"))
+
+    assert list(activities) == [
+        dict(
+            account_id=123,
+            account_has_feminine_name=True,
+            happened_on=date(2023, 5, 17),
+            happened_at=datetime(2023, 5, 17, 10, 10, 10),
+            type="order",
+        ),
+        dict(
+            account_id=456,
+            account_has_feminine_name=False,
+            happened_on=date(2023, 5, 17),
+            happened_at=datetime(2023, 5, 17, 10, 10, 10),
+            type="deactivation",
+        ),
+    ]